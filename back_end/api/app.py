@@ -1,25 +1,44 @@
 import os
 import io
-import uuid
+import csv
+import json
+import time
+import asyncio
+from dataclasses import dataclass
 from datetime import datetime
+from collections import OrderedDict
 from contextlib import asynccontextmanager
-from typing import List
+from typing import List, Optional
 
-import joblib
 import boto3
+from botocore.config import Config
 import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from pathlib import Path
 
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, DateTime
+from sqlalchemy import (
+    create_engine, insert, inspect, select, text, Column, Index, Integer, String, Boolean, Float, DateTime,
+)
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 
 # Importa o pipeline completo
-from data_processing import process_pipeline  
+from data_processing import (
+    RSS_SAMPLER, ArtifactTables, TRANSACTION_COLUMNS, load_tables, merge_test, merge_train, process_pipeline,
+    read_arrow_table, read_ipc_frame, record_stage,
+)
+from artifacts import ArtifactDownloader
+from batching import BatcherClosed, MicroBatcher
+from feature_store import FeatureStore
+from jobs import JOB_DONE, JOB_FAILED, JobQueue
+from metrics import REGISTRY, REQUEST_SECONDS, observe_stages, server_timing
+from registry import LoadedModel, ModelRef, ModelRegistry, RegistryError, load_model_file
+from snapshot import HistorySnapshot, snapshot_key
 
 
 # ==============================================================================
@@ -48,7 +67,44 @@ for v in (
 
 TMP_DIR = Path(os.getenv("TMP_DIR", "/tmp/fraud_api"))
 TMP_DIR.mkdir(parents=True, exist_ok=True)
+# Limiar padrão; cada versão do registro pode definir o seu (JSON ao lado do modelo ou na ativação)
 FRAUD_THRESHOLD = 0.54
+# Prefixo do bucket com as versões do modelo (padrão: a pasta de S3_KEY_MODEL)
+S3_MODELS_PREFIX = os.getenv("S3_MODELS_PREFIX", S3_KEY_MODEL[:S3_KEY_MODEL.rfind("/") + 1])
+# Versão ativada pela API por último; sobrevive a reinícios
+ACTIVE_MODEL_PATH = TMP_DIR / "active_model.json"
+# Linhas usadas para aquecer um modelo antes de ativá-lo
+WARMUP_ROWS = 64
+# "incremental" usa o feature store; "full" roda o process_pipeline sobre todo o histórico;
+# "snapshot" pontua a partir do estado por entidade do histórico, persistido e nunca atualizado
+FEATURE_MODE = os.getenv("FEATURE_MODE", "incremental")
+FEATURE_STORE_PATH = TMP_DIR / "feature_store.joblib"
+SNAPSHOT_DIR = TMP_DIR / "snapshots"
+# No modo full, restringe o histórico aos cartões/terminais/card_bins do lote (mesmas features)
+SCOPED_HISTORY = os.getenv("SCOPED_HISTORY", "1") != "0"
+ARROW_CACHE_DIR = TMP_DIR / "arrow"
+# Download dos artefatos: GETs simultâneos, tamanho de cada parte (MB) e revalidação do sha256 do cache
+ARTIFACT_WORKERS = int(os.getenv("ARTIFACT_WORKERS", "8"))
+ARTIFACT_PART_MB = int(os.getenv("ARTIFACT_PART_MB", "16"))
+ARTIFACT_VERIFY_HASH = os.getenv("ARTIFACT_VERIFY_HASH", "0") == "1"
+# Processos que executam os jobs de pontuação em paralelo
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+# Linhas de resultado mantidas em memória por todos os jobs juntos; acima disso os resultados
+# dos jobs mais antigos ficam só nos logs de predição (/logs?job_id=...)
+JOB_RESULT_ROWS = int(os.getenv("JOB_RESULT_ROWS", "1000000"))
+# Versões mantidas carregadas em cada worker (a ativa e a anterior, para jobs enviados antes de uma troca)
+WORKER_MODELS_MAX = 2
+# Limite de transações por chamada JSON; acima disso, use o upload em lote
+MAX_TRANSACTIONS_PER_REQUEST = 1000
+# Coalescência das chamadas JSON: janela de espera (ms) com o scorer ocioso e linhas por passada
+MICROBATCH_WAIT_MS = float(os.getenv("MICROBATCH_WAIT_MS", "2"))
+MICROBATCH_MAX_ROWS = int(os.getenv("MICROBATCH_MAX_ROWS", MAX_TRANSACTIONS_PER_REQUEST))
+# Linhas por bloco na gravação dos logs de predição (memória limitada em lotes grandes)
+LOG_CHUNK_ROWS = 50_000
+# Cabeçalho que pede o detalhamento por estágio da requisição (devolvido em Server-Timing)
+PROFILE_HEADER = "X-Profile"
+# "0" desliga o caminho de inferência compilado e usa o predict_proba do sklearn
+COMPILED_INFERENCE = os.getenv("COMPILED_INFERENCE", "1") != "0"
 
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -61,10 +117,30 @@ Base = declarative_base()
 class PredictionLog(Base):
     __tablename__ = "prediction_logs"
     id = Column(Integer, primary_key=True, index=True)
-    request_timestamp = Column(DateTime, default=datetime.utcnow)
+    request_timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     transaction_id = Column(String, index=True, nullable=False)
     model_score = Column(Float, nullable=False)
     tx_approved = Column(Boolean, nullable=False)
+    # Job do upload em lote que gerou a predição (nulo nas predições unitárias)
+    job_id = Column(String, nullable=True)
+
+    # Índices da paginação por cursor de /logs: filtros de igualdade primeiro, id por último
+    __table_args__ = (
+        Index("ix_prediction_logs_job_id_id", "job_id", "id"),
+        Index("ix_prediction_logs_job_id_approved_id", "job_id", "tx_approved", "id"),
+        Index("ix_prediction_logs_approved_id", "tx_approved", "id"),
+    )
+
+def migrate_prediction_logs():
+    """create_all não altera tabelas existentes: adiciona job_id e os índices novos a bancos antigos."""
+    table = PredictionLog.__table__
+    columns = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        if "job_id" not in columns:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN job_id VARCHAR"))
+            print("[INFO] Coluna job_id adicionada a prediction_logs.")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 def get_db():
     db = SessionLocal()
@@ -78,72 +154,314 @@ class PredictionResult(BaseModel):
     model_score: float
     tx_approved: bool
 
+@dataclass
+class ScoredBatch:
+    """Predições de um lote em arrays, sem um objeto por linha."""
+    transaction_ids: np.ndarray
+    scores: np.ndarray
+    approved: np.ndarray
+
+    def __len__(self):
+        return len(self.scores)
+
+    def results(self, rows=None) -> List[PredictionResult]:
+        rows = range(len(self)) if rows is None else rows
+        return [
+            PredictionResult(
+                transaction_id=str(self.transaction_ids[i]),
+                model_score=float(self.scores[i]),
+                tx_approved=bool(self.approved[i]),
+            )
+            for i in rows
+        ]
+
+class PredictionLogEntry(BaseModel):
+    id: int
+    job_id: Optional[str] = None
+    request_timestamp: datetime
+    transaction_id: str
+    model_score: float
+    tx_approved: bool
+
+class PredictionLogPage(BaseModel):
+    logs: List[PredictionLogEntry]
+    # id do último log da página; passe como `cursor` para a próxima (None quando acabou)
+    next_cursor: Optional[int] = None
+    limit: int
+
+class TransactionFields(BaseModel):
+    tx_datetime: datetime
+    card_id: str
+    terminal_id: str
+    tx_amount: float
+    is_fraud: int = 0
+    is_transactional_fraud: int = 0
+    tx_fraud_report_date: Optional[datetime] = None
+
+class TransactionInput(TransactionFields):
+    transaction_id: str
+
 class BatchResponse(BaseModel):
+    job_id: str = Field(..., serialization_alias="jobId")
     message: str
     transactions_processed: int
 
+class StageTiming(BaseModel):
+    stage: str
+    seconds: float
+    rows_in: int
+    rows_out: int
+    rss_peak_mb: float
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    transactions: int
+    submitted_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    # Só para jobs enviados com o cabeçalho X-Profile
+    stages: Optional[List[StageTiming]] = None
+
+class ModelInfo(BaseModel):
+    id: str
+    name: str
+    version: str
+    created_at: Optional[datetime] = Field(None, serialization_alias="createdAt")
+    threshold: float
+    active: bool
+    loaded_at: Optional[datetime] = Field(None, serialization_alias="loadedAt")
+
+class ActivateModelRequest(BaseModel):
+    # Limiar da versão ativada; omitido, vale o do JSON da versão (ou o padrão)
+    threshold: Optional[float] = Field(None, ge=0, le=1)
+
+class JobResultResponse(BaseModel):
+    job_id: str
+    status: str
+    finished_at: Optional[datetime] = None
+    total: int
+    page: int
+    page_size: int
+    predictions: List[PredictionResult]
+
 
 # ==============================================================================
 #  ESTADO GLOBAL E LIFESPAN
 # ==============================================================================
 class AppState:
-    model = None
+    # Modelo ativo; trocado por atribuição, só depois de a versão nova estar carregada e aquecida
+    model: LoadedModel = None
+    registry: ModelRegistry = None
+    model_swap: asyncio.Lock = None
+    warmup_sample: pd.DataFrame = None
     payers_path: Path = None
     sellers_path: Path = None
-    transactional_path: Path = None
+    transactions_path: Path = None
+    tables: ArtifactTables = None
+    feature_store: FeatureStore = None
+    snapshot: HistorySnapshot = None
+    jobs: JobQueue = None
+    batcher: MicroBatcher = None
+    artifacts: ArtifactDownloader = None
 
 state = AppState()
 
-def download_from_s3(bucket: str, key: str, local_path: Path):
-    s3_client = boto3.client("s3")
+# Nos workers de jobs: versões já carregadas, por (chave, arquivo local), da menos para a mais recente
+worker_models = OrderedDict()
+
+@dataclass
+class WorkerSpec:
+    """O que cada worker do pool de jobs carrega ao iniciar (init_job_worker)."""
+    model: ModelRef
+    payers_path: Path
+    sellers_path: Path
+    transactions_path: Path = None
+
+def worker_spec() -> WorkerSpec:
+    return WorkerSpec(
+        model=state.model.ref,
+        payers_path=state.payers_path,
+        sellers_path=state.sellers_path,
+        transactions_path=state.transactions_path,
+    )
+
+def init_job_worker(spec: WorkerSpec):
+    """Initializer dos workers: monta em `state` o que os jobs enviados ao pool leem."""
+    RSS_SAMPLER.start()
+    use_model(spec.model)
+    if FEATURE_MODE in ("incremental", "snapshot"):
+        # As features saem do feature store (ou do snapshot) no processo principal; o pool só roda o predict
+        return
+    # Com o histórico restrito às entidades do lote, ele fica memory-mapped do cache Arrow (páginas
+    # compartilhadas entre os workers) e cada job converte para pandas só as linhas de que precisa
+    state.tables = load_tables(
+        spec.payers_path, spec.sellers_path, spec.transactions_path,
+        cache_dir=ARROW_CACHE_DIR, lazy=spec.transactions_path is None, mmap_history=SCOPED_HISTORY,
+    )
+    if SCOPED_HISTORY:
+        state.tables.entity_index
+
+def use_model(ref: ModelRef):
+    """Nos workers: torna `ref` o modelo do worker, carregando o arquivo só na primeira vez.
+
+    A troca a quente não recria o pool; cada job leva a referência do modelo ativo quando foi
+    enviado, então jobs enviados antes e depois de uma troca podem chegar ao mesmo worker.
+    """
+    key = (ref.version.key, ref.path)
+    loaded = worker_models.get(key)
+    if loaded is None:
+        loaded = load_model_file(ref.version, ref.path, ref.threshold, COMPILED_INFERENCE)
+        worker_models[key] = loaded
+        while len(worker_models) > WORKER_MODELS_MAX:
+            worker_models.popitem(last=False)
+    worker_models.move_to_end(key)
+    state.model = loaded if loaded.threshold == ref.threshold else loaded.with_threshold(ref.threshold)
+
+def with_model(ref: ModelRef, func, *args):
+    use_model(ref)
+    return func(*args)
+
+async def run_in_pool(func, *args):
+    """Roda `func(*args)` num worker do pool, com o modelo que está ativo no momento do envio."""
+    return await state.jobs.run_in_pool(with_model, state.model.ref, func, *args)
+
+def make_downloader() -> ArtifactDownloader:
+    # Um cliente para todos os downloads, com conexões suficientes para as partes simultâneas
+    client = boto3.client("s3", config=Config(max_pool_connections=ARTIFACT_WORKERS + 4))
+    return ArtifactDownloader(
+        client, S3_BUCKET, TMP_DIR,
+        part_size=ARTIFACT_PART_MB * 1024**2, workers=ARTIFACT_WORKERS, verify_hash=ARTIFACT_VERIFY_HASH,
+    )
+
+def load_feature_store() -> FeatureStore:
+    # Versões dos artefatos (ETag e tamanho): o histórico não precisa estar baixado para validar o store
+    signature = state.artifacts.signature([S3_KEY_PAYERS, S3_KEY_SELLERS, S3_KEY_TRANSACTIONAL])
+    store = FeatureStore.load(FEATURE_STORE_PATH, signature)
+    if store is not None:
+        print(f"[INFO] Feature store carregado de '{FEATURE_STORE_PATH}'.")
+        return store
+
+    print("[INFO] Construindo feature store a partir do histórico transacional...")
+    tables = state.tables
+    df_history = merge_train(tables.transactions, tables.payers_index, tables.sellers_index)
+    store = FeatureStore.build(df_history, signature)
+    store.save(FEATURE_STORE_PATH)
+    print(f"[INFO] Feature store salvo em '{FEATURE_STORE_PATH}'.")
+    return store
+
+def load_snapshot() -> HistorySnapshot:
+    # Conteúdo dos artefatos (sha256 do manifest, conferido a cada download)
+    digests = [
+        state.artifacts.manifest.get(key).sha256 for key in (S3_KEY_PAYERS, S3_KEY_SELLERS, S3_KEY_TRANSACTIONAL)
+    ]
+    key = snapshot_key(digests)
+    snapshot = HistorySnapshot.open(SNAPSHOT_DIR, key)
+    if snapshot is not None:
+        print(f"[INFO] Snapshot do histórico carregado de '{snapshot.directory}' ({snapshot.rows} transações).")
+        return snapshot
+
+    print("[INFO] Construindo snapshot do histórico transacional...")
+    tables = state.tables
+    df_history = merge_train(tables.transactions, tables.payers_index, tables.sellers_index)
+    return HistorySnapshot.build(SNAPSHOT_DIR, key, df_history)
+
+def startup_model() -> tuple:
+    """Chave e limiar do modelo a carregar: a última versão ativada pela API ou S3_KEY_MODEL."""
+    if ACTIVE_MODEL_PATH.exists():
+        try:
+            active = json.loads(ACTIVE_MODEL_PATH.read_text())
+            return active["key"], active.get("threshold")
+        except (ValueError, KeyError) as e:
+            print(f"[WARN] '{ACTIVE_MODEL_PATH}' inválido ({e}); usando S3_KEY_MODEL.")
+    return S3_KEY_MODEL, None
+
+def load_startup_model(download, key: str, threshold: float) -> LoadedModel:
     try:
-        if not local_path.exists():
-            local_path.parent.mkdir(parents=True, exist_ok=True)
-            print(f"[INFO] Baixando '{key}' do S3...")
-            s3_client.download_file(bucket, key, str(local_path))
-        else:
-            print(f"[INFO] Usando arquivo local cacheado: '{local_path}'.")
+        download.result()
+        return state.registry.load(state.registry.version_for_key(key), threshold)
     except Exception as e:
-        raise RuntimeError(f"Erro ao baixar '{key}' do bucket '{bucket}': {e}")
+        if key == S3_KEY_MODEL:
+            raise
+        print(f"[WARN] Modelo ativado anteriormente ('{key}') indisponível ({e}); usando S3_KEY_MODEL.")
+        return state.registry.load(state.registry.version_for_key(S3_KEY_MODEL))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Não no import: o forkserver pré-carrega este módulo e a thread não sobreviveria ao fork
+    RSS_SAMPLER.start()
     Base.metadata.create_all(bind=engine)
+    migrate_prediction_logs()
     print("[INFO] Tabelas do banco criadas/confirmadas.")
 
-    local_model = TMP_DIR / Path(S3_KEY_MODEL).name
-    local_payers = TMP_DIR / Path(S3_KEY_PAYERS).name
-    local_sellers_orig = TMP_DIR / Path(S3_KEY_SELLERS).name
-    local_transactional = TMP_DIR / Path(S3_KEY_TRANSACTIONAL).name
-
-    print("[INFO] Baixando artefatos do S3...")
-    download_from_s3(S3_BUCKET, S3_KEY_MODEL, local_model)
-    download_from_s3(S3_BUCKET, S3_KEY_PAYERS, local_payers)
-    download_from_s3(S3_BUCKET, S3_KEY_SELLERS, local_sellers_orig)
-    download_from_s3(S3_BUCKET, S3_KEY_TRANSACTIONAL, local_transactional)
-
-    df_sellers = pd.read_feather(local_sellers_orig)
-    if "latitude" not in df_sellers.columns or "longitude" not in df_sellers.columns:
-        df_sellers["latitude"] = df_sellers.get("latitude", np.nan)
-        df_sellers["longitude"] = df_sellers.get("longitude", np.nan)
-        patched_sellers = TMP_DIR / f"patched_{Path(S3_KEY_SELLERS).name}"
-        df_sellers.to_feather(patched_sellers)
-        state.sellers_path = patched_sellers
-        print(f"[INFO] Sellers 'patchado' salvo em {patched_sellers.name}")
-    else:
-        state.sellers_path = local_sellers_orig
-        print("[INFO] Sellers já continha lat/lon; usando conforme baixado.")
+    print("[INFO] Baixando artefatos do S3 em paralelo...")
+    state.artifacts = make_downloader()
+    state.registry = ModelRegistry(
+        state.artifacts.client, S3_BUCKET, S3_MODELS_PREFIX, state.artifacts, FRAUD_THRESHOLD,
+        compiled=COMPILED_INFERENCE,
+    )
+    model_key, model_threshold = startup_model()
+    downloads = {
+        key: state.artifacts.submit(key)
+        for key in (model_key, S3_KEY_PAYERS, S3_KEY_SELLERS, S3_KEY_TRANSACTIONAL)
+    }
+    transactional_download = downloads[S3_KEY_TRANSACTIONAL]
+
+    state.payers_path = downloads[S3_KEY_PAYERS].result()
+    state.sellers_path = downloads[S3_KEY_SELLERS].result()
+
+    # O processo principal só lê o histórico se o feature store ou o snapshot tiverem de ser
+    # reconstruídos (no modo full, quem o lê são os workers); o download dele segue em segundo
+    # plano enquanto o resto do startup avança
+    print("[INFO] Carregando payers e sellers em memória...")
+    state.tables = load_tables(
+        state.payers_path, state.sellers_path, transactional_download.result,
+        cache_dir=ARROW_CACHE_DIR, lazy=True,
+    )
+
+    if FEATURE_MODE == "incremental":
+        state.feature_store = load_feature_store()
+    elif FEATURE_MODE == "snapshot":
+        # O hash do conteúdo do histórico só existe depois do download (ou da validação do cache)
+        transactional_download.result()
+        state.snapshot = load_snapshot()
+    if not state.tables.transactions_loaded:
+        print("[INFO] Histórico transacional não é necessário agora; download continua em segundo plano.")
 
-    state.payers_path = local_payers
-    state.transactional_path = local_transactional
-    
     print("[INFO] Carregando modelo treinado...")
-    state.model = joblib.load(local_model)
-    print("[INFO] Modelo carregado.")
+    state.model = load_startup_model(downloads[model_key], model_key, model_threshold)
+    # Uma ativação por vez: duas trocas simultâneas não se intercalam (ver activate_model)
+    state.model_swap = asyncio.Lock()
+    print(
+        f"[INFO] Modelo '{state.model.version.version}' carregado (limiar {state.model.threshold}"
+        f"{', inferência compilada' if state.model.inference is not None else ''})."
+    )
+
+    if FEATURE_MODE == "full":
+        state.transactions_path = transactional_download.result()
+        # Grava o cache Arrow do histórico uma vez, antes de os workers o mapearem
+        read_arrow_table(state.transactions_path, TRANSACTION_COLUMNS, ARROW_CACHE_DIR)
+    # Os workers carregam modelo e tabelas por conta própria (init_job_worker), sem fork deste processo
+    state.jobs = JobQueue(
+        JOB_WORKERS, max_result_rows=JOB_RESULT_ROWS, initializer=init_job_worker, initargs=(worker_spec(),),
+    )
+    print(f"[INFO] Fila de jobs pronta com {JOB_WORKERS} worker(s).")
+
+    state.batcher = MicroBatcher(score_coalesced, max_rows=MICROBATCH_MAX_ROWS, max_wait_ms=MICROBATCH_WAIT_MS)
+    state.batcher.start()
 
     print("[INFO] Startup concluído. API pronta.")
     yield
 
+    await state.batcher.close()
+    await state.jobs.drain()
+    state.jobs.shutdown()
+    state.artifacts.shutdown()
+    if state.feature_store is not None:
+        state.feature_store.save(FEATURE_STORE_PATH)
+        print("[INFO] Feature store atualizado salvo em disco.")
+
 
 # ==============================================================================
 #  INSTÂNCIA DO APP E FUNÇÕES AUXILIARES
@@ -154,34 +472,258 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-def log_predictions_to_db(predictions: List[PredictionResult], db: Session):
-    print(f"[BACKGROUND] Iniciando salvamento de {len(predictions)} predições.")
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Duração por rota para /metrics e, com X-Profile: 1, os estágios da requisição em Server-Timing."""
+    started = time.perf_counter()
+    if request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+        request.state.profile = []
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    # Rota do template (ex.: /jobs/{job_id}), não o caminho, para não criar uma série por id
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    profile = request_profile(request)
+    if profile is not None:
+        response.headers["Server-Timing"] = server_timing(profile + [{"stage": "total", "seconds": elapsed}])
+    return response
+
+def request_profile(request: Request) -> Optional[list]:
+    """Relatório de estágios da requisição, se o cliente pediu profiling; None caso contrário."""
+    return getattr(request.state, "profile", None)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Histogramas por estágio e por rota no formato de texto do Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def _copy_writer(conn):
+    """Grava um bloco de linhas por COPY quando o banco é PostgreSQL com psycopg2; senão, None."""
+    if conn.dialect.name != "postgresql":
+        return None
+    cursor = conn.connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        return None
+    sql = (
+        f"COPY {PredictionLog.__tablename__} (request_timestamp, transaction_id, model_score, tx_approved, job_id) "
+        "FROM STDIN WITH (FORMAT csv)"
+    )
+
+    def write(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+    return write
+
+def log_predictions_to_db(batch: ScoredBatch, job_id: str = None, report: list = None):
+    """Grava as predições direto dos arrays, em blocos de LOG_CHUNK_ROWS linhas e numa única transação.
+
+    No PostgreSQL cada bloco vai por COPY; nos demais bancos, por um INSERT executemany do Core.
+    """
+    n = len(batch)
+    print(f"[BACKGROUND] Iniciando salvamento de {n} predições.")
+    started = time.perf_counter()
+    request_timestamp = datetime.utcnow()
     try:
-        db_logs = [PredictionLog(**pred.dict()) for pred in predictions]
-        db.add_all(db_logs)
-        db.commit()
-        print(f"[BACKGROUND] {len(predictions)} predições salvas com sucesso.")
+        with engine.begin() as conn:
+            copy = _copy_writer(conn)
+            for start in range(0, n, LOG_CHUNK_ROWS):
+                stop = min(start + LOG_CHUNK_ROWS, n)
+                rows = zip(
+                    batch.transaction_ids[start:stop],
+                    batch.scores[start:stop].tolist(),
+                    batch.approved[start:stop].tolist(),
+                )
+                if copy is not None:
+                    # job_id nulo vira campo vazio, que o COPY em csv lê como NULL
+                    copy((request_timestamp, str(tx_id), score, approved, job_id) for tx_id, score, approved in rows)
+                else:
+                    conn.execute(insert(PredictionLog.__table__), [
+                        {
+                            "request_timestamp": request_timestamp,
+                            "transaction_id": str(tx_id),
+                            "model_score": score,
+                            "tx_approved": approved,
+                            "job_id": job_id,
+                        }
+                        for tx_id, score, approved in rows
+                    ])
+        stages = []
+        record_stage(stages, 'log_write', started, n)
+        collect_stages(stages, report)
+        elapsed = stages[0]['seconds']
+        print(
+            f"[BACKGROUND] {n} predições salvas com sucesso em {elapsed:.2f}s "
+            f"({n / max(elapsed, 1e-9):,.0f} linhas/s)."
+        )
     except Exception as e:
         print(f"[BACKGROUND-ERROR] Falha ao salvar predições no banco: {e}")
-        db.rollback()
-    finally:
-        db.close()
+
+
+# ==============================================================================
+#  PONTUAÇÃO DOS LOTES (executada pelos jobs)
+# ==============================================================================
+class ScoringError(Exception):
+    """Falha de um job de pontuação; a mensagem vai para o status do job."""
+
+def history_scope():
+    """Índice para restringir o histórico às entidades do lote no process_pipeline (ou None)."""
+    return state.tables.entity_index if SCOPED_HISTORY else None
+
+def compute_features(df_transactions: pd.DataFrame, report: list = None) -> pd.DataFrame:
+    report = [] if report is None else report
+    if state.feature_store is not None:
+        try:
+            started = time.perf_counter()
+            df_batch = merge_test(df_transactions, state.tables.payers_index, state.tables.sellers_index)
+            record_stage(report, 'merge_test', started, df_batch, rows_in=len(df_transactions))
+            started = time.perf_counter()
+            df_features = state.feature_store.transform(df_batch)
+            record_stage(report, 'feature_store.transform', started, df_features, rows_in=len(df_batch))
+            started = time.perf_counter()
+            state.feature_store.update(df_batch, df_features)
+            record_stage(report, 'feature_store.update', started, df_batch)
+        except Exception as e:
+            raise ScoringError(f"Erro no pipeline de features: {e}")
+    elif state.snapshot is not None:
+        try:
+            started = time.perf_counter()
+            df_batch = merge_test(df_transactions, state.tables.payers_index, state.tables.sellers_index)
+            record_stage(report, 'merge_test', started, df_batch, rows_in=len(df_transactions))
+            # Só transform: o snapshot é o histórico e não recebe os lotes
+            df_features = state.snapshot.transform(df_batch, report=report)
+        except Exception as e:
+            raise ScoringError(f"Erro no pipeline de features: {e}")
+    else:
+        try:
+            df_features = process_pipeline(
+                state.tables.payers_index, state.tables.sellers_index, state.tables.transactions, df_transactions,
+                report=report, entity_index=history_scope(),
+            )
+        except Exception as e:
+            raise ScoringError(f"Erro no pipeline de features: {e}")
+    return df_features
+
+def score_features(df_features: pd.DataFrame, new_tx_ids: list, report: list = None):
+    # Uma única leitura do modelo ativo: a passada inteira usa a mesma versão, mesmo durante uma troca
+    active = state.model
+    report = [] if report is None else report
+    if df_features.empty:
+        raise ScoringError("Pipeline retornou DataFrame vazio.")
+
+    df_new_features = df_features[df_features["transaction_id"].isin(new_tx_ids)].copy()
+    if df_new_features.empty:
+        raise ScoringError("Nenhuma transaction_id enviada foi encontrada no resultado do pipeline.")
+
+    df_new_features = df_new_features.set_index('transaction_id').loc[new_tx_ids].reset_index()
+
+    X_test = df_new_features.drop(columns=["transaction_id"], errors="ignore")
+
+    # ================== SOLUÇÃO RÁPIDA E SUJA ==================
+    # Preenche QUALQUER NaN numérico restante com 0. Isso resolve o erro de conversão.
+    # (categóricas como 'regiao' não aceitam 0 como valor e nunca chegam nulas aqui)
+    numeric_cols = X_test.select_dtypes(include="number").columns
+    X_test[numeric_cols] = X_test[numeric_cols].fillna(0)
+    # ==========================================================
+
+    # Amostra real para aquecer o próximo modelo ativado (só tem efeito no processo principal)
+    state.warmup_sample = X_test.head(WARMUP_ROWS)
+
+    model_feature_names = active.feature_names
+    if model_feature_names is None:
+        print("[WARN] O modelo não possui 'feature_names_in_'. Pulando alinhamento.")
+    else:
+        missing_cols = set(model_feature_names) - set(X_test.columns)
+        if missing_cols:
+            raise ScoringError(f"Erro de alinhamento: colunas faltando {list(missing_cols)}")
+        X_test = X_test[model_feature_names]
+        print("[INFO] Colunas de entrada alinhadas com as esperadas pelo modelo.")
+
+    print("[INFO] Iniciando predição...")
+    try:
+        started = time.perf_counter()
+        y_proba = active.predict_positive(X_test)
+        y_pred = (y_proba < active.threshold)
+        record_stage(report, 'predict', started, y_proba, rows_in=len(X_test))
+    except Exception as e:
+        raise ScoringError(f"Erro durante a predição: {e}")
+    print("[INFO] Predição concluída.")
+    return y_proba, y_pred
+
+def features_and_score(df_transactions: pd.DataFrame, new_tx_ids: list, report: list = None):
+    return score_features(compute_features(df_transactions, report), new_tx_ids, report)
+
+def run_profiled(func, *args):
+    """Roda `func(*args, report=...)` e devolve (resultado, relatório); é o ponto de entrada nos workers."""
+    report = []
+    return func(*args, report=report), report
+
+def collect_stages(stages: list, report: list = None):
+    """Observa os estágios nas métricas de /metrics e, se houver, acrescenta-os ao relatório da requisição."""
+    observe_stages(stages)
+    if report is not None:
+        report.extend(stages)
+
+async def profiled(run, func, *args, report: list = None):
+    """`run(func, *args)` (run_serial ou run_in_pool) trazendo de volta o relatório de estágios.
+
+    Relatórios montados nos workers não chegariam ao processo principal de outro jeito.
+    """
+    result, stages = await run(run_profiled, func, *args)
+    collect_stages(stages, report)
+    return result
+
+def features_in_main_process() -> bool:
+    return state.feature_store is not None or state.snapshot is not None
+
+async def run_batch_job(job, df_transactions: pd.DataFrame, new_tx_ids: list) -> ScoredBatch:
+    if features_in_main_process():
+        # Feature store e snapshot são estado do processo principal: transform (+ update) em série,
+        # na ordem dos lotes; só o predict_proba vai para o pool
+        df_features = await profiled(state.jobs.run_serial, compute_features, df_transactions, report=job.profile)
+        y_proba, y_pred = await profiled(
+            run_in_pool, score_features, df_features, new_tx_ids, report=job.profile
+        )
+    else:
+        y_proba, y_pred = await profiled(
+            run_in_pool, features_and_score, df_transactions, new_tx_ids, report=job.profile
+        )
+
+    batch = ScoredBatch(np.asarray(new_tx_ids, dtype=object), np.asarray(y_proba), np.asarray(y_pred, dtype=bool))
+    await asyncio.get_running_loop().run_in_executor(None, log_predictions_to_db, batch, job.job_id, job.profile)
+    return batch
+
+async def score_coalesced(df_transactions: pd.DataFrame, new_tx_ids: list):
+    """Uma passada de features + predição para as requisições JSON agrupadas pelo MicroBatcher.
+
+    Devolve também o relatório de estágios da passada, compartilhado pelas requisições agrupadas.
+    """
+    report = []
+    # Mesma fila serial dos lotes: o feature store vê as transações na ordem de chegada
+    run = state.jobs.run_serial if features_in_main_process() else run_in_pool
+    y_proba, y_pred = await profiled(run, features_and_score, df_transactions, new_tx_ids, report=report)
+    return y_proba, y_pred, report
 
 
 # ==============================================================================
 #  ENDPOINT DE PREDIÇÃO
 # ==============================================================================
-@app.post("/predict_batch_file", response_model=BatchResponse)
+@app.post("/predict_batch_file", response_model=BatchResponse, status_code=202)
 async def predict_from_form(
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    request: Request,
     file: UploadFile = File(..., alias="file"),
 ):
+    stages = []
     try:
-        conteudo = await file.read()
-        df_transactions = pd.read_feather(io.BytesIO(conteudo))
+        # O upload já está num arquivo temporário do Starlette; lemos dele sem copiar para memória
+        started = time.perf_counter()
+        df_transactions = await run_in_threadpool(read_ipc_frame, file.file, TRANSACTION_COLUMNS)
+        record_stage(stages, 'upload_parse', started, df_transactions)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Falha ao ler o arquivo Feather: {e}")
+    profile = request_profile(request)
+    collect_stages(stages, profile)
 
     required_cols = {
         "is_transactional_fraud": 0, "is_fraud": 0, "tx_fraud_report_date": pd.NaT,
@@ -195,66 +737,276 @@ async def predict_from_form(
         raise HTTPException(status_code=400, detail="Coluna 'transaction_id' não encontrada no arquivo.")
     
     new_tx_ids = df_transactions["transaction_id"].tolist()
-    
-    tx2_path = TMP_DIR / f"tx2_{uuid.uuid4().hex}.feather"
-    df_transactions.to_feather(tx2_path)
-    
-    try:
-        df_features = process_pipeline(
-            state.payers_path, state.sellers_path, state.transactional_path, tx2_path
-        )
-    except Exception as e:
-        tx2_path.unlink(missing_ok=True)
-        raise HTTPException(status_code=500, detail=f"Erro no pipeline de features: {e}")
-    finally:
-        tx2_path.unlink(missing_ok=True)
 
-    if df_features.empty:
-        raise HTTPException(status_code=400, detail="Pipeline retornou DataFrame vazio.")
+    job = state.jobs.create(len(new_tx_ids))
+    if profile is not None:
+        # O detalhamento do job (features, predição, gravação) aparece em /jobs/{job_id}
+        job.profile = list(stages)
+    state.jobs.start(job, lambda job: run_batch_job(job, df_transactions, new_tx_ids))
+    print(f"[INFO] Job {job.job_id} criado para {len(new_tx_ids)} transações.")
 
-    df_new_features = df_features[df_features["transaction_id"].isin(new_tx_ids)].copy()
-    if df_new_features.empty:
-        raise HTTPException(status_code=400, detail="Nenhuma transaction_id enviada foi encontrada no resultado do pipeline.")
+    return BatchResponse(
+        job_id=job.job_id,
+        message="Lote recebido; acompanhe o processamento em /jobs/{job_id}.",
+        transactions_processed=len(new_tx_ids),
+    )
 
-    df_new_features = df_new_features.set_index('transaction_id').loc[new_tx_ids].reset_index()
 
-    X_test = df_new_features.drop(columns=["transaction_id"], errors="ignore")
+# ==============================================================================
+#  ENDPOINTS DE JOBS
+# ==============================================================================
+def get_job_or_404(job_id: str):
+    job = state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' não encontrado.")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    job = get_job_or_404(job_id)
+    return JobStatusResponse(
+        job_id=job.job_id,
+        status=job.status,
+        transactions=job.transactions,
+        submitted_at=job.submitted_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error,
+        stages=job.profile,
+    )
+
+@app.get("/jobs/{job_id}/result", response_model=JobResultResponse)
+async def get_job_result(
+    job_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=1000),
+    rejected_only: bool = False,
+):
+    job = get_job_or_404(job_id)
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=409, detail=f"Job falhou: {job.error}")
+    if job.status != JOB_DONE:
+        raise HTTPException(status_code=409, detail=f"Job ainda em processamento (status '{job.status}').")
+    if job.results_expired:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Resultado do job descartado da memória; as predições estão em /logs?job_id={job.job_id}.",
+        )
 
-    try:
-        model_feature_names = state.model.feature_names_in_
-        X_test = X_test[model_feature_names]
-        print("[INFO] Colunas de entrada alinhadas com as esperadas pelo modelo.")
-    except AttributeError:
-        print("[WARN] O modelo não possui 'feature_names_in_'. Pulando alinhamento.")
-    except KeyError as e:
-        missing_cols = set(model_feature_names) - set(X_test.columns)
-        raise HTTPException(status_code=500, detail=f"Erro de alinhamento: colunas faltando {list(missing_cols)}")
+    batch = job.results
+    rows = np.flatnonzero(~batch.approved) if rejected_only else np.arange(len(batch))
+    start = (page - 1) * page_size
+    return JobResultResponse(
+        job_id=job.job_id,
+        status=job.status,
+        finished_at=job.finished_at,
+        total=len(rows),
+        page=page,
+        page_size=page_size,
+        predictions=batch.results(rows[start:start + page_size]),
+    )
 
-    # ================== SOLUÇÃO RÁPIDA E SUJA ==================
-    # Preenche QUALQUER NaN restante com 0. Isso resolve o erro de conversão.
-    X_test.fillna(0, inplace=True)
-    # ==========================================================
 
-    print("[INFO] Iniciando predição...")
+# ==============================================================================
+#  ENDPOINT DE LOGS
+# ==============================================================================
+@app.get("/logs", response_model=PredictionLogPage)
+def get_prediction_logs(
+    job_id: Optional[str] = None,
+    tx_approved: Optional[bool] = None,
+    start: Optional[datetime] = Query(None, description="request_timestamp >= start"),
+    end: Optional[datetime] = Query(None, description="request_timestamp < end"),
+    cursor: Optional[int] = Query(None, description="next_cursor da página anterior"),
+    limit: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Logs de predição do mais recente para o mais antigo, paginados por cursor (id).
+
+    Cada página continua de `id < cursor` pelos índices (filtros, id), então o custo não cresce
+    com a profundidade da página como com OFFSET.
+    """
+    table = PredictionLog.__table__
+    query = select(table)
+    if job_id is not None:
+        query = query.where(table.c.job_id == job_id)
+    if tx_approved is not None:
+        query = query.where(table.c.tx_approved == tx_approved)
+    if start is not None:
+        query = query.where(table.c.request_timestamp >= start)
+    if end is not None:
+        query = query.where(table.c.request_timestamp < end)
+    if cursor is not None:
+        query = query.where(table.c.id < cursor)
+    # Uma linha a mais só para saber se existe próxima página
+    rows = db.execute(query.order_by(table.c.id.desc()).limit(limit + 1)).mappings().all()
+
+    logs = [PredictionLogEntry(**row) for row in rows[:limit]]
+    return PredictionLogPage(
+        logs=logs,
+        next_cursor=logs[-1].id if len(rows) > limit else None,
+        limit=limit,
+    )
+
+
+# ==============================================================================
+#  ENDPOINTS DE MODELOS
+# ==============================================================================
+def model_info(version) -> ModelInfo:
+    active = state.model
+    is_active = version.key == active.version.key
+    return ModelInfo(
+        id=version.version,
+        name=version.name,
+        version=version.version,
+        created_at=version.created_at,
+        threshold=active.threshold if is_active else version.threshold,
+        active=is_active,
+        loaded_at=active.loaded_at if is_active else None,
+    )
+
+def warmup_transactions(n: int) -> pd.DataFrame:
+    """Transações sintéticas de cartões e terminais conhecidos, para aquecer um modelo sem tráfego real."""
+    rng = np.random.default_rng(0)
+    payers, sellers = state.tables.payers, state.tables.sellers
+    return pd.DataFrame({
+        "transaction_id": [f"warmup-{i}" for i in range(n)],
+        "tx_datetime": pd.Timestamp.utcnow().tz_localize(None).floor("s") + pd.to_timedelta(np.arange(n), unit="s"),
+        "card_id": payers["card_id"].to_numpy()[rng.integers(0, len(payers), n)],
+        "terminal_id": sellers["terminal_id"].to_numpy()[rng.integers(0, len(sellers), n)],
+        "tx_amount": rng.lognormal(4, 1, n).round(2),
+        "is_fraud": 0,
+        "is_transactional_fraud": 0,
+        "tx_fraud_report_date": pd.NaT,
+    })
+
+def build_warmup_sample() -> pd.DataFrame:
+    df_transactions = warmup_transactions(WARMUP_ROWS)
+    if features_in_main_process():
+        # Só transform: as transações sintéticas não entram no estado do feature store
+        df_batch = merge_test(df_transactions, state.tables.payers_index, state.tables.sellers_index)
+        df_features = (state.feature_store or state.snapshot).transform(df_batch)
+    else:
+        df_features = process_pipeline(
+            state.tables.payers_index, state.tables.sellers_index, state.tables.transactions, df_transactions,
+            entity_index=history_scope(),
+        )
+    X = df_features[df_features["transaction_id"].astype(str).str.startswith("warmup-")].drop(columns=["transaction_id"])
+    numeric_cols = X.select_dtypes(include="number").columns
+    X[numeric_cols] = X[numeric_cols].fillna(0)
+    return X
+
+async def warmup_sample() -> pd.DataFrame:
+    if state.warmup_sample is not None and not state.warmup_sample.empty:
+        return state.warmup_sample
     try:
-        y_proba = state.model.predict_proba(X_test)[:, 1]
-        y_pred = (y_proba < FRAUD_THRESHOLD)
+        # No modo full o histórico só está carregado nos workers; nos demais, a fila serial
+        # evita que o transform concorra com o update de um lote em andamento
+        run = run_in_pool if FEATURE_MODE == "full" else state.jobs.run_serial
+        state.warmup_sample = await run(build_warmup_sample)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro durante a predição: {e}")
-    print("[INFO] Predição concluída.")
+        raise RegistryError(f"Falha ao montar a amostra de aquecimento: {e}")
+    return state.warmup_sample
 
-    results_to_log = [
-        PredictionResult(
-            transaction_id=str(tx_id),
-            model_score=float(prob),
-            tx_approved=bool(pred_flag),
-        )
-        for tx_id, prob, pred_flag in zip(new_tx_ids, y_proba, y_pred)
-    ]
+async def activate(loaded: LoadedModel):
+    """Carrega a versão nova nos workers de jobs e só então a torna o modelo ativo."""
+    # O pool continua o mesmo; jobs já enviados terminam com o modelo anterior, sem interrupção.
+    # Um envio por worker costuma alcançar todos; o que ficar de fora carrega no próximo job
+    try:
+        await asyncio.gather(*(state.jobs.run_in_pool(use_model, loaded.ref) for _ in range(state.jobs.workers)))
+    except Exception as e:
+        raise RegistryError(f"Falha ao iniciar os workers com o modelo '{loaded.version.version}': {e}") from e
+    state.model = loaded
+    ACTIVE_MODEL_PATH.write_text(json.dumps({"key": loaded.version.key, "threshold": loaded.threshold}))
+    print(f"[INFO] Modelo '{loaded.version.version}' ativo (limiar {loaded.threshold}).")
+
+@app.get("/models", response_model=List[ModelInfo])
+async def list_models():
+    versions = await run_in_threadpool(state.registry.refresh)
+    return [model_info(v) for v in versions]
+
+@app.get("/models/active", response_model=ModelInfo)
+async def get_active_model():
+    return model_info(state.model.version)
+
+@app.post("/models/{version}/activate", response_model=ModelInfo)
+async def activate_model(version: str, body: Optional[ActivateModelRequest] = None):
+    """Carrega, aquece e ativa uma versão; as requisições seguem no modelo anterior até a troca."""
+    threshold = body.threshold if body is not None else None
+    async with state.model_swap:
+        model_version = state.registry.get(version)
+        if model_version is None:
+            await run_in_threadpool(state.registry.refresh)
+            model_version = state.registry.get(version)
+        if model_version is None:
+            raise HTTPException(status_code=404, detail=f"Modelo '{version}' não encontrado.")
+
+        if model_version.key == state.model.version.key:
+            # Mesma versão: só o limiar muda, sem recarregar o modelo
+            loaded = state.model.with_threshold(model_version.threshold if threshold is None else threshold)
+        else:
+            try:
+                loaded = await run_in_threadpool(state.registry.load, model_version, threshold)
+                sample = await warmup_sample()
+                await run_in_threadpool(state.registry.warm, loaded, sample)
+            except RegistryError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+        try:
+            await activate(loaded)
+        except RegistryError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    return model_info(loaded.version)
 
-    background_tasks.add_task(log_predictions_to_db, results_to_log, SessionLocal())
 
-    return BatchResponse(
-        message="Predições processadas com sucesso e salvas em segundo plano.",
-        transactions_processed=len(new_tx_ids),
-    )
\ No newline at end of file
+# ==============================================================================
+#  ENDPOINTS DE PREDIÇÃO UNITÁRIA
+# ==============================================================================
+def transactions_frame(transactions: List[TransactionInput]) -> pd.DataFrame:
+    df = pd.DataFrame([t.dict() for t in transactions])
+    for col in ("tx_datetime", "tx_fraud_report_date"):
+        # Instantes com fuso viram UTC sem fuso, como os do histórico
+        df[col] = pd.to_datetime(df[col], utc=True).dt.tz_localize(None)
+    return df
+
+async def score_transactions_now(
+    transactions: List[TransactionInput], background_tasks: BackgroundTasks, profile: list = None,
+) -> ScoredBatch:
+    df_transactions = transactions_frame(transactions)
+    new_tx_ids = df_transactions["transaction_id"].tolist()
+    try:
+        # Requisições simultâneas são pontuadas juntas numa única passada de features + predição
+        y_proba, y_pred, stages = await state.batcher.submit(df_transactions, new_tx_ids)
+    except ScoringError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except BatcherClosed as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if profile is not None:
+        # Estágios da passada inteira, que pode ter incluído outras requisições
+        profile.extend(stages)
+
+    batch = ScoredBatch(np.asarray(new_tx_ids, dtype=object), np.asarray(y_proba), np.asarray(y_pred, dtype=bool))
+    background_tasks.add_task(log_predictions_to_db, batch)
+    return batch
+
+@app.post("/predict/transaction/{transaction_id}", response_model=PredictionResult)
+async def predict_transaction(
+    transaction_id: str, transaction: TransactionFields, background_tasks: BackgroundTasks, request: Request,
+):
+    batch = await score_transactions_now(
+        [TransactionInput(transaction_id=transaction_id, **transaction.dict())], background_tasks,
+        request_profile(request),
+    )
+    return batch.results()[0]
+
+@app.post("/predict/transactions", response_model=List[PredictionResult])
+async def predict_transactions(
+    transactions: List[TransactionInput], background_tasks: BackgroundTasks, request: Request,
+):
+    if not transactions:
+        raise HTTPException(status_code=400, detail="Nenhuma transação enviada.")
+    if len(transactions) > MAX_TRANSACTIONS_PER_REQUEST:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo de {MAX_TRANSACTIONS_PER_REQUEST} transações por chamada; use /predict_batch_file.",
+        )
+    batch = await score_transactions_now(transactions, background_tasks, request_profile(request))
+    return batch.results()
@@ -0,0 +1,279 @@
+"""
+artifacts.py
+
+Download dos artefatos da API (modelo, payers, sellers e histórico
+transacional) do S3 para o diretório local.
+
+- Um único cliente boto3 (thread-safe) atende todos os downloads, que correm
+  em paralelo; objetos grandes são baixados em partes por GETs com Range, também
+  em paralelo.
+- Downloads interrompidos são retomados: as partes já gravadas ficam registradas
+  ao lado do arquivo parcial e só as que faltam são baixadas de novo, desde que
+  o objeto (ETag) não tenha mudado.
+- Um manifest local guarda ETag, tamanho e sha256 de cada arquivo baixado. Um
+  arquivo em cache só é usado se bater com o manifest e com o HEAD do objeto, de
+  modo que um arquivo truncado ou de outra versão é baixado de novo. ETags de
+  uploads simples (MD5 do conteúdo) também são conferidos após o download.
+
+O cliente pode ser qualquer um compatível com boto3, por exemplo apontado para
+um S3 local (moto) em testes.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "artifacts_manifest.json"
+DEFAULT_PART_SIZE = 16 * 1024**2
+READ_CHUNK = 1024**2
+
+
+class ArtifactError(RuntimeError):
+    """Falha ao obter ou validar um artefato."""
+
+
+@dataclass
+class RemoteObject:
+    etag: str
+    size: int
+
+
+@dataclass
+class ManifestEntry:
+    key: str
+    etag: str
+    size: int
+    sha256: str
+
+
+def _strip_etag(etag: str) -> str:
+    return etag.strip('"')
+
+
+def file_digests(path: Path) -> tuple:
+    """(sha256, md5) do conteúdo de `path`, lido uma única vez."""
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+class ArtifactManifest:
+    """ETag, tamanho e sha256 de cada artefato baixado, persistidos em JSON."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                raw = json.loads(self.path.read_text())
+                self.entries = {key: ManifestEntry(**entry) for key, entry in raw.items()}
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Manifest de artefatos inválido em {self.path} ({e}); será recriado.")
+
+    def get(self, key: str) -> ManifestEntry:
+        return self.entries.get(key)
+
+    def put(self, entry: ManifestEntry):
+        with self._lock:
+            self.entries[entry.key] = entry
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp_path.write_text(json.dumps({k: asdict(e) for k, e in self.entries.items()}, indent=2))
+            tmp_path.replace(self.path)
+
+
+class ArtifactDownloader:
+    """Baixa e valida artefatos de um bucket, com cache local conferido pelo manifest."""
+
+    def __init__(self, client, bucket: str, local_dir: Path, part_size: int = DEFAULT_PART_SIZE,
+                 workers: int = 8, verify_hash: bool = False):
+        self.client = client
+        self.bucket = bucket
+        self.local_dir = Path(local_dir)
+        self.local_dir.mkdir(parents=True, exist_ok=True)
+        self.part_size = part_size
+        # Revalida o sha256 dos arquivos em cache a cada startup (por padrão, só ETag e tamanho)
+        self.verify_hash = verify_hash
+        self.manifest = ArtifactManifest(self.local_dir / MANIFEST_NAME)
+        # Pools separados: um download de arquivo espera pelas suas partes sem ocupar as vagas delas
+        self.file_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="artifact")
+        self.part_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artifact-part")
+        self._remote = {}
+        self._key_locks = {}
+        self._locks_guard = threading.Lock()
+        self._closing = threading.Event()
+
+    def local_path(self, key: str) -> Path:
+        return self.local_dir / Path(key).name
+
+    # ------------------------------------------------------------------
+    #  Estado remoto
+    # ------------------------------------------------------------------
+    def remote(self, key: str) -> RemoteObject:
+        """ETag e tamanho do objeto (HEAD, uma vez por chave); None se o S3 não responder."""
+        if key not in self._remote:
+            try:
+                head = self.client.head_object(Bucket=self.bucket, Key=key)
+                self._remote[key] = RemoteObject(_strip_etag(head["ETag"]), int(head["ContentLength"]))
+            except Exception as e:
+                logger.warning(f"HEAD de '{key}' falhou: {e}")
+                self._remote[key] = None
+        return self._remote[key]
+
+    def signature(self, keys) -> tuple:
+        """Identidade das versões dos artefatos (ETag e tamanho), sem precisar dos arquivos locais."""
+        signature = []
+        for key in keys:
+            remote = self.remote(key) or self.manifest.get(key)
+            if remote is None:
+                raise ArtifactError(f"Versão de '{key}' desconhecida: S3 indisponível e sem cache.")
+            signature.append((Path(key).name, remote.etag, remote.size))
+        return tuple(signature)
+
+    # ------------------------------------------------------------------
+    #  Cache local
+    # ------------------------------------------------------------------
+    def _cached(self, key: str, path: Path, remote: RemoteObject) -> bool:
+        """Se o arquivo local é a versão atual do objeto, íntegra."""
+        if not path.exists():
+            return False
+        size = path.stat().st_size
+        entry = self.manifest.get(key)
+        if entry is None:
+            # Cache anterior ao manifest: só é adotado se o conteúdo bater com o objeto
+            if remote is None or size != remote.size or "-" in remote.etag:
+                return False
+            sha256, md5 = file_digests(path)
+            if md5 != remote.etag:
+                return False
+            self.manifest.put(ManifestEntry(key, remote.etag, size, sha256))
+            return True
+        if size != entry.size:
+            logger.warning(f"'{path}' tem {size} bytes, o manifest registra {entry.size}; baixando de novo.")
+            return False
+        if remote is not None and (remote.etag, remote.size) != (entry.etag, entry.size):
+            logger.info(f"'{key}' mudou no S3 (ETag {entry.etag} -> {remote.etag}); baixando de novo.")
+            return False
+        if self.verify_hash and file_digests(path)[0] != entry.sha256:
+            logger.warning(f"sha256 de '{path}' não confere com o manifest; baixando de novo.")
+            return False
+        return True
+
+    # ------------------------------------------------------------------
+    #  Download
+    # ------------------------------------------------------------------
+    def submit(self, key: str) -> Future:
+        """Agenda `fetch(key)` em segundo plano."""
+        return self.file_pool.submit(self.fetch, key)
+
+    def fetch(self, key: str) -> Path:
+        """Caminho local de `key`, baixando-o se o cache estiver ausente, incompleto ou desatualizado."""
+        # Chamadas simultâneas para a mesma chave esperam a primeira em vez de disputar o .part
+        with self._locks_guard:
+            lock = self._key_locks.setdefault(key, threading.Lock())
+        with lock:
+            return self._fetch(key)
+
+    def _fetch(self, key: str) -> Path:
+        path = self.local_path(key)
+        remote = self.remote(key)
+        if self._cached(key, path, remote):
+            if remote is None:
+                logger.warning(f"S3 indisponível; usando '{path}' conforme o manifest local.")
+            else:
+                logger.info(f"Usando arquivo local cacheado: '{path}'.")
+            return path
+        if remote is None:
+            raise ArtifactError(f"Erro ao baixar '{key}' do bucket '{self.bucket}': S3 indisponível e sem cache válido.")
+
+        logger.info(f"Baixando '{key}' do S3 ({remote.size / 1024**2:.1f} MB)...")
+        try:
+            self._download(key, path, remote)
+        except ArtifactError:
+            raise
+        except Exception as e:
+            raise ArtifactError(f"Erro ao baixar '{key}' do bucket '{self.bucket}': {e}") from e
+
+        sha256, md5 = file_digests(path)
+        if "-" not in remote.etag and md5 != remote.etag:
+            path.unlink()
+            raise ArtifactError(f"'{key}' baixado com MD5 {md5}, diferente do ETag {remote.etag}.")
+        self.manifest.put(ManifestEntry(key, remote.etag, remote.size, sha256))
+        logger.info(f"'{key}' baixado e validado.")
+        return path
+
+    def _download(self, key: str, path: Path, remote: RemoteObject):
+        part_path = path.with_name(path.name + ".part")
+        progress_path = path.with_name(path.name + ".part.json")
+        ranges = [
+            (start, min(start + self.part_size, remote.size) - 1)
+            for start in range(0, remote.size, self.part_size)
+        ]
+
+        done = set()
+        if part_path.exists() and progress_path.exists():
+            try:
+                progress = json.loads(progress_path.read_text())
+                if (progress["etag"], progress["size"], progress["part_size"]) == (remote.etag, remote.size, self.part_size):
+                    done = set(progress["done"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        if done and part_path.stat().st_size == remote.size:
+            logger.info(f"Retomando '{key}': {len(done)}/{len(ranges)} partes já baixadas.")
+        else:
+            done = set()
+            with open(part_path, "wb") as f:
+                f.truncate(remote.size)
+
+        def save_progress():
+            progress_path.write_text(json.dumps({
+                "etag": remote.etag, "size": remote.size, "part_size": self.part_size, "done": sorted(done),
+            }))
+
+        futures = {
+            self.part_pool.submit(self._download_part, key, remote.etag, part_path, start, end): i
+            for i, (start, end) in enumerate(ranges) if i not in done
+        }
+        try:
+            for future in as_completed(futures):
+                future.result()
+                done.add(futures[future])
+                save_progress()
+        finally:
+            for future in futures:
+                future.cancel()
+        part_path.replace(path)
+        progress_path.unlink(missing_ok=True)
+
+    def _download_part(self, key: str, etag: str, part_path: Path, start: int, end: int):
+        if self._closing.is_set():
+            raise ArtifactError("Download interrompido.")
+        # IfMatch: falha em vez de misturar partes de versões diferentes do objeto
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=f'"{etag}"'
+        )
+        with open(part_path, "r+b") as f:
+            f.seek(start)
+            written = 0
+            for chunk in response["Body"].iter_chunks(READ_CHUNK):
+                if self._closing.is_set():
+                    raise ArtifactError("Download interrompido.")
+                f.write(chunk)
+                written += len(chunk)
+        if written != end - start + 1:
+            raise ArtifactError(f"Parte {start}-{end} de '{key}' veio com {written} bytes.")
+
+    def shutdown(self):
+        """Interrompe downloads em andamento; o progresso fica salvo para a retomada."""
+        self._closing.set()
+        self.part_pool.shutdown(wait=True, cancel_futures=True)
+        self.file_pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,147 @@
+"""
+batching.py
+
+Coalescência das requisições de pontuação pequenas.
+
+Cada chamada a /predict/transaction(s) pagaria sozinha a geração de features e
+um predict_proba. O MicroBatcher junta as requisições que chegam juntas numa
+fila única e pontua todas numa só passada vetorizada, devolvendo a cada
+chamador a sua fatia dos scores:
+
+- com o scorer ocioso, a primeira requisição espera no máximo `max_wait_ms`
+  por companhia (a janela fecha antes se `max_rows` linhas chegarem);
+- com o scorer ocupado, as requisições se acumulam durante a passada em curso
+  e a próxima sai sem janela nenhuma, então a espera extra só existe quando
+  não há carga.
+
+As requisições são atendidas na ordem de chegada; uma requisição cujas
+transaction_ids repetem as de outra já agrupada fica para a passada seguinte.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Request:
+    df: pd.DataFrame
+    tx_ids: list
+    future: asyncio.Future
+
+
+class BatcherClosed(Exception):
+    """O MicroBatcher foi encerrado antes de pontuar a requisição."""
+
+
+class MicroBatcher:
+    """Fila de requisições de pontuação, pontuadas em lotes por uma única tarefa.
+
+    `score(df_transactions, tx_ids)` é a corrotina que pontua um lote e devolve
+    `(y_proba, y_pred, report)`: scores na ordem de `tx_ids` e o relatório de
+    estágios da passada, entregue inteiro a cada requisição agrupada nela.
+    """
+
+    def __init__(self, score, max_rows: int = 1000, max_wait_ms: float = 2.0):
+        self.score = score
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.requests = 0
+        self._pending = []
+        self._pending_rows = 0
+        self._inflight = []
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, df_transactions: pd.DataFrame, tx_ids: list):
+        """Enfileira um lote pequeno e espera pelos seus `(y_proba, y_pred, report)`."""
+        if self._task is None or self._task.done():
+            raise BatcherClosed("Fila de pontuação encerrada.")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Request(df_transactions, tx_ids, future))
+        self._pending_rows += len(tx_ids)
+        self._arrived.set()
+        if self._pending_rows >= self.max_rows:
+            self._full.set()
+        return await future
+
+    def _take(self) -> list:
+        """Tira da fila as requisições da próxima passada (ao menos uma)."""
+        batch, rows, ids = [], 0, set()
+        while self._pending:
+            request = self._pending[0]
+            if batch and (rows + len(request.tx_ids) > self.max_rows or not ids.isdisjoint(request.tx_ids)):
+                break
+            self._pending.pop(0)
+            batch.append(request)
+            rows += len(request.tx_ids)
+            ids.update(request.tx_ids)
+        self._pending_rows -= rows
+        if not self._pending:
+            self._arrived.clear()
+        if self._pending_rows < self.max_rows:
+            self._full.clear()
+        return batch
+
+    async def _run(self):
+        backlog = False
+        while True:
+            await self._arrived.wait()
+            # Janela só com o scorer ocioso: havendo fila acumulada, pontua de imediato
+            if not backlog and self.max_wait > 0 and self._pending_rows < self.max_rows:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._inflight = self._take()
+            await self._dispatch(self._inflight)
+            self._inflight = []
+            backlog = bool(self._pending)
+
+    async def _dispatch(self, batch: list):
+        if len(batch) == 1:
+            df_transactions, tx_ids = batch[0].df, batch[0].tx_ids
+        else:
+            df_transactions = pd.concat([r.df for r in batch], ignore_index=True)
+            tx_ids = [tx_id for r in batch for tx_id in r.tx_ids]
+        self.batches += 1
+        self.requests += len(batch)
+        logger.debug(f"Pontuando {len(batch)} requisição(ões) com {len(tx_ids)} transações numa passada.")
+
+        try:
+            y_proba, y_pred, report = await self.score(df_transactions, tx_ids)
+        except Exception as e:
+            # A passada é uma só: a falha vale para todas as requisições agrupadas nela
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            n = len(request.tx_ids)
+            # O chamador pode ter desistido (conexão fechada) enquanto esperava
+            if not request.future.done():
+                request.future.set_result((y_proba[offset:offset + n], y_pred[offset:offset + n], report))
+            offset += n
+
+    async def close(self):
+        """Para a tarefa de pontuação e falha as requisições que ainda estavam na fila."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for request in self._inflight + self._pending:
+            if not request.future.done():
+                request.future.set_exception(BatcherClosed("Fila de pontuação encerrada."))
+        self._inflight = []
+        self._pending.clear()
+        self._pending_rows = 0
@@ -1,24 +1,31 @@
 #!/usr/bin/env python3
 """
-feature_pipeline.py
-
-Script único que faz:
-  1. Mescla payers, sellers e transactions.
-  2. Gera todas as features em sequência.
-  3. Salva o resultado final em Parquet.
-
-Uso:
-  python feature_pipeline.py \
-    --payers PATH_Payers.feather \
-    --sellers PATH_Sellers.feather \
-    --transactions PATH_Transactions.feather \
-    --output PATH_Output.parquet
+data_processing.py
+
+Motor de features compartilhado pela API e pelo treino (scripts/preprocess.py):
+  1. Carrega e mescla payers, sellers e transactions.
+  2. Gera as features com os estágios registrados em FEATURE_STAGES, cada um
+     declarando as colunas que lê e as que escreve.
+  3. Remove as colunas auxiliares, mantendo transaction_id para a API.
 """
 
+import bisect
 import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
 
 # Configuração básica de logging
 logging.basicConfig(
@@ -27,37 +34,448 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def run_merge(
-    payers_path: Path,
-    sellers_path: Path,
-    tx1_path: Path,   # transactions_train (≈ 5M)
-    tx2_path: Path    # transactions_test  (≈ 1M)
-) -> pd.DataFrame:
-    # 1) Lê payers e prepara card_id
-    df_payers = pd.read_feather(payers_path)
+# Colunas que o pipeline consome de cada artefato; o resto nunca chega às features
+PAYERS_COLUMNS = ['card_id', 'card_hash', 'card_bin', 'card_first_transaction']
+SELLERS_COLUMNS = ['terminal_id', 'latitude', 'longitude', 'terminal_operation_start']
+TRANSACTION_COLUMNS = [
+    'transaction_id', 'tx_datetime', 'card_id', 'terminal_id',
+    'tx_amount', 'is_fraud', 'tx_fraud_report_date',
+]
+
+# Schema compacto do frame transacional: ids como categorias (códigos int32 em vez de strings
+# Python), flags e contagens em inteiros estreitos e features calculadas em float32. Instantes
+# continuam em datetime64[ns], que é o que os kernels de janela consomem, e valores e
+# coordenadas de entrada continuam em float64: as médias e variâncias acumuladas de
+# amount_*_norm_pdf e o haversine são sensíveis ao arredondamento dessas colunas.
+REGIAO_DTYPE = pd.CategoricalDtype(['Norte', 'Centro-Oeste', 'Sudeste', 'Desconhecida'])
+FRAME_SCHEMA = {
+    # Entradas
+    'card_id': 'category',
+    'terminal_id': 'category',
+    'card_bin': 'category',
+    'is_fraud': 'int8',
+    'is_transactional_fraud': 'int8',
+    # Features
+    'tx_hour_of_day': 'int8',
+    'tx_dayofweek': 'int8',
+    'regiao': REGIAO_DTYPE,
+    'card_age_days': 'int32',
+    'terminal_age_days': 'int32',
+    'tx_time_diff_prev': 'float32',
+    'amount_card_norm_pdf': 'float32',
+    'amount_terminal_norm_pdf': 'float32',
+    'terminal_card_reuse_ratio_prior': 'float32',
+    'shared_terminal_with_frauds_prior': 'int32',
+    'card_fraud_count_last_1d': 'int32',
+    'card_nonfraud_count_last_1d': 'int32',
+    'card_fraud_count_last_7d': 'int32',
+    'card_nonfraud_count_last_7d': 'int32',
+    'avg_speed_between_txs': 'float32',
+    'cardbin_fraud_count_last_30d': 'int32',
+}
+
+
+def apply_schema(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """Converte in place as colunas presentes (ou só `columns`) para os dtypes de FRAME_SCHEMA."""
+    for col in df.columns if columns is None else columns:
+        dtype = FRAME_SCHEMA.get(col)
+        if dtype is None or col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype == 'category':
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif pd.api.types.is_integer_dtype(dtype) and df[col].isna().any():
+            # Inteiros não guardam NaN; a coluna segue no dtype original
+            continue
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    """pd.concat que unifica as categorias das colunas categóricas em vez de degradá-las para object.
+
+    As categorias ficam ordenadas, para que os códigos sigam a ordem lexicográfica das chaves
+    (a mesma que o factorize(sort=True) do SortCache produzia sobre as strings).
+    """
+    for col in frames[0].columns:
+        series = [f[col] for f in frames if col in f.columns]
+        if not all(isinstance(s.dtype, pd.CategoricalDtype) for s in series):
+            continue
+        categories = series[0].cat.categories
+        for s in series[1:]:
+            categories = categories.union(s.cat.categories)
+        for f in frames:
+            if col in f.columns and not f[col].cat.categories.equals(categories):
+                f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+class ArtifactTables:
+    """Payers, sellers e histórico transacional carregados uma vez e compartilhados entre requisições.
+
+    O histórico pode vir como `load_transactions` (função sem argumentos), chamada só no
+    primeiro acesso a `transactions`, e pode ser um DataFrame ou uma tabela Arrow memory-mapped
+    (ver `history_frame`). O índice de entidades do histórico (`entity_index`) também é montado
+    só no primeiro acesso.
+    """
+
+    def __init__(self, payers: pd.DataFrame, sellers: pd.DataFrame, transactions=None,
+                 load_transactions: Callable[[], object] = None):
+        self.payers = payers
+        self.sellers = sellers
+        self._transactions = transactions
+        self._load_transactions = load_transactions
+        self._lock = threading.Lock()
+        self._entity_index = None
+        # Índices densos das dimensões, montados uma vez e reutilizados em cada merge
+        self.payers_index = DimensionIndex(self.payers, 'card_id')
+        self.sellers_index = DimensionIndex(self.sellers, 'terminal_id')
+
+    @property
+    def transactions_loaded(self) -> bool:
+        return self._transactions is not None
+
+    @property
+    def transactions(self):
+        if self._transactions is None:
+            with self._lock:
+                if self._transactions is None:
+                    self._transactions = self._load_transactions()
+        return self._transactions
+
+    @property
+    def entity_index(self) -> "EntityIndex":
+        if self._entity_index is None:
+            # Fora do lock: o acesso ao histórico pode ter de carregá-lo, sob o mesmo lock
+            transactions = self.transactions
+            with self._lock:
+                if self._entity_index is None:
+                    self._entity_index = EntityIndex(transactions, self.payers_index)
+        return self._entity_index
+
+
+def read_arrow_table(path: Path, columns: list = None, cache_dir: Path = None) -> pa.Table:
+    """Lê um feather como tabela Arrow memory-mapped, projetando só `columns`.
+
+    Feathers comprimidos não podem ser mapeados sem descompressão; com `cache_dir`, o arquivo
+    é regravado uma única vez como Arrow IPC sem compressão e as leituras seguintes mapeiam
+    essas páginas (compartilhadas entre workers pelo page cache do sistema).
+    """
+    path = Path(path)
+    source = path
+    if cache_dir is not None:
+        source = Path(cache_dir) / f"{path.stem}.arrow"
+        if not source.exists() or source.stat().st_mtime < path.stat().st_mtime:
+            source.parent.mkdir(parents=True, exist_ok=True)
+            table = feather.read_table(path)
+            tmp_path = source.with_suffix('.arrow.tmp')
+            with pa.OSFile(str(tmp_path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            tmp_path.replace(source)
+    try:
+        table = pa.ipc.open_file(pa.memory_map(str(source), 'r')).read_all()
+    except pa.ArrowInvalid:
+        # Feather v1 não é Arrow IPC
+        table = feather.read_table(source)
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+
+def read_ipc_frame(source, columns: list = None) -> pd.DataFrame:
+    """Lê um Feather/Arrow IPC de um arquivo aberto (ex.: upload) record batch a record batch.
+
+    Cada batch é projetado em `columns` assim que é lido, então as colunas descartadas nunca
+    ficam todas em memória ao mesmo tempo; o resultado vai direto para o pipeline, sem
+    regravar o arquivo em disco.
+    """
+    try:
+        reader = pa.ipc.open_file(source)
+        schema = reader.schema
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        # Arrow IPC em formato stream ou Feather v1
+        source.seek(0)
+        try:
+            reader = pa.ipc.open_stream(source)
+            schema = reader.schema
+            batches = iter(reader)
+        except pa.ArrowInvalid:
+            source.seek(0)
+            table = feather.read_table(source)
+            keep = [c for c in columns if c in table.column_names] if columns else table.column_names
+            return _arrow_to_pandas(table.select(keep))
+    keep = [c for c in columns if c in schema.names] if columns else schema.names
+    projected = pa.schema([schema.field(c) for c in keep])
+    table = pa.Table.from_batches([batch.select(keep) for batch in batches], schema=projected)
+    return _arrow_to_pandas(table)
+
+
+def _arrow_to_pandas(table: pa.Table, categorical=()) -> pd.DataFrame:
+    # Colunas categóricas são codificadas ainda no Arrow, sem materializar strings Python
+    for col in categorical:
+        if col in table.column_names:
+            i = table.column_names.index(col)
+            table = table.set_column(i, col, table.column(i).dictionary_encode())
+    df = table.to_pandas(split_blocks=True, self_destruct=False)
+    for col in categorical:
+        if col in df.columns:
+            # Categorias ordenadas, como em astype('category')
+            df[col] = df[col].cat.reorder_categories(df[col].cat.categories.sort_values())
+    # Os kernels trabalham com instantes em ns
+    for col in df.columns:
+        if pd.api.types.is_datetime64_dtype(df[col]) and df[col].dtype != 'datetime64[ns]':
+            df[col] = df[col].astype('datetime64[ns]')
+    return df
+
+
+def read_transactions(transactions_path: Path, cache_dir: Path = None) -> pd.DataFrame:
+    df_tx = history_frame(read_arrow_table(transactions_path, TRANSACTION_COLUMNS, cache_dir))
+    logger.info(
+        f"Histórico transacional carregado: {len(df_tx)} transações "
+        f"({df_tx.memory_usage(deep=True).sum() / 1024**2:.1f} MB)."
+    )
+    return df_tx
+
+
+def history_frame(transactions, rows: np.ndarray = None) -> pd.DataFrame:
+    """Linhas `rows` (todas, sem `rows`) do histórico, dado como DataFrame, tabela Arrow ou caminho.
+
+    De uma tabela Arrow só as linhas pedidas viram pandas: com o histórico memory-mapped do cache
+    Arrow, processos que o leem compartilham as páginas pelo page cache e cada um materializa só
+    o recorte de que precisa.
+    """
+    if isinstance(transactions, pa.Table):
+        table = transactions if rows is None else transactions.take(rows)
+        return apply_schema(_arrow_to_pandas(table, categorical=['card_id', 'terminal_id']))
+    df_tx = _read_frame(transactions)
+    return df_tx if rows is None else df_tx.take(rows)
+
+
+def load_tables(payers_path: Path, sellers_path: Path, transactions_path, cache_dir: Path = None,
+                lazy: bool = False, mmap_history: bool = False) -> ArtifactTables:
+    """Carrega os artefatos; `transactions_path` pode ser uma função que devolve o caminho (ex.: esperando
+    o download). Com `lazy`, o histórico só é lido no primeiro acesso a `tables.transactions`; com
+    `mmap_history`, ele fica como a tabela Arrow memory-mapped de `cache_dir`, sem cópia em pandas."""
+    # As chaves das dimensões ficam como object: são o índice dos joins, não colunas do frame
+    df_payers = read_payers(_arrow_to_pandas(
+        read_arrow_table(payers_path, PAYERS_COLUMNS, cache_dir), categorical=['card_bin']
+    ))
+    df_sellers = _arrow_to_pandas(read_arrow_table(sellers_path, SELLERS_COLUMNS, cache_dir))
+    for c in ["latitude", "longitude"]:
+        if c not in df_sellers.columns:
+            df_sellers[c] = np.nan
+    logger.info(f"Dimensões carregadas: {len(df_payers)} payers, {len(df_sellers)} sellers.")
+
+    def load_transactions():
+        path = transactions_path() if callable(transactions_path) else transactions_path
+        if mmap_history:
+            return read_arrow_table(path, TRANSACTION_COLUMNS, cache_dir)
+        return read_transactions(path, cache_dir)
+
+    if lazy:
+        return ArtifactTables(df_payers, df_sellers, load_transactions=load_transactions)
+    return ArtifactTables(df_payers, df_sellers, load_transactions())
+
+
+def _read_frame(source) -> pd.DataFrame:
+    """Aceita um DataFrame já carregado ou o caminho de um feather."""
+    return source if isinstance(source, pd.DataFrame) else pd.read_feather(source)
+
+
+def read_payers(payers) -> pd.DataFrame:
+    df_payers = _read_frame(payers)
     if "card_hash" in df_payers.columns:
-        df_payers["card_id"] = df_payers["card_hash"]
-    df_payers.drop(columns=["card_hash"], inplace=True, errors="ignore")
+        df_payers = df_payers.assign(card_id=df_payers["card_hash"]).drop(columns=["card_hash"])
+    return df_payers
 
-    # 2) Lê sellers
-    df_sellers = pd.read_feather(sellers_path)
 
-    # 3) Processa tx1_path (train)
-    df_tx1 = pd.read_feather(tx1_path)
-    df_train = df_tx1.merge(df_sellers, on="terminal_id", how="left")
-    df_train = df_train.merge(df_payers, on="card_id", how="left")
+def _column_values(series: pd.Series):
+    # `.array` de colunas numpy embrulha em PandasArray, que revarre nulos ao reconstruir o frame
+    if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return series.array
+    return series.to_numpy()
+
+
+class DimensionIndex:
+    """Tabela de dimensão (payers ou sellers) indexada pela chave para joins à esquerda por `take`.
+
+    As colunas ficam em arrays posicionais e a chave num `pd.Index`; juntar um lote vira
+    resolver os códigos das chaves e buscar as linhas por posição, sem montar a tabela hash
+    do `merge` a cada chamada. O resultado é idêntico ao de `merge(how="left")`: mesma ordem
+    de colunas e linhas, chaves desconhecidas viram NaN/NaT com o mesmo upcast de dtype.
+    """
+
+    def __init__(self, df: pd.DataFrame, key: str):
+        self.key = key
+        self.frame = df
+        self.index = pd.Index(np.asarray(df[key], dtype=object))
+        # Chaves duplicadas multiplicam linhas no merge; nesse caso mantemos o caminho antigo
+        self.unique = self.index.is_unique
+        nulls = np.flatnonzero(self.index.isna())
+        self._null_code = nulls[0] if len(nulls) else -1
+        values = df.drop(columns=[key]).reset_index(drop=True)
+        self.columns = list(values.columns)
+        self._values = values
+        # Linha extra toda nula, alvo das chaves ausentes (mesmo upcast que o merge aplica)
+        self._values_na = values.reindex(np.arange(len(values) + 1))
+
+    def codes(self, keys) -> np.ndarray:
+        """Posição de cada chave na dimensão (-1 se ausente); categóricas resolvem só as categorias."""
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            lookup = np.append(self.index.get_indexer(keys.cat.categories), self._null_code)
+            return lookup[keys.cat.codes.to_numpy()]
+        codes = self.index.get_indexer(keys)
+        if self._null_code >= 0:
+            # None e NaN são a mesma chave nula para o merge, mas não para o Index
+            codes[pd.isna(keys).to_numpy()] = self._null_code
+        return codes
 
-    # 4) Processa tx2_path (test)
-    df_tx2 = pd.read_feather(tx2_path)
+    def join(self, left: pd.DataFrame) -> pd.DataFrame:
+        overlap = set(self.columns) & set(left.columns)
+        if not self.unique or overlap or self.key not in left.columns:
+            return left.merge(self.frame, on=self.key, how="left")
+        codes = self.codes(left[self.key])
+        missing = codes < 0
+        if missing.any():
+            right = self._values_na.take(np.where(missing, len(self._values), codes))
+        else:
+            right = self._values.take(codes)
+        # Monta o resultado a partir dos arrays, sem o alinhamento/cópia do concat
+        columns = {c: _column_values(left[c]) for c in left.columns}
+        columns.update((c, _column_values(right[c])) for c in self.columns)
+        return pd.DataFrame(columns, copy=False)
+
+
+class _KeyRanges:
+    """Linhas de cada chave como faixas contíguas de uma permutação estável (nulos formam uma faixa)."""
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        codes = np.asarray(codes, dtype=np.int64)
+        self.keys = pd.Index(np.asarray(uniques, dtype=object))
+        position_dtype = np.int32 if len(codes) < 2**31 else np.int64
+        self.order = np.argsort(codes, kind='stable').astype(position_dtype)
+        # offsets[c + 1]:offsets[c + 2] é a faixa do código c; offsets[0]:offsets[1], a dos nulos
+        self.offsets = np.searchsorted(codes[self.order], np.arange(-1, len(self.keys) + 1))
+
+    def lookup(self, values) -> np.ndarray:
+        """Posições (fora de ordem) das linhas com alguma das chaves em `values`."""
+        values = pd.Index(np.asarray(values, dtype=object))
+        codes = self.keys.get_indexer(values.dropna().unique())
+        codes = codes[codes >= 0]
+        if values.hasnans:
+            codes = np.append(codes, -1)
+        starts = self.offsets[codes + 1]
+        lengths = self.offsets[codes + 2] - starts
+        idx = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        return self.order[idx]
+
+
+class EntityIndex:
+    """Linhas do histórico por card_id, terminal_id e card_bin, para restringi-lo às entidades de um lote.
+
+    Toda feature de uma transação depende só de linhas do mesmo cartão, terminal ou card_bin;
+    o process_pipeline sobre essas linhas (na ordem original) mais o lote dá ao lote as mesmas
+    features que sobre o histórico inteiro. As faixas são montadas uma vez, então restringir
+    custa o tamanho das entidades tocadas, não o do histórico.
+    """
+
+    def __init__(self, df_tx, df_payers):
+        payers = df_payers if isinstance(df_payers, DimensionIndex) else DimensionIndex(read_payers(df_payers), 'card_id')
+        if isinstance(df_tx, pa.Table):
+            # Do histórico memory-mapped só as chaves viram pandas (categóricas: códigos int32)
+            df_tx = history_frame(df_tx.select(['card_id', 'terminal_id']))
+        self.n_rows = len(df_tx)
+        self._ranges = {
+            'card_id': _KeyRanges(df_tx['card_id']),
+            'terminal_id': _KeyRanges(df_tx['terminal_id']),
+        }
+        # Com payers duplicados o merge multiplica linhas e o card_bin de cada transação é ambíguo
+        self.exact = payers.unique
+        if self.exact:
+            # card_bin não está no histórico bruto: vem do cartão de cada linha
+            codes = payers.codes(df_tx['card_id'])
+            bins = np.full(len(codes), np.nan, dtype=object)
+            known = codes >= 0
+            bins[known] = np.asarray(payers.frame['card_bin'], dtype=object)[codes[known]]
+            self._ranges['card_bin'] = _KeyRanges(bins)
+
+    def rows(self, df_batch: pd.DataFrame) -> np.ndarray:
+        """Posições, em ordem crescente, das linhas do histórico ligadas às entidades de um lote mesclado."""
+        if not self.exact:
+            return np.arange(self.n_rows)
+        parts = [ranges.lookup(df_batch[key]) for key, ranges in self._ranges.items() if key in df_batch.columns]
+        return np.unique(np.concatenate(parts)) if parts else np.arange(self.n_rows)
+
+
+def _left_join(left: pd.DataFrame, right, key: str) -> pd.DataFrame:
+    """Join à esquerda com uma dimensão já indexada ou, para DataFrames avulsos, via merge."""
+    if isinstance(right, DimensionIndex):
+        return right.join(left)
+    return left.merge(right, on=key, how="left")
+
+
+def merge_train(df_tx1: pd.DataFrame, df_payers, df_sellers) -> pd.DataFrame:
+    df_train = _left_join(df_tx1, df_sellers, "terminal_id")
+    df_train = _left_join(df_train, df_payers, "card_id")
+    return apply_schema(df_train)
+
+
+def merge_test(df_tx2: pd.DataFrame, df_payers, df_sellers) -> pd.DataFrame:
     # Remove colunas conflitantes que podem ter vindo em tx2
     for c in ["card_bin", "latitude", "longitude"]:
         if c in df_tx2.columns:
             df_tx2 = df_tx2.drop(columns=[c])
-    df_test = df_tx2.merge(df_payers, on="card_id", how="left")
-    df_test = df_test.merge(df_sellers, on="terminal_id", how="left")
+    df_test = _left_join(df_tx2, df_payers, "card_id")
+    df_test = _left_join(df_test, df_sellers, "terminal_id")
+    return apply_schema(df_test)
+
+
+def run_merge(
+    payers_path,
+    sellers_path,
+    tx1_path,   # transactions_train (≈ 5M)
+    tx2_path,   # transactions_test  (≈ 1M)
+    entity_index: EntityIndex = None,
+) -> pd.DataFrame:
+    """Mescla os artefatos; cada argumento pode ser um caminho de feather ou um DataFrame já carregado.
+
+    Payers e sellers também podem vir como `DimensionIndex` (ver `ArtifactTables`) e tx1, como
+    tabela Arrow (ver `history_frame`). Com
+    `entity_index` (montado sobre tx1), tx1 é restrito às linhas dos cartões, terminais e
+    card_bins de tx2: as features de tx2 saem iguais e as do resto do histórico não são geradas.
+    """
+    # 1) Lê payers e prepara card_id
+    df_payers = payers_path
+    if not isinstance(df_payers, DimensionIndex):
+        df_payers = DimensionIndex(read_payers(payers_path), 'card_id')
+
+    # 2) Lê sellers
+    df_sellers = sellers_path
+    if not isinstance(df_sellers, DimensionIndex):
+        df_sellers = DimensionIndex(_read_frame(sellers_path), 'terminal_id')
 
-    # 5) Concatena train + test
-    df = pd.concat([df_train, df_test], ignore_index=True)
+    # 3) Processa tx2_path (test)
+    df_test = merge_test(_read_frame(tx2_path), df_payers, df_sellers)
+
+    # 4) Processa tx1_path (train), restrito às entidades de tx2 se houver índice
+    df_tx1 = tx1_path if isinstance(tx1_path, pa.Table) else _read_frame(tx1_path)
+    if entity_index is not None:
+        if len(df_tx1) != entity_index.n_rows:
+            raise ValueError(
+                f"Índice de entidades montado sobre {entity_index.n_rows} linhas, histórico tem {len(df_tx1)}."
+            )
+        df_tx1 = history_frame(df_tx1, entity_index.rows(df_test))
+        logger.info(f"Histórico restrito às entidades do lote: {len(df_tx1)} de {entity_index.n_rows} transações.")
+    else:
+        df_tx1 = history_frame(df_tx1)
+    df_train = merge_train(df_tx1, df_payers, df_sellers)
+
+    # 5) Concatena train + test (mantendo as chaves categóricas)
+    df = concat_frames([df_train, df_test])
 
     # 6) Filtra fraudes (se aplicável, para treinamento)
     # df = df.query("is_transactional_fraud == 0 or is_fraud == 0").copy()
@@ -65,197 +483,477 @@ def run_merge(
     return df
 
 
-def generate_basic_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df['tx_amount'] = np.log1p(df['tx_amount'])
-    df['tx_hour_of_day'] = df['tx_datetime'].dt.hour
-    df['tx_dayofweek']   = df['tx_datetime'].dt.weekday
-
-    def assign_regiao(lat):
-        if pd.isna(lat):
-            return 'Desconhecida'
-        if lat > -10:
-            return 'Norte'
-        elif lat > -20:
-            return 'Centro-Oeste'
-        else:
-            return 'Sudeste'
+NAT_I8 = np.iinfo(np.int64).min
+
+
+def _i8(values) -> np.ndarray:
+    """Instantes como int64 em ns (NaT vira NAT_I8), independente da unidade da coluna."""
+    return np.asarray(values, dtype='datetime64[ns]').view('i8')
+
+
+class SortCache:
+    """Códigos de grupo e permutações (chave, tx_datetime) calculados uma única vez por chave.
+
+    Os estágios não reordenam nem copiam o DataFrame: leem as colunas na ordem da
+    permutação em cache, calculam e devolvem o resultado às posições originais.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._codes = {}
+        self._orders = {}
+
+    def codes(self, key: str) -> np.ndarray:
+        if key not in self._codes:
+            codes, _ = pd.factorize(self.df[key], sort=True)
+            self._codes[key] = codes
+        return self._codes[key]
+
+    def order(self, key: str, tiebreak: str = None) -> np.ndarray:
+        """Equivale a sort_values([key, 'tx_datetime']) estável; empates seguem `tiebreak`."""
+        if (key, tiebreak) not in self._orders:
+            def last_na(codes):
+                return np.where(codes < 0, codes.max(initial=0) + 1, codes)
+            t = _i8(self.df['tx_datetime'])
+            sort_keys = [np.where(t == NAT_I8, np.iinfo(np.int64).max, t), last_na(self.codes(key))]
+            if tiebreak is not None:
+                sort_keys.insert(0, last_na(self.codes(tiebreak)))
+            self._orders[(key, tiebreak)] = np.lexsort(sort_keys)
+        return self._orders[(key, tiebreak)]
+
+    def grouped(self, key: str, tiebreak: str = None):
+        """Permutação e chaves de grupo na ordem dela; chave ausente vira NaN (descartada no groupby)."""
+        order = self.order(key, tiebreak)
+        groups = self.codes(key)[order].astype(float)
+        groups[groups < 0] = np.nan
+        return order, groups
+
+
+def _scatter(order: np.ndarray, values) -> np.ndarray:
+    """Devolve valores calculados na ordem `order` às posições originais."""
+    values = np.asarray(values)
+    out = np.empty(len(order), dtype=values.dtype)
+    out[order] = values
+    return out
+
+# Empates de tx_datetime seguem a ordem que as ordenações encadeadas do pipeline original
+# produziam: estágios de terminal desempatam por cartão e os geográficos, por terminal.
+CARD_ORDER = ('card_id', None)
+TERMINAL_ORDER = ('terminal_id', 'card_id')
+CARD_GEO_ORDER = ('card_id', 'terminal_id')
+
+
+# ==============================================================================
+#  REGISTRO DE ESTÁGIOS
+# ==============================================================================
+@dataclass(frozen=True)
+class FeatureStage:
+    """Estágio do motor de features: colunas que lê e colunas que escreve no frame.
+
+    `partition` é a chave cujos grupos o estágio processa de forma independente (None para
+    estágios linha a linha); é o que permite rodá-lo em paralelo por partição.
+    """
+    name: str
+    func: Callable
+    requires: tuple
+    produces: tuple
+    banner: str = None
+    partition: str = None
+
+
+# Estágios na ordem de registro, que é a ordem de execução: quando dois estágios escrevem a
+# mesma coluna (tx_time_diff_prev, tx_fraud_report_date), vale a escrita do último.
+FEATURE_STAGES = {}
+
+
+def feature_stage(requires, produces, banner=None, partition=None):
+    """Registra a função como estágio `(df, cache=None) -> df` com as dependências declaradas."""
+    def register(func):
+        FEATURE_STAGES[func.__name__] = FeatureStage(
+            func.__name__, func, tuple(requires), tuple(produces), banner, partition
+        )
+        return func
+    return register
 
-    df['regiao'] = df['latitude'].apply(assign_regiao)
+
+def resolve_stages(features=None, available=None) -> list:
+    """Estágios necessários para produzir `features` (todas, se None), na ordem de execução.
+
+    Cada coluna lida por um estágio vem do último estágio registrado antes dele que a escreve;
+    sem produtor, precisa estar em `available` (as colunas do frame mesclado), quando informado.
+    """
+    stages = list(FEATURE_STAGES.values())
+    if features is None:
+        needed = set(range(len(stages)))
+    else:
+        last_producer = {c: i for i, stage in enumerate(stages) for c in stage.produces}
+        unknown = [f for f in features if f not in last_producer]
+        if unknown:
+            raise ValueError(f"Features sem estágio registrado: {unknown}")
+        needed = set()
+        pending = [last_producer[f] for f in features]
+        while pending:
+            i = pending.pop()
+            if i in needed:
+                continue
+            needed.add(i)
+            for col in stages[i].requires:
+                producers = [j for j in range(i) if col in stages[j].produces]
+                if producers:
+                    pending.append(producers[-1])
+
+    produced = set()
+    for i in sorted(needed):
+        missing = [
+            c for c in stages[i].requires
+            if c not in produced and available is not None and c not in available
+        ]
+        if missing:
+            raise ValueError(f"Estágio {stages[i].name} depende de colunas ausentes: {missing}")
+        produced.update(stages[i].produces)
+    return [stages[i] for i in sorted(needed)]
+
+
+def assign_regiao(latitude) -> pd.Categorical:
+    """Região pela latitude: > -10 Norte, > -20 Centro-Oeste, demais Sudeste; NaN vira 'Desconhecida'."""
+    lat = np.asarray(latitude, dtype=np.float64)
+    codes = np.select(
+        [np.isnan(lat), lat > -10, lat > -20],
+        [REGIAO_DTYPE.categories.get_loc(r) for r in ('Desconhecida', 'Norte', 'Centro-Oeste')],
+        default=REGIAO_DTYPE.categories.get_loc('Sudeste'),
+    ).astype(np.int8)
+    return pd.Categorical.from_codes(codes, dtype=REGIAO_DTYPE)
+
+def hour_and_weekday(tx_datetime: pd.Series):
+    """Hora do dia e dia da semana (segunda = 0) direto dos nanossegundos, sem o acessor .dt."""
+    if tx_datetime.dtype != 'datetime64[ns]' or tx_datetime.isna().any():
+        # Fuso horário ou NaT: o acessor devolve NaN onde não há instante
+        return tx_datetime.dt.hour, tx_datetime.dt.weekday
+    t = _i8(tx_datetime)
+    hours = t // (3600 * 10**9)
+    # 1970-01-01 foi uma quinta-feira (weekday 3)
+    return (hours % 24).astype(np.int8), ((hours // 24 + 3) % 7).astype(np.int8)
+
+@feature_stage(
+    requires=['tx_amount', 'tx_datetime', 'latitude'],
+    produces=['tx_amount', 'tx_hour_of_day', 'tx_dayofweek', 'regiao'],
+    banner="Gerando basic features...",
+)
+def generate_basic_features(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    df['tx_amount'] = np.log1p(df['tx_amount'])
+    df['tx_hour_of_day'], df['tx_dayofweek'] = hour_and_weekday(df['tx_datetime'])
+    df['regiao'] = assign_regiao(df['latitude'])
     return df
 
-def card_basic_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df = df.sort_values(['card_id','tx_datetime'])
+def _time_diff_seconds(df: pd.DataFrame, cache: SortCache, key, tiebreak=None) -> np.ndarray:
+    order, groups = cache.grouped(key, tiebreak)
+    tx_sorted = pd.Series(df['tx_datetime'].to_numpy()[order])
+    diff = tx_sorted.groupby(groups, sort=False).diff().dt.total_seconds().fillna(0)
+    return _scatter(order, diff.to_numpy())
+
+@feature_stage(
+    requires=['card_id', 'tx_datetime', 'card_first_transaction'],
+    produces=['card_age_days', 'tx_time_diff_prev'],
+    banner="Gerando card features...",
+    partition='card_id',
+)
+def card_basic_features(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    cache = cache or SortCache(df)
     # Se 'card_first_transaction' for NaT, o resultado será NaN. Preenchemos com 0.
     df['card_age_days'] = (df['tx_datetime'] - pd.to_datetime(df['card_first_transaction'])).dt.days
     df['card_age_days'] = df['card_age_days'].fillna(0).astype(int) # CORRIGIDO
     
-    df['tx_time_diff_prev'] = df.groupby('card_id')['tx_datetime'].diff().dt.total_seconds().fillna(0)
-    df['tx_time_diff_prev'] = np.log10(df['tx_time_diff_prev'] + 1)
+    df['tx_time_diff_prev'] = np.log10(_time_diff_seconds(df, cache, *CARD_ORDER) + 1)
+    return df
+
+def combine_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Junta (n, média, M2) de dois conjuntos disjuntos (fórmula de Chan); um conjunto vazio não altera o outro.
+
+    M2 é a soma dos quadrados dos desvios à média, como no algoritmo de Welford; combinar
+    com um conjunto de uma única linha é exatamente a atualização de Welford.
+    """
+    n = n_a + n_b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = mean_b - mean_a
+        w = np.where(n == 0, 0.0, n_b / n)
+        mean = np.where(n_b == 0, mean_a, mean_a + delta * w)
+        m2 = np.where(n_b == 0, m2_a, m2_a + m2_b + delta**2 * n_a * w)
+    return n, mean, m2
+
+def prefix_moments(x, groups):
+    """(n, média, M2) das linhas anteriores do mesmo grupo, linha a linha, com `groups` contíguos.
+
+    As somas acumuladas são feitas sobre os valores já centrados na média do grupo, o que
+    evita o cancelamento de `soma2 - soma**2 / n` quando a média é grande perto do desvio.
+    Linhas sem grupo (NaN) ficam com n = NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    groups = np.asarray(groups, dtype=float)
+    n, mean, m2 = (np.full(len(x), np.nan) for _ in range(3))
+    valid = ~np.isnan(groups)
+    if not valid.any():
+        return n, mean, m2
+    g, xv = groups[valid], x[valid]
+    is_start = np.ones(len(g), dtype=bool)
+    is_start[1:] = g[1:] != g[:-1]
+    seg = np.cumsum(is_start) - 1
+    rank = np.arange(len(g)) - np.flatnonzero(is_start)[seg]
+    center = (np.bincount(seg, weights=xv) / np.bincount(seg))[seg]
+    d = pd.Series(xv - center)
+    # Somas exclusivas: o acumulado até a linha anterior do segmento (e não o inclusivo menos a
+    # linha atual, que deixa resíduo de arredondamento onde o histórico anterior é de uma linha só)
+    first = rank == 0
+    s1 = np.where(first, 0.0, np.roll(d.groupby(seg, sort=False).cumsum().to_numpy(), 1))
+    s2 = np.where(first, 0.0, np.roll((d**2).groupby(seg, sort=False).cumsum().to_numpy(), 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n[valid] = rank
+        # Uma linha anterior: média é o próprio valor e M2 = 0, como na atualização de Welford
+        mean[valid] = np.where(rank == 1, np.roll(xv, 1), center + s1 / rank)
+        m2[valid] = np.where(rank <= 1, 0.0, np.maximum(s2 - s1**2 / rank, 0))
+    return n, mean, m2
+
+def amount_norm_pdf(x, count, mean, m2) -> np.ndarray:
+    """Densidade normal do valor atual dado o histórico anterior (n, média, M2)."""
+    x = np.asarray(x, dtype=float)
+    n = np.asarray(count, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        mean_prior = np.where(n == 0, np.nan, mean)
+        var_prior = np.asarray(m2, dtype=float) / (n - 1)
+        var_prior = np.where(var_prior < 0, 0, var_prior)
+        std_prior = np.sqrt(var_prior)
+        sigma_min = 100 / np.sqrt(np.where(n == 0, 1, n))
+        sigma = np.maximum(np.nan_to_num(std_prior, nan=0, posinf=np.inf, neginf=-np.inf), sigma_min)
+        pdf = 1 / (sigma * np.sqrt(2 * np.pi)) * np.exp(-0.5 * ((x - mean_prior) / sigma)**2)
+    return np.where(np.isfinite(pdf), pdf, 0.5)
+
+def _add_amount_normalization(df: pd.DataFrame, cache: SortCache, order_by, col_name: str) -> pd.DataFrame:
+    cache = cache or SortCache(df)
+    order, groups = cache.grouped(*order_by)
+    tx_amount = df['tx_amount'].to_numpy(dtype=float)[order]
+    df[col_name] = _scatter(order, amount_norm_pdf(tx_amount, *prefix_moments(tx_amount, groups)))
     return df
 
-def terminal_basic_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df = df.sort_values(['terminal_id','tx_datetime'])
+@feature_stage(
+    requires=['card_id', 'tx_datetime', 'tx_amount'],
+    produces=['amount_card_norm_pdf'],
+    banner="Normalizando transações do cartão...",
+    partition='card_id',
+)
+def generate_card_amount_normalization(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    return _add_amount_normalization(df, cache, CARD_ORDER, 'amount_card_norm_pdf')
+
+@feature_stage(
+    requires=['terminal_id', 'card_id', 'tx_datetime', 'terminal_operation_start'],
+    produces=['terminal_age_days', 'tx_time_diff_prev'],
+    banner="Gerando terminal features...",
+    partition='terminal_id',
+)
+def terminal_basic_features(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    cache = cache or SortCache(df)
     # Se 'terminal_operation_start' for NaT, o resultado será NaN. Preenchemos com 0.
     df['terminal_age_days'] = (df['tx_datetime'] - pd.to_datetime(df['terminal_operation_start'])).dt.days
     df['terminal_age_days'] = df['terminal_age_days'].fillna(0).astype(int) # CORRIGIDO
 
     # Sobrescreve tx_time_diff_prev com base em terminal
-    df['tx_time_diff_prev'] = df.groupby('terminal_id')['tx_datetime'].diff().dt.total_seconds().fillna(0)
+    df['tx_time_diff_prev'] = _time_diff_seconds(df, cache, *TERMINAL_ORDER)
     return df
 
-def terminal_reuse_ratio(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy().sort_values(['terminal_id', 'tx_datetime'])
-    df['reuse_flag_current'] = df.groupby(['terminal_id','card_id']).cumcount().gt(0).astype(int)
-    df['term_reuse_cum_sum'] = df.groupby('terminal_id')['reuse_flag_current'].cumsum()
-    df['term_tx_count_prior'] = df.groupby('terminal_id').cumcount()
-    df['term_reuse_sum_prior'] = df['term_reuse_cum_sum'] - df['reuse_flag_current']
-    df['terminal_card_reuse_ratio_prior'] = (
-        df['term_reuse_sum_prior'] / df['term_tx_count_prior'].replace(0, np.nan)
-    ).fillna(0)
-    df.drop(columns=[
-        'reuse_flag_current','term_reuse_cum_sum',
-        'term_tx_count_prior','term_reuse_sum_prior'
-    ], inplace=True)
+@feature_stage(
+    requires=['terminal_id', 'card_id', 'tx_datetime'],
+    produces=['terminal_card_reuse_ratio_prior'],
+    partition='terminal_id',
+)
+def terminal_reuse_ratio(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    cache = cache or SortCache(df)
+    order, terminals = cache.grouped(*TERMINAL_ORDER)
+    cards = cache.codes('card_id')[order].astype(float)
+    cards[cards < 0] = np.nan
+
+    ones = pd.Series(np.ones(len(order)))
+    reuse_flag_current = ones.groupby([terminals, cards], sort=False).cumcount().gt(0).astype(int)
+    term_reuse_cum_sum = reuse_flag_current.groupby(terminals, sort=False).cumsum()
+    term_tx_count_prior = ones.groupby(terminals, sort=False).cumcount()
+    term_reuse_sum_prior = term_reuse_cum_sum - reuse_flag_current
+    ratio = (term_reuse_sum_prior / term_tx_count_prior.replace(0, np.nan)).fillna(0)
+    df['terminal_card_reuse_ratio_prior'] = _scatter(order, ratio.to_numpy())
     return df
 
-def shared_terminal_with_fraud(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df['tx_fraud_report_date'] = pd.to_datetime(df.get('tx_fraud_report_date'), errors='coerce')
-    df = df.sort_values(['terminal_id','tx_datetime']).reset_index(drop=True)
-    df['shared_terminal_with_frauds_prior'] = 0
-
-    for term, grp in df.groupby('terminal_id', sort=False):
-        frauds = grp[(grp['is_fraud']==1) & grp['tx_fraud_report_date'].notna()].sort_values('tx_fraud_report_date')
-        report_dates= frauds['tx_fraud_report_date'].tolist()
-        cards = frauds['card_id'].tolist()
-        for idx in grp.index:
-            cur_time = df.at[idx, 'tx_datetime']
-            seen = {c for rd, c in zip(report_dates, cards) if rd < cur_time}
-            df.at[idx, 'shared_terminal_with_frauds_prior'] = len(seen)
+REPORT_SHIFT = pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
 
-    return df
+def count_prior_events(event_keys: np.ndarray, event_times: np.ndarray,
+                       query_keys: np.ndarray, *query_times: np.ndarray) -> np.ndarray:
+    """Para cada consulta, conta os eventos da mesma chave com instante estritamente anterior.
+
+    Chaves são códigos inteiros e instantes são int64 (datetime64[ns] visto como i8). Aceita
+    vários vetores de instantes para as mesmas chaves e devolve uma linha de contagens por vetor.
+    Os instantes viram ranks densos e (chave, rank) é codificado em um único int64, de modo que
+    uma ordenação dos eventos e um searchsorted global substituem o loop por grupo.
+    """
+    event_keys = np.asarray(event_keys, dtype=np.int64)
+    event_times = np.asarray(event_times, dtype=np.int64)
+    query_keys = np.asarray(query_keys, dtype=np.int64)
+    query_times = [np.asarray(q, dtype=np.int64) for q in query_times]
+
+    uniq_times = np.unique(np.concatenate([event_times, *query_times]))
+    stride = len(uniq_times) + 1
+    flat_events = np.sort(event_keys * stride + np.searchsorted(uniq_times, event_times))
+    group_start = np.searchsorted(flat_events, query_keys * stride, side='left')
+    counts = np.vstack([
+        np.searchsorted(flat_events, query_keys * stride + np.searchsorted(uniq_times, q), side='left') - group_start
+        for q in query_times
+    ])
+    return counts[0] if len(query_times) == 1 else counts
 
-def add_card_fraud_nonfraud_window(df: pd.DataFrame, window_days: int) -> pd.DataFrame:
-    df = df.copy()
+def grouped_window_counts(event_keys: np.ndarray, event_times: np.ndarray,
+                          query_keys: np.ndarray, query_times: np.ndarray,
+                          windows, lags=None) -> np.ndarray:
+    """Conta, para cada janela, os eventos da mesma chave em [t - lag - janela, t - lag).
+
+    Todas as janelas são resolvidas em uma única passada de count_prior_events.
+    Retorna um array (len(windows), len(query_keys)).
+    """
+    query_times = np.asarray(query_times, dtype=np.int64)
+    windows = [pd.Timedelta(w).value for w in windows]
+    lags = [0] * len(windows) if lags is None else [pd.Timedelta(l).value for l in lags]
+    bounds = []
+    for window, lag in zip(windows, lags):
+        bounds += [query_times - lag, query_times - lag - window]
+    counts = count_prior_events(event_keys, event_times, query_keys, *bounds).reshape(2 * len(windows), -1)
+    return counts[0::2] - counts[1::2]
+
+@feature_stage(
+    requires=['terminal_id', 'card_id', 'tx_datetime', 'is_fraud', 'tx_fraud_report_date'],
+    produces=['shared_terminal_with_frauds_prior'],
+    partition='terminal_id',
+)
+def shared_terminal_with_fraud(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    cache = cache or SortCache(df)
     df['tx_fraud_report_date'] = pd.to_datetime(df.get('tx_fraud_report_date'), errors='coerce')
-    
-    # Adicionado para evitar erro se a coluna não existir
-    if 'tx_fraud_report_date' in df.columns:
-        df['tx_fraud_report_date'] = df['tx_fraud_report_date'] + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
-
-    window = pd.Timedelta(days=window_days)
-    fraud_counts = pd.Series(0, index=df.index)
-    nonfraud_counts = pd.Series(0, index=df.index)
-
-    for card, idx in df.groupby('card_id').groups.items():
-        sub = df.loc[idx]
-        tx_dates = sub['tx_datetime'].values
-        report_dates = np.sort(sub.loc[sub['is_fraud']==1, 'tx_fraud_report_date'].dropna().values)
-        nonfraud_dates= np.sort(sub.loc[sub['is_fraud']==0, 'tx_datetime'].values)
-
-        right = np.searchsorted(report_dates, tx_dates, side='left')
-        left  = np.searchsorted(report_dates, tx_dates - window, side='left')
-        fraud_counts.loc[idx] = (right - left).astype(int)
-
-        right_nf = np.searchsorted(nonfraud_dates, tx_dates, side='left')
-        left_nf  = np.searchsorted(nonfraud_dates, tx_dates - window, side='left')
-        nonfraud_counts.loc[idx] = (right_nf - left_nf).astype(int)
-
-    df[f'card_fraud_count_last_{window_days}d']    = fraud_counts
-    df[f'card_nonfraud_count_last_{window_days}d']= nonfraud_counts
-    return df
+    term_codes = cache.codes('terminal_id')
+    report_times = _i8(df['tx_fraud_report_date'])
+    is_report = (df['is_fraud'] == 1).to_numpy() & (report_times != NAT_I8)
+
+    # Só o primeiro reporte de cada cartão no terminal importa para a contagem de cartões distintos
+    first_reports = pd.DataFrame({
+        'terminal': term_codes[is_report],
+        'card': cache.codes('card_id')[is_report],
+        'report': report_times[is_report],
+    }).groupby(['terminal', 'card'])['report'].min().reset_index()
 
-def generate_temporal_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    for window in [1, 7]:
-        df = add_card_fraud_nonfraud_window(df, window)
+    # A contagem só depende do instante, então não é preciso ordenar o DataFrame
+    counts = count_prior_events(
+        first_reports['terminal'].to_numpy(), first_reports['report'].to_numpy(),
+        term_codes, _i8(df['tx_datetime']),
+    )
+    df['shared_terminal_with_frauds_prior'] = np.where(term_codes < 0, 0, counts)
     return df
 
-def add_cardbin_fraud_window(df: pd.DataFrame, window_days: int = 30) -> pd.DataFrame:
-    df = df.copy()
-    df['card_bin'] = df['card_bin'].fillna('__NAN_PLACEHOLDER__')
+def add_card_fraud_nonfraud_windows(df: pd.DataFrame, windows=(1, 7), cache: SortCache = None) -> pd.DataFrame:
+    """Contagens de fraudes reportadas e de transações legítimas do cartão em cada janela (dias)."""
+    cache = cache or SortCache(df)
+    report = pd.to_datetime(df.get('tx_fraud_report_date'), errors='coerce')
+    if not isinstance(report, pd.Series):
+        report = pd.Series(report, index=df.index, dtype='datetime64[ns]')
 
-    frauds = df.loc[(df['is_fraud']==1) & df['tx_fraud_report_date'].notna(), ['card_bin','tx_fraud_report_date']]
-    fraud_map = frauds.groupby('card_bin')['tx_fraud_report_date'].apply(lambda s: np.sort(s.values)).to_dict()
+    card_codes = cache.codes('card_id')
+    tx_times = _i8(df['tx_datetime'])
+    report_times = _i8(report)
+    is_report = (df['is_fraud'] == 1).to_numpy() & (report_times != NAT_I8) & (card_codes >= 0)
+    is_nonfraud = (df['is_fraud'] == 0).to_numpy() & (tx_times != NAT_I8) & (card_codes >= 0)
 
-    def count_frauds_for_group(group: pd.DataFrame) -> pd.Series:
-        bin_id = group.name
-        refs = group['tx_datetime'].values.astype('datetime64[ns]')
-        fraud_times = fraud_map.get(bin_id, np.array([], dtype='datetime64[ns]'))
+    # Historicamente cada janela era calculada em sequência e cada chamada deslocava a data
+    # de reporte em mais 1 dia - 1 µs; a i-ésima janela enxerga (i + 1) deslocamentos.
+    spans = [pd.Timedelta(days=w) for w in windows]
+    lags = [(i + 1) * REPORT_SHIFT for i in range(len(windows))]
+    fraud_counts = grouped_window_counts(
+        card_codes[is_report], report_times[is_report], card_codes, tx_times, spans, lags
+    )
+    nonfraud_counts = grouped_window_counts(
+        card_codes[is_nonfraud], tx_times[is_nonfraud], card_codes, tx_times, spans
+    )
+    no_card = (card_codes < 0) | (tx_times == NAT_I8)
+    fraud_counts[:, no_card] = 0
+    nonfraud_counts[:, no_card] = 0
 
-        if len(fraud_times) == 0:
-            return pd.Series(0, index=group.index)
+    for i, window_days in enumerate(windows):
+        df[f'card_fraud_count_last_{window_days}d']    = fraud_counts[i]
+        df[f'card_nonfraud_count_last_{window_days}d']= nonfraud_counts[i]
+    df['tx_fraud_report_date'] = report + len(windows) * REPORT_SHIFT
+    return df
 
-        window_start = refs - np.timedelta64(window_days, 'D')
-        right_indices = np.searchsorted(fraud_times, refs, side='left')
-        left_indices = np.searchsorted(fraud_times, window_start, side='left')
-        counts = right_indices - left_indices
-        return pd.Series(counts, index=group.index)
+def add_card_fraud_nonfraud_window(df: pd.DataFrame, window_days: int, cache: SortCache = None) -> pd.DataFrame:
+    return add_card_fraud_nonfraud_windows(df, [window_days], cache)
 
-    col_name = f'cardbin_fraud_count_last_{window_days}d'
-    fraud_counts_series = df.groupby('card_bin', group_keys=False, sort=False).apply(count_frauds_for_group)
-    df[col_name] = fraud_counts_series
-    
-    df['card_bin'] = df['card_bin'].replace('__NAN_PLACEHOLDER__', np.nan)
-    return df
+@feature_stage(
+    requires=['card_id', 'tx_datetime', 'is_fraud', 'tx_fraud_report_date'],
+    produces=[
+        'card_fraud_count_last_1d', 'card_nonfraud_count_last_1d',
+        'card_fraud_count_last_7d', 'card_nonfraud_count_last_7d',
+        # Deslocada pelas janelas; add_cardbin_fraud_window lê esta versão
+        'tx_fraud_report_date',
+    ],
+    banner="Gerando temporal features...",
+    partition='card_id',
+)
+def generate_temporal_features(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    return add_card_fraud_nonfraud_windows(df, [1, 7], cache)
 
-def generate_card_amount_normalization(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.sort_values(['card_id','tx_datetime']).reset_index(drop=True)
-    df['cum_sum']    = df.groupby('card_id')['tx_amount'].cumsum() - df['tx_amount']
-    df['tx_amount_sq']= df['tx_amount']**2
-    df['cum_sum2']   = df.groupby('card_id')['tx_amount_sq'].cumsum() - df['tx_amount_sq']
-    df['cum_count']  = df.groupby('card_id').cumcount()
-
-    df['mean_prior'] = df['cum_sum']/df['cum_count'].replace(0,np.nan)
-    df['var_prior']  = ((df['cum_sum2'] - df['cum_sum']**2/df['cum_count'])/(df['cum_count']-1)).clip(lower=0)
-    df['std_prior']  = np.sqrt(df['var_prior'])
-    n = df['cum_count'].replace(0,1)
-    sigma_min = 100/np.sqrt(n)
-    sigma = np.maximum(df['std_prior'].fillna(0), sigma_min)
-
-    df['amount_card_norm_pdf'] = (1/(sigma*np.sqrt(2*np.pi)) * np.exp(-0.5*((df['tx_amount']-df['mean_prior'])/sigma)**2))
-    df['amount_card_norm_pdf'] = df['amount_card_norm_pdf'].fillna(0.5).replace([np.inf,-np.inf],0.5)
-    df.drop(columns=['cum_sum','cum_sum2','cum_count','tx_amount_sq','mean_prior','var_prior','std_prior'], inplace=True)
-    return df
+@feature_stage(
+    requires=['terminal_id', 'card_id', 'tx_datetime', 'tx_amount'],
+    produces=['amount_terminal_norm_pdf'],
+    banner="Normalizando transações do terminal...",
+    partition='terminal_id',
+)
+def generate_terminal_amount_normalization(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    return _add_amount_normalization(df, cache, TERMINAL_ORDER, 'amount_terminal_norm_pdf')
 
-def generate_terminal_amount_normalization(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.sort_values(['terminal_id','tx_datetime']).reset_index(drop=True)
-    df['cum_sum']    = df.groupby('terminal_id')['tx_amount'].cumsum() - df['tx_amount']
-    df['tx_amount_sq']= df['tx_amount']**2
-    df['cum_sum2']   = df.groupby('terminal_id')['tx_amount_sq'].cumsum() - df['tx_amount_sq']
-    df['cum_count']  = df.groupby('terminal_id').cumcount()
-
-    df['mean_prior'] = df['cum_sum']/df['cum_count'].replace(0,np.nan)
-    df['var_prior']  = ((df['cum_sum2'] - df['cum_sum']**2/df['cum_count'])/(df['cum_count']-1)).clip(lower=0)
-    df['std_prior']  = np.sqrt(df['var_prior'])
-    n = df['cum_count'].replace(0,1)
-    sigma_min = 100/np.sqrt(n)
-    sigma = np.maximum(df['std_prior'].fillna(0), sigma_min)
-
-    df['amount_terminal_norm_pdf'] = (1/(sigma*np.sqrt(2*np.pi)) * np.exp(-0.5*((df['tx_amount']-df['mean_prior'])/sigma)**2))
-    df['amount_terminal_norm_pdf'] = df['amount_terminal_norm_pdf'].fillna(0.5).replace([np.inf,-np.inf],0.5)
-    df.drop(columns=['cum_sum','cum_sum2','cum_count','tx_amount_sq','mean_prior','var_prior','std_prior'], inplace=True)
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    φ1, λ1 = np.radians(lat1), np.radians(lon1)
+    φ2, λ2 = np.radians(lat2), np.radians(lon2)
+    dφ = φ2 - φ1
+    dλ = λ2 - λ1
+    a = np.sin(dφ/2)**2 + np.cos(φ1)*np.cos(φ2)*np.sin(dλ/2)**2
+    return R * 2 * np.arcsin(np.sqrt(a))
+
+@feature_stage(
+    requires=['card_id', 'terminal_id', 'tx_datetime', 'latitude', 'longitude', 'tx_time_diff_prev'],
+    produces=['avg_speed_between_txs'],
+    banner="Gerando features geográficas...",
+    partition='card_id',
+)
+def add_geographical_features(df: pd.DataFrame, cache: SortCache = None) -> pd.DataFrame:
+    cache = cache or SortCache(df)
+    order, groups = cache.grouped(*CARD_GEO_ORDER)
+    latitude = pd.Series(df['latitude'].to_numpy()[order])
+    longitude = pd.Series(df['longitude'].to_numpy()[order])
+    prev_lat = latitude.groupby(groups, sort=False).shift(1)
+    prev_lon = longitude.groupby(groups, sort=False).shift(1)
+    distancia_entre_transacoes = haversine(prev_lat, prev_lon, latitude, longitude)
+    tx_time_diff_prev = pd.Series(df['tx_time_diff_prev'].to_numpy()[order])
+    speed = (distancia_entre_transacoes / (tx_time_diff_prev/3600)).replace([np.inf,-np.inf],800).fillna(0)
+    df['avg_speed_between_txs'] = _scatter(order, speed.to_numpy())
     return df
 
-def add_geographical_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy().sort_values(['card_id','tx_datetime'])
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 6371.0
-        φ1, λ1 = np.radians(lat1), np.radians(lon1)
-        φ2, λ2 = np.radians(lat2), np.radians(lon2)
-        dφ = φ2 - φ1
-        dλ = λ2 - λ1
-        a = np.sin(dφ/2)**2 + np.cos(φ1)*np.cos(φ2)*np.sin(dλ/2)**2
-        return R * 2 * np.arcsin(np.sqrt(a))
-
-    df['prev_lat'] = df.groupby('card_id')['latitude'].shift(1)
-    df['prev_lon'] = df.groupby('card_id')['longitude'].shift(1)
-    df['distancia_entre_transacoes'] = haversine(df['prev_lat'], df['prev_lon'], df['latitude'], df['longitude'])
-    df['avg_speed_between_txs'] = (df['distancia_entre_transacoes'] / (df['tx_time_diff_prev']/3600)).replace([np.inf,-np.inf],800).fillna(0)
-    df.drop(columns=['prev_lat','prev_lon','distancia_entre_transacoes'], inplace=True)
+@feature_stage(
+    requires=['card_bin', 'tx_datetime', 'is_fraud', 'tx_fraud_report_date'],
+    produces=['cardbin_fraud_count_last_30d'],
+    banner="Contando fraudes por card_bin...",
+    partition='card_bin',
+)
+def add_cardbin_fraud_window(df: pd.DataFrame, window_days: int = 30, cache: SortCache = None) -> pd.DataFrame:
+    cache = cache or SortCache(df)
+    # card_bin ausente (código -1) forma um grupo próprio, como o antigo placeholder '__NAN_PLACEHOLDER__'
+    bin_codes = cache.codes('card_bin')
+    report_times = _i8(pd.to_datetime(df['tx_fraud_report_date'], errors='coerce'))
+    is_report = (df['is_fraud'] == 1).to_numpy() & (report_times != NAT_I8)
+
+    tx_times = _i8(df['tx_datetime'])
+    counts = grouped_window_counts(
+        bin_codes[is_report], report_times[is_report],
+        bin_codes, tx_times, [pd.Timedelta(days=window_days)],
+    )
+    df[f'cardbin_fraud_count_last_{window_days}d'] = np.where(tx_times == NAT_I8, 0, counts[0])
     return df
 
 def exclude_features(df: pd.DataFrame) -> pd.DataFrame:
@@ -266,28 +964,275 @@ def exclude_features(df: pd.DataFrame) -> pd.DataFrame:
         'is_transactional_fraud', 'merchant', 'card_bin'
         # 'transaction_id' foi REMOVIDO daqui para ser usado pela API
     ]
-    return df.drop(columns=cols, errors='ignore')
-
-def process_pipeline(payers_path: Path, sellers_path: Path, transactions_path_1: Path, transactions_path_2: Path) -> pd.DataFrame:
-    df = run_merge(payers_path,sellers_path,transactions_path_1,transactions_path_2)
-    logger.info("Gerando basic features...")
-    df = generate_basic_features(df)
-    logger.info("Gerando card features...")
-    df = card_basic_features(df)
-    logger.info("Normalizando transações do cartão...")
-    df = generate_card_amount_normalization(df)
-    logger.info("Gerando terminal features...")
-    df = terminal_basic_features(df)
-    df = terminal_reuse_ratio(df)
-    df = shared_terminal_with_fraud(df)
-    logger.info("Gerando temporal features...")
-    df = generate_temporal_features(df)
-    logger.info("Normalizando transações do terminal...")
-    df = generate_terminal_amount_normalization(df)
-    logger.info("Gerando features geográficas...")
-    df = add_geographical_features(df)
-    logger.info("Contando fraudes por card_bin...")
-    df = add_cardbin_fraud_window(df)
+    df.drop(columns=cols, errors='ignore', inplace=True)
+    return df
+
+def peak_rss_mb() -> float:
+    """Pico de memória residente do processo até agora (NaN onde `resource` não existe)."""
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+def current_rss_bytes() -> float:
+    """Memória residente atual do processo (NaN fora do Linux, sem /proc)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return float('nan')
+
+
+class RssSampler:
+    """Amostra o RSS atual do processo numa thread, para medir o pico de memória de cada estágio.
+
+    ru_maxrss é o pico da vida inteira do processo; com as amostras, o custo de um estágio é o maior
+    RSS visto desde o início dele menos o RSS nesse início.
+    """
+
+    INTERVAL = 0.005
+
+    def __init__(self, history_seconds: float = 600):
+        self.samples = deque(maxlen=int(history_seconds / self.INTERVAL))
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Inicia a amostragem (idempotente; reinicia num processo filho, onde a thread não existe)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.samples.clear()
+            rss = current_rss_bytes()
+            if rss != rss:
+                return
+            # Amostra inicial síncrona: a thread pode demorar a ganhar o GIL
+            self.samples.append((time.perf_counter(), rss))
+            threading.Thread(target=self._run, args=(self._pid,), name='rss-sampler', daemon=True).start()
+
+    def _run(self, pid: int):
+        while self._pid == pid:
+            self.samples.append((time.perf_counter(), current_rss_bytes()))
+            time.sleep(self.INTERVAL)
+
+    def stage_peak_mb(self, started: float) -> float:
+        """Pico de RSS desde `started` acima do RSS naquele instante, em MB (NaN sem amostras)."""
+        now = current_rss_bytes()
+        if now != now or not self.samples:
+            return float('nan')
+        # A leitura do fim do estágio também serve de base para o próximo
+        self.samples.append((time.perf_counter(), now))
+        samples = list(self.samples)
+        i = bisect.bisect_right(samples, started, key=lambda sample: sample[0])
+        baseline = samples[i - 1][1] if i else samples[0][1]
+        peak = max([rss for _, rss in samples[i:]] + [now])
+        return max(peak - baseline, 0) / 1024**2
+
+
+RSS_SAMPLER = RssSampler()
+
+def log_stage_report(report: list):
+    logger.info(f"{'estágio':<42} {'tempo (s)':>10} {'entrada':>10} {'saída':>10} {'pico mem. (MB)':>14}")
+    for entry in report:
+        logger.info(
+            f"{entry['stage']:<42} {entry['seconds']:>10.3f} {entry['rows_in']:>10} {entry['rows_out']:>10} "
+            f"{entry['rss_peak_mb']:>14.1f}"
+        )
+
+def record_stage(report: list, name: str, started: float, out, seconds: float = None, rows_in: int = None,
+                 rss_peak_mb: float = None):
+    """Acrescenta ao relatório tempo, linhas de entrada/saída e pico de memória de um estágio.
+
+    `out` é o resultado do estágio (algo com len) ou o número de linhas; sem `rows_in`, a entrada
+    conta como igual à saída (estágios que só acrescentam colunas). O pico de memória é o maior
+    RSS do processo desde `started` acima do RSS naquele instante (RssSampler), salvo quando o
+    estágio rodou em outro processo e o valor vem em `rss_peak_mb`.
+    """
+    RSS_SAMPLER.start()
+    rows_out = out if isinstance(out, (int, np.integer)) else len(out)
+    report.append({
+        'stage': name,
+        'seconds': time.perf_counter() - started if seconds is None else seconds,
+        'rows_in': rows_out if rows_in is None else int(rows_in),
+        'rows_out': int(rows_out),
+        'rss_peak_mb': RSS_SAMPLER.stage_peak_mb(started) if rss_peak_mb is None else rss_peak_mb,
+    })
+
+# ==============================================================================
+#  EXECUÇÃO PARALELA POR PARTIÇÃO
+# ==============================================================================
+# Frame, partições e estágios da fase em andamento. Os workers são criados por fork depois
+# de preenchido, então leem as colunas do processo principal sem cópia (copy-on-write).
+def plan_phases(stages: list) -> list:
+    """Agrupa estágios consecutivos com a mesma chave de partição: [(chave, [estágios]), ...].
+
+    A ordem de registro é mantida: um estágio pode ler (tx_time_diff_prev) ou sobrescrever
+    (tx_fraud_report_date) colunas de um estágio de outra chave registrado antes dele.
+    """
+    phases = []
+    for stage in stages:
+        if phases and phases[-1][0] == stage.partition:
+            phases[-1][1].append(stage)
+        else:
+            phases.append((stage.partition, [stage]))
+    return phases
+
+
+def partition_rows(codes: np.ndarray, n_parts: int) -> list:
+    """Posições (crescentes) das linhas de cada partição não vazia, pelo código da chave módulo n.
+
+    Chaves ausentes (código -1) vão todas para a partição 0 e continuam formando um único grupo.
+    """
+    part = np.where(codes < 0, 0, codes % n_parts)
+    order = np.argsort(part, kind='stable')
+    bounds = np.searchsorted(part[order], np.arange(1, n_parts))
+    return [rows for rows in np.split(order, bounds) if len(rows)]
+
+
+def _partition_dir() -> str:
+    # Em /dev/shm os arquivos das partições ficam em páginas de RAM compartilhadas com os workers
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def _write_partition(df: pd.DataFrame, rows: np.ndarray, stages: list, path: str):
+    """Grava em Arrow IPC, sem compressão, as colunas que os estágios leem nas linhas da partição."""
+    columns = dict.fromkeys(c for stage in stages for c in stage.requires if c in df.columns)
+    part = pd.DataFrame({c: _column_values(df[c])[rows] for c in columns}, copy=False)
+    table = pa.Table.from_pandas(part, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _run_partition(path: str, stages: list):
+    """Worker: roda os estágios da fase sobre a partição gravada em `path` e devolve as colunas escritas.
+
+    O arquivo é lido por memory map, então o worker não depende de herdar o frame do processo
+    pai e roda com qualquer método de início (fork, forkserver ou spawn). As linhas mantêm a
+    ordem relativa do frame e as categorias das chaves são as do frame inteiro, então ordenações
+    e desempates dentro de cada grupo são os mesmos da execução serial.
+    """
+    RSS_SAMPLER.start()
+    with pa.memory_map(path) as source:
+        part = pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+    apply_schema(part)
+    cache = SortCache(part)
+    timings = {}
+    for stage in stages:
+        started = time.perf_counter()
+        part = stage.func(part, cache=cache)
+        apply_schema(part, stage.produces)
+        timings[stage.name] = (time.perf_counter() - started, RSS_SAMPLER.stage_peak_mb(started))
+    produced = dict.fromkeys(c for stage in stages for c in stage.produces)
+    return {c: part[c].to_numpy() for c in produced}, timings
+
+
+def make_partition_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool dos estágios particionados, reaproveitado por todas as fases de um build_features.
+
+    Usa fork onde existe (início barato; nada é lido do estado herdado) e spawn nos demais.
+    """
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+
+def _run_phase_parallel(df: pd.DataFrame, cache: SortCache, key: str, stages: list, pool: ProcessPoolExecutor,
+                        workers: int, report: list) -> pd.DataFrame:
+    """Particiona o frame por `key`, roda os estágios nos processos do pool e junta as colunas escritas."""
+    started = time.perf_counter()
+    parts = partition_rows(cache.codes(key), workers)
+    with tempfile.TemporaryDirectory(prefix='fraud-phase-', dir=_partition_dir()) as tmp:
+        paths = [os.path.join(tmp, f'{i}.arrow') for i in range(len(parts))]
+        for rows, path in zip(parts, paths):
+            _write_partition(df, rows, stages, path)
+        results = list(pool.map(_run_partition, paths, [stages] * len(parts)))
+
+    rows = np.concatenate(parts)
+    for col in results[0][0]:
+        df[col] = _scatter(rows, np.concatenate([columns[col] for columns, _ in results]))
+        apply_schema(df, [col])
+
+    # Tempo de cada estágio é o da partição mais lenta; o resto (gravação das partições e
+    # junção) vai numa linha própria do relatório
+    stage_seconds = 0.0
+    for stage in stages:
+        # Tempo e memória da partição mais pesada, medidos no worker
+        seconds = max(timings[stage.name][0] for _, timings in results)
+        rss_peak = max(timings[stage.name][1] for _, timings in results)
+        stage_seconds += seconds
+        record_stage(report, stage.name, started, df, seconds, rss_peak_mb=rss_peak)
+    record_stage(report, f'particionamento por {key} ({len(parts)}x)', started, df,
+                  time.perf_counter() - started - stage_seconds)
+    return df
+
+
+def build_features(df: pd.DataFrame, features=None, report: list = None, workers: int = 1) -> pd.DataFrame:
+    """Roda os estágios registrados sobre um frame já mesclado e remove as colunas auxiliares.
+
+    Com `features`, só os estágios de que elas dependem rodam. Se `report` for uma lista,
+    recebe tempo/linhas/pico de memória por estágio. Com `workers` > 1, os estágios que declaram
+    chave de partição rodam em paralelo em `workers` processos, que recebem as partições em
+    arquivos Arrow IPC. Só os scripts de linha de comando passam `workers`: na API o
+    paralelismo vem do pool de jobs, uma requisição por processo.
+    """
+    RSS_SAMPLER.start()
+    report = [] if report is None else report
+    stages = resolve_stages(features, available=set(df.columns))
+    apply_schema(df)
+
+    phases = plan_phases(stages) if workers > 1 and len(df) > 1 else [(None, stages)]
+    pool = None
+
+    # Cada chave é ordenada uma única vez; os estágios adicionam colunas no próprio df
+    cache = SortCache(df)
+    try:
+        for key, phase in phases:
+            if key is not None:
+                for stage in phase:
+                    if stage.banner:
+                        logger.info(stage.banner)
+                pool = pool or make_partition_pool(workers)
+                df = _run_phase_parallel(df, cache, key, phase, pool, workers, report)
+                continue
+            for stage in phase:
+                if stage.banner:
+                    logger.info(stage.banner)
+                started = time.perf_counter()
+                df = stage.func(df, cache=cache)
+                # Colunas criadas (ou sobrescritas) pelo estágio voltam ao schema compacto
+                apply_schema(df, stage.produces)
+                record_stage(report, stage.name, started, df)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
     logger.info("Excluindo colunas finais...")
+    started = time.perf_counter()
     df = exclude_features(df)
-    return df
\ No newline at end of file
+    record_stage(report, 'exclude_features', started, df)
+    return df
+
+def process_pipeline(payers_path: Path, sellers_path: Path, transactions_path_1: Path, transactions_path_2: Path,
+                     report: list = None, features=None, workers: int = 1,
+                     entity_index: EntityIndex = None) -> pd.DataFrame:
+    """Roda merge + features; se `report` for uma lista, recebe tempo/linhas/pico de memória por estágio.
+
+    Com `entity_index`, o histórico é restrito às entidades do lote (ver `run_merge`).
+    """
+    RSS_SAMPLER.start()
+    stage_report = []
+
+    started = time.perf_counter()
+    rows_in = sum(len(t) for t in (transactions_path_1, transactions_path_2) if isinstance(t, pd.DataFrame))
+    df = run_merge(payers_path,sellers_path,transactions_path_1,transactions_path_2, entity_index)
+    record_stage(stage_report, 'run_merge', started, df, rows_in=rows_in or None)
+
+    df = build_features(df, features, stage_report, workers)
+
+    log_stage_report(stage_report)
+    if report is not None:
+        report.extend(stage_report)
+    return df
@@ -0,0 +1,584 @@
+"""
+feature_store.py
+
+Estado incremental por entidade (card_id, terminal_id, card_bin) para gerar as
+features de um lote novo sem rodar o process_pipeline sobre todo o histórico.
+
+O estado é construído uma única vez a partir do histórico transacional e
+persistido em disco. Cada lote é pontuado consultando esse estado (contagem,
+média e variância dos valores, último instante/localização, pares terminal-cartão
+já vistos e linhas do tempo de fraudes) e depois incorporado a ele, de modo que o
+custo por requisição cresce com o tamanho do lote e não com o do histórico.
+
+As features produzidas são as mesmas do process_pipeline para lotes cujas
+transações são posteriores ao histórico de cada entidade. O estado não guarda as
+transações em si, então uma transação anterior à última já incorporada do seu
+cartão ou terminal é pontuada como se fosse a mais recente (o transform registra
+um aviso quando isso acontece). Transações reenviadas (transaction_id já
+incorporado) recebem as features calculadas no primeiro envio, enquanto estiverem
+entre as APPLIED_IDS_MAX mais recentes.
+"""
+
+import logging
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from data_processing import (
+    amount_norm_pdf,
+    apply_schema,
+    combine_moments,
+    concat_frames,
+    count_prior_events,
+    exclude_features,
+    generate_basic_features,
+    grouped_window_counts,
+    haversine,
+    NAT_I8,
+    prefix_moments,
+    REPORT_SHIFT,
+)
+
+logger = logging.getLogger(__name__)
+
+NAN_BIN = '__NAN_PLACEHOLDER__'
+# Versão do formato persistido; estados salvos em outra versão são reconstruídos
+STORE_FORMAT = 4
+# Inserções acumuladas em buffer antes de reordenar o estado (mínimo, ou 1/32 do tamanho)
+PENDING_MIN = 4096
+# Transações incorporadas mais recentes cujas features ficam guardadas para reenvios
+APPLIED_IDS_MAX = 200_000
+# Mesmas janelas de generate_temporal_features; a i-ésima janela enxerga (i + 1)
+# deslocamentos de REPORT_SHIFT na data de reporte e a de card_bin, todos eles.
+CARD_WINDOWS = [1, 7]
+CARD_WINDOW_LAGS = [(i + 1) * REPORT_SHIFT for i in range(len(CARD_WINDOWS))]
+CARDBIN_WINDOW_DAYS = 30
+CARDBIN_LAG = len(CARD_WINDOWS) * REPORT_SHIFT
+
+
+def _to_i8(values) -> np.ndarray:
+    return pd.to_datetime(values, errors='coerce').to_numpy(dtype='datetime64[ns]').view('i8')
+
+
+def _segments(sorted_keys: np.ndarray):
+    """Retorna (id do segmento, posição dentro do segmento) para chaves já ordenadas."""
+    is_start = np.ones(len(sorted_keys), dtype=bool)
+    is_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    seg_id = np.cumsum(is_start) - 1
+    starts = np.flatnonzero(is_start)
+    rank = np.arange(len(sorted_keys)) - starts[seg_id]
+    return seg_id, starts, rank
+
+
+def _exclusive_cumsum(values: np.ndarray, seg_id: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Soma acumulada das linhas anteriores dentro de cada segmento."""
+    cs = np.cumsum(values) - values
+    return cs - cs[starts][seg_id]
+
+
+def _lookup(arr: np.ndarray, codes: np.ndarray, fill):
+    """Lê arr[codes] tratando códigos provisórios/ausentes (fora do array) como fill."""
+    out = np.full(len(codes), fill, dtype=np.result_type(arr.dtype, np.asarray(fill).dtype))
+    known = (codes >= 0) & (codes < len(arr))
+    out[known] = arr[codes[known]]
+    return out
+
+
+def _pending_full(n_pending: int, n_sorted: int) -> bool:
+    return n_pending > max(PENDING_MIN, n_sorted // 32)
+
+
+def _sorted_contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """np.isin para um array já ordenado, sem reordená-lo a cada consulta."""
+    idx = np.searchsorted(sorted_values, values)
+    found = np.zeros(len(values), dtype=bool)
+    inside = idx < len(sorted_values)
+    found[inside] = sorted_values[idx[inside]] == values[inside]
+    return found
+
+
+class _KeySet:
+    """Conjunto de inteiros num array ordenado; inserções passam por um buffer pequeno."""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.pending = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys) + len(self.pending)
+
+    def contains(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.int64)
+        return _sorted_contains(self.keys, values) | _sorted_contains(self.pending, values)
+
+    def add(self, values):
+        values = np.unique(np.asarray(values, dtype=np.int64))
+        values = values[~self.contains(values)]
+        if not len(values):
+            return
+        self.pending = np.union1d(self.pending, values)
+        if _pending_full(len(self.pending), len(self.keys)):
+            # Intercala o buffer no array ordenado em O(n), sem reordenar tudo
+            self.keys = np.insert(self.keys, np.searchsorted(self.keys, self.pending), self.pending)
+            self.pending = np.empty(0, dtype=np.int64)
+
+
+class _EventIndex:
+    """Linhas do tempo (código da entidade, instante) ordenadas por chave, com offsets por código.
+
+    Eventos novos ficam num buffer e só são intercalados aos ordenados quando ele cresce, para
+    que incorporar poucas transações não reordene a linha do tempo inteira.
+    """
+
+    def __init__(self):
+        self.codes = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0, dtype=np.int64)
+        self.payload = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.pending = (self.codes, self.times, self.payload)
+
+    def __len__(self):
+        return len(self.codes) + len(self.pending[0])
+
+    def extend(self, codes, times, payload=None):
+        codes = np.asarray(codes, dtype=np.int64)
+        if not len(codes):
+            return
+        if payload is None:
+            payload = np.zeros(len(codes), dtype=np.int64)
+        new = (codes, np.asarray(times, dtype=np.int64), np.asarray(payload, dtype=np.int64))
+        self.pending = tuple(np.concatenate([old, arr]) for old, arr in zip(self.pending, new))
+        if _pending_full(len(self.pending[0]), len(self.codes)):
+            self.compact()
+
+    def compact(self):
+        """Intercala o buffer de eventos novos na parte ordenada."""
+        if not len(self.pending[0]):
+            return
+        self.codes = np.concatenate([self.codes, self.pending[0]])
+        self.times = np.concatenate([self.times, self.pending[1]])
+        self.payload = np.concatenate([self.payload, self.pending[2]])
+        self.pending = tuple(np.empty(0, dtype=np.int64) for _ in range(3))
+        order = np.lexsort((self.times, self.codes))
+        self.codes, self.times, self.payload = self.codes[order], self.times[order], self.payload[order]
+        n_keys = int(self.codes[-1]) + 1 if len(self.codes) else 0
+        self.offsets = np.searchsorted(self.codes, np.arange(n_keys + 1), side='left')
+
+    def gather(self, codes: np.ndarray):
+        """Eventos apenas das entidades informadas (fatias contíguas, sem varrer o resto)."""
+        codes = np.unique(codes)
+        # Só a parte ordenada tem offsets; entidades posteriores à última intercalação estão no buffer
+        in_sorted = codes[(codes >= 0) & (codes < len(self.offsets) - 1)]
+        starts = self.offsets[in_sorted]
+        lengths = self.offsets[in_sorted + 1] - starts
+        idx = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        pending = np.isin(self.pending[0], codes)
+        return tuple(
+            np.concatenate([arr[idx], pend[pending]])
+            for arr, pend in zip((self.codes, self.times, self.payload), self.pending)
+        )
+
+
+class _RunningMoments:
+    """Contagem, média e M2 (soma dos quadrados dos desvios) por código de entidade, como em Welford.
+
+    Um lote é resumido por entidade e combinado ao estado (combine_moments), o que equivale a
+    aplicar a atualização de Welford transação a transação: custo O(1) por transação, só nas
+    entidades do lote, e variância sem o cancelamento de `soma2 - soma**2 / n`.
+    """
+
+    def __init__(self):
+        self.n = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+
+    def grow(self, size: int):
+        extra = size - len(self.n)
+        if extra > 0:
+            self.n = np.concatenate([self.n, np.zeros(extra, dtype=np.int64)])
+            self.mean = np.concatenate([self.mean, np.zeros(extra)])
+            self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+
+    def prior(self, codes: np.ndarray, x: np.ndarray):
+        """(n, média, M2) do estado mais as linhas anteriores do lote, para `codes` contíguos."""
+        batch = prefix_moments(x, np.where(codes >= 0, codes, np.nan))
+        state = (_lookup(self.n, codes, 0), _lookup(self.mean, codes, 0.0), _lookup(self.m2, codes, 0.0))
+        return combine_moments(*state, *batch)
+
+    def update(self, codes: np.ndarray, x: np.ndarray):
+        if not len(codes):
+            return
+        self.grow(int(codes.max()) + 1)
+        touched, inverse = np.unique(codes, return_inverse=True)
+        n_b = np.bincount(inverse)
+        mean_b = np.bincount(inverse, weights=x) / n_b
+        m2_b = np.bincount(inverse, weights=(x - mean_b[inverse])**2)
+        self.n[touched], self.mean[touched], self.m2[touched] = combine_moments(
+            self.n[touched], self.mean[touched], self.m2[touched], n_b, mean_b, m2_b
+        )
+
+
+class FeatureStore:
+    """Estado por card_id, terminal_id e card_bin equivalente ao histórico já processado."""
+
+    def __init__(self):
+        self.signature = None
+        self.format = STORE_FORMAT
+        self.columns = []
+        self.keys = {
+            'card': pd.Index([], dtype=object),
+            'terminal': pd.Index([], dtype=object),
+            'bin': pd.Index([], dtype=object),
+        }
+        # Acumuladores de generate_card/terminal_amount_normalization
+        self.card_amount = _RunningMoments()
+        # Última transação do cartão (add_geographical_features)
+        self.card_last_time = np.zeros(0, dtype=np.int64)
+        self.card_last_lat = np.zeros(0)
+        self.card_last_lon = np.zeros(0)
+        self.term_amount = _RunningMoments()
+        # Último instante (terminal_basic_features) e reusos (terminal_reuse_ratio)
+        self.term_last_time = np.zeros(0, dtype=np.int64)
+        self.term_reuse = np.zeros(0, dtype=np.int64)
+        # Pares terminal-cartão já vistos, codificados como terminal << 32 | cartão
+        self.pairs = _KeySet()
+        # Linhas do tempo de fraudes e não-fraudes
+        self.card_reports = _EventIndex()
+        self.card_nonfraud = _EventIndex()
+        self.term_first_report = _EventIndex()   # payload = código do cartão
+        self.bin_reports = _EventIndex()
+        # Features das últimas transações incorporadas, por transaction_id (reenvios)
+        self.applied = pd.DataFrame()
+
+    # ------------------------------------------------------------------
+    #  Construção e persistência
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, df_history: pd.DataFrame, signature=None) -> "FeatureStore":
+        """Constrói o estado a partir do histórico já mesclado com payers/sellers."""
+        store = cls()
+        store.signature = signature
+        store.columns = list(df_history.columns)
+        store._apply(df_history)
+        logger.info(
+            f"Feature store construído: {len(store.keys['card'])} cartões, "
+            f"{len(store.keys['terminal'])} terminais, {len(store.keys['bin'])} card_bins."
+        )
+        return store
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        joblib.dump(self, tmp_path)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, signature=None):
+        """Carrega o estado persistido; retorna None se não existir ou for de outro histórico."""
+        if not path.exists():
+            return None
+        try:
+            store = joblib.load(path)
+        except Exception as e:
+            logger.warning(f"Falha ao carregar feature store de {path}: {e}")
+            return None
+        if getattr(store, 'format', 1) != STORE_FORMAT:
+            logger.info("Feature store persistido está em formato antigo; será reconstruído.")
+            return None
+        if signature is not None and store.signature != signature:
+            logger.info("Feature store persistido é de outro histórico; será reconstruído.")
+            return None
+        return store
+
+    # ------------------------------------------------------------------
+    #  Codificação das entidades
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _bin_values(df: pd.DataFrame) -> pd.Series:
+        return df['card_bin'].astype(object).where(df['card_bin'].notna(), NAN_BIN)
+
+    def _encode(self, kind: str, values) -> np.ndarray:
+        """Códigos das entidades; chaves novas recebem códigos provisórios após as conhecidas."""
+        values = pd.Index(values, dtype=object)
+        index = self.keys[kind]
+        codes = index.get_indexer(values).astype(np.int64)
+        unknown = (codes < 0) & values.notna()
+        if unknown.any():
+            new_codes, _ = pd.factorize(values[unknown])
+            codes[unknown] = len(index) + new_codes
+        return codes
+
+    def _register(self, kind: str, values):
+        values = pd.Index(values, dtype=object)
+        new_keys = values[values.notna()].unique().difference(self.keys[kind], sort=False)
+        if len(new_keys):
+            self.keys[kind] = self.keys[kind].append(new_keys)
+        return len(self.keys[kind])
+
+    # ------------------------------------------------------------------
+    #  Geração das features para um lote
+    # ------------------------------------------------------------------
+    def applied_mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Linhas do lote cujo transaction_id já foi incorporado ao estado (e ainda está guardado)."""
+        if 'transaction_id' not in df.columns or self.applied.empty:
+            return np.zeros(len(df), dtype=bool)
+        return df['transaction_id'].astype(str).isin(self.applied.index).to_numpy()
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Gera as features do process_pipeline para um lote já mesclado (merge_test).
+
+        Transações já incorporadas pelo update não são pontuadas de novo contra um estado
+        que as contém: recebem as features guardadas do primeiro envio.
+        """
+        df = df.reset_index(drop=True)
+        seen = self.applied_mask(df)
+        if not seen.any():
+            return self._features(df)
+        ids = df['transaction_id'].astype(str)
+        parts = [self.applied.loc[ids[seen]].reset_index(drop=True)]
+        if not seen.all():
+            parts.insert(0, self._features(df[~seen]))
+        order = np.concatenate([np.flatnonzero(~seen), np.flatnonzero(seen)])
+        out = concat_frames(parts)
+        return apply_schema(out.take(np.argsort(order, kind='stable')).reset_index(drop=True))
+
+    def _features(self, df: pd.DataFrame) -> pd.DataFrame:
+        cols = self.columns + [c for c in df.columns if c not in self.columns]
+        df = generate_basic_features(df.reindex(columns=cols).reset_index(drop=True))
+
+        n = len(df)
+        pos = np.arange(n)
+        t = _to_i8(df['tx_datetime'])
+        x = df['tx_amount'].to_numpy(dtype=float)
+        lat = df['latitude'].to_numpy(dtype=float)
+        lon = df['longitude'].to_numpy(dtype=float)
+        card = self._encode('card', df['card_id'])
+        term = self._encode('terminal', df['terminal_id'])
+        cbin = self._encode('bin', self._bin_values(df))
+        card_rank = pd.factorize(df['card_id'], sort=True)[0]
+        term_rank = pd.factorize(df['terminal_id'], sort=True)[0]
+        report = _to_i8(df['tx_fraud_report_date'])
+        is_fraud_ev = (df['is_fraud'] == 1).to_numpy() & (report != NAT_I8)
+        is_nonfraud = (df['is_fraud'] == 0).to_numpy()
+
+        late = (t < _lookup(self.card_last_time, card, NAT_I8)) | (t < _lookup(self.term_last_time, term, NAT_I8))
+        if late.any():
+            logger.warning(
+                f"{int(late.sum())} transações do lote são anteriores à última já incorporada do cartão "
+                f"ou terminal; suas features consideram o estado inteiro e podem divergir do modo full."
+            )
+
+        # card_basic_features
+        df['card_age_days'] = (
+            (df['tx_datetime'] - pd.to_datetime(df['card_first_transaction'])).dt.days.fillna(0).astype(int)
+        )
+
+        # generate_card_amount_normalization: ordem (card_id, tx_datetime)
+        o = np.lexsort((pos, t, card))
+        pdf = amount_norm_pdf(x[o], *self.card_amount.prior(card[o], x[o]))
+        card_pdf = np.empty(n)
+        card_pdf[o] = pdf
+
+        # terminal_basic_features / terminal_reuse_ratio / terminal normalization:
+        # ordem (terminal_id, tx_datetime) com empates pela ordem anterior (card_id)
+        o = np.lexsort((pos, card_rank, t, term))
+        seg, starts, rank = _segments(term[o])
+        prev_t = np.where(rank > 0, np.roll(t[o], 1), _lookup(self.term_last_time, term[o], NAT_I8))
+        diff = np.where((prev_t == NAT_I8) | (term[o] < 0), 0.0, (t[o] - prev_t) / 1e9)
+        time_diff = np.empty(n)
+        time_diff[o] = diff
+
+        # Sem cartão ou terminal não há par: como no groupby do pipeline, que descarta chaves nulas
+        has_pair = (term[o] >= 0) & (card[o] >= 0)
+        pair = np.where(has_pair, (term[o] << 32) | card[o], -1)
+        repeated = pd.Series(pair).groupby(pair).cumcount().to_numpy() > 0
+        seen_before = has_pair & (self.pairs.contains(pair) | repeated)
+        reuse_prior = _lookup(self.term_reuse, term[o], 0) + _exclusive_cumsum(seen_before.astype(np.int64), seg, starts)
+        count_prior = _lookup(self.term_amount.n, term[o], 0) + rank
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where((count_prior == 0) | (term[o] < 0), 0.0, reuse_prior / count_prior)
+        reuse_ratio = np.empty(n)
+        reuse_ratio[o] = ratio
+
+        pdf = amount_norm_pdf(x[o], *self.term_amount.prior(term[o], x[o]))
+        term_pdf = np.empty(n)
+        term_pdf[o] = pdf
+
+        # shared_terminal_with_fraud: cartões distintos com fraude reportada antes de cada transação
+        ev_term, ev_time, ev_card = self.term_first_report.gather(term)
+        if is_fraud_ev.any():
+            firsts = pd.DataFrame({
+                'term': np.concatenate([ev_term, term[is_fraud_ev]]),
+                'card': np.concatenate([ev_card, card[is_fraud_ev]]),
+                'time': np.concatenate([ev_time, report[is_fraud_ev]]),
+            }).groupby(['term', 'card'])['time'].min().reset_index()
+            ev_term, ev_time = firsts['term'].to_numpy(), firsts['time'].to_numpy()
+        shared = count_prior_events(ev_term, ev_time, term, t)
+
+        # add_card_fraud_nonfraud_window
+        ev_card_r, ev_time_r, _ = self.card_reports.gather(card)
+        ev_card_r = np.concatenate([ev_card_r, card[is_fraud_ev]])
+        ev_time_r = np.concatenate([ev_time_r, report[is_fraud_ev]])
+        ev_card_nf, ev_time_nf, _ = self.card_nonfraud.gather(card)
+        ev_card_nf = np.concatenate([ev_card_nf, card[is_nonfraud]])
+        ev_time_nf = np.concatenate([ev_time_nf, t[is_nonfraud]])
+        spans = [pd.Timedelta(days=w) for w in CARD_WINDOWS]
+        fraud_counts = grouped_window_counts(ev_card_r, ev_time_r, card, t, spans, CARD_WINDOW_LAGS)
+        nonfraud_counts = grouped_window_counts(ev_card_nf, ev_time_nf, card, t, spans)
+        fraud_counts[:, card < 0] = 0
+        nonfraud_counts[:, card < 0] = 0
+
+        # add_geographical_features: ordem (card_id, tx_datetime) com empates pela ordem anterior (terminal_id)
+        o = np.lexsort((pos, term_rank, t, card))
+        seg, starts, rank = _segments(card[o])
+        prev_lat = np.where(rank > 0, np.roll(lat[o], 1), _lookup(self.card_last_lat, card[o], np.nan))
+        prev_lon = np.where(rank > 0, np.roll(lon[o], 1), _lookup(self.card_last_lon, card[o], np.nan))
+        # O pipeline lê tx_time_diff_prev já convertido para float32 (FRAME_SCHEMA)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = haversine(prev_lat, prev_lon, lat[o], lon[o]) / (time_diff[o].astype(np.float32) / 3600)
+        speed = np.nan_to_num(np.where(np.isinf(speed), 800, speed), nan=0.0)
+        # Sem cartão não há transação anterior (o groupby do pipeline descarta a chave nula)
+        speed[card[o] < 0] = 0.0
+        avg_speed = np.empty(n)
+        avg_speed[o] = speed
+
+        # add_cardbin_fraud_window
+        ev_bin, ev_time_b, _ = self.bin_reports.gather(cbin)
+        ev_bin = np.concatenate([ev_bin, cbin[is_fraud_ev]])
+        ev_time_b = np.concatenate([ev_time_b, report[is_fraud_ev]])
+        bin_counts = grouped_window_counts(
+            ev_bin, ev_time_b, cbin, t, [pd.Timedelta(days=CARDBIN_WINDOW_DAYS)], [CARDBIN_LAG]
+        )
+
+        df['tx_time_diff_prev'] = time_diff
+        df['amount_card_norm_pdf'] = card_pdf
+        df['terminal_age_days'] = (
+            (df['tx_datetime'] - pd.to_datetime(df['terminal_operation_start'])).dt.days.fillna(0).astype(int)
+        )
+        df['terminal_card_reuse_ratio_prior'] = reuse_ratio
+        df['shared_terminal_with_frauds_prior'] = np.where(term < 0, 0, shared)
+        for i, window_days in enumerate(CARD_WINDOWS):
+            df[f'card_fraud_count_last_{window_days}d'] = fraud_counts[i]
+            df[f'card_nonfraud_count_last_{window_days}d'] = nonfraud_counts[i]
+        df['amount_terminal_norm_pdf'] = term_pdf
+        df['avg_speed_between_txs'] = avg_speed
+        df[f'cardbin_fraud_count_last_{CARDBIN_WINDOW_DAYS}d'] = bin_counts[0]
+        return exclude_features(apply_schema(df))
+
+    # ------------------------------------------------------------------
+    #  Atualização do estado
+    # ------------------------------------------------------------------
+    def update(self, df: pd.DataFrame, features: pd.DataFrame = None):
+        """Incorpora ao estado um lote já mesclado (merge_test), ignorando transaction_ids já aplicados.
+
+        `features` é a saída do transform deste mesmo lote, guardada para responder reenvios;
+        sem ela, as transações incorporadas são pontuadas de novo se reenviadas.
+        """
+        df = df.reset_index(drop=True)
+        seen = self.applied_mask(df)
+        df = df[~seen]
+        if 'transaction_id' in df.columns:
+            # Duplicatas dentro do próprio lote também só entram uma vez
+            df = df[~df['transaction_id'].astype(str).duplicated()]
+        if df.empty:
+            return
+        self._apply(df)
+        if features is not None and 'transaction_id' in features.columns:
+            features = features.reset_index(drop=True)[~seen]
+            features = features.loc[df.index]
+            applied = concat_frames([self.applied, features]) if not self.applied.empty else features
+            applied = applied.iloc[-APPLIED_IDS_MAX:]
+            applied.index = applied['transaction_id'].astype(str).to_numpy()
+            self.applied = applied
+
+    def _apply(self, df: pd.DataFrame):
+        df = df.reset_index(drop=True)
+        t = _to_i8(df['tx_datetime'])
+        x = np.log1p(df['tx_amount'].to_numpy(dtype=float))
+        lat = df['latitude'].to_numpy(dtype=float)
+        lon = df['longitude'].to_numpy(dtype=float)
+        bins = self._bin_values(df)
+
+        n_cards = self._register('card', df['card_id'])
+        n_terms = self._register('terminal', df['terminal_id'])
+        n_bins = self._register('bin', bins)
+        card = self._encode('card', df['card_id'])
+        term = self._encode('terminal', df['terminal_id'])
+        cbin = self._encode('bin', bins)
+        term_rank = pd.factorize(df['terminal_id'], sort=True)[0]
+        card_rank = pd.factorize(df['card_id'], sort=True)[0]
+        report = _to_i8(df['tx_fraud_report_date']) if 'tx_fraud_report_date' in df else np.full(len(df), NAT_I8)
+        is_fraud = (df['is_fraud'] == 1).to_numpy() if 'is_fraud' in df else np.zeros(len(df), dtype=bool)
+        is_nonfraud = (df['is_fraud'] == 0).to_numpy() if 'is_fraud' in df else np.zeros(len(df), dtype=bool)
+        is_fraud_ev = is_fraud & (report != NAT_I8)
+
+        def grow(arr, size, fill):
+            if len(arr) >= size:
+                return arr
+            return np.concatenate([arr, np.full(size - len(arr), fill, dtype=arr.dtype)])
+
+        self.card_amount.grow(n_cards)
+        self.card_last_time = grow(self.card_last_time, n_cards, NAT_I8)
+        self.card_last_lat = grow(self.card_last_lat, n_cards, np.nan)
+        self.card_last_lon = grow(self.card_last_lon, n_cards, np.nan)
+        self.term_amount.grow(n_terms)
+        self.term_last_time = grow(self.term_last_time, n_terms, NAT_I8)
+        self.term_reuse = grow(self.term_reuse, n_terms, 0)
+
+        has_card = card >= 0
+        has_term = term >= 0
+        c, tm = card[has_card], term[has_term]
+        self.card_amount.update(c, x[has_card])
+        self.term_amount.update(tm, x[has_term])
+        np.maximum.at(self.term_last_time, tm, t[has_term])
+
+        # Última posição de cada cartão na ordem de add_geographical_features
+        o = np.lexsort((np.arange(len(df)), term_rank, t, card))
+        o = o[card[o] >= 0]
+        is_last = np.ones(len(o), dtype=bool)
+        is_last[:-1] = card[o][1:] != card[o][:-1]
+        last = o[is_last]
+        newer = t[last] >= self.card_last_time[card[last]]
+        last = last[newer]
+        self.card_last_time[card[last]] = t[last]
+        self.card_last_lat[card[last]] = lat[last]
+        self.card_last_lon[card[last]] = lon[last]
+
+        # Reusos: toda transação de um par terminal-cartão já visto conta como reuso
+        both = has_card & has_term
+        pair = (term[both] << 32) | card[both]
+        unique_pairs = np.unique(pair)
+        new_pairs = unique_pairs[~self.pairs.contains(unique_pairs)]
+        _, first_idx = np.unique(pair, return_index=True)
+        first_seen = np.zeros(len(pair), dtype=bool)
+        first_seen[first_idx] = True
+        is_reuse = ~(first_seen & np.isin(pair, new_pairs))
+        np.add.at(self.term_reuse, term[both][is_reuse], 1)
+        self.pairs.add(new_pairs)
+
+        # Linhas do tempo
+        fr = is_fraud_ev & has_card
+        self.card_reports.extend(card[fr], report[fr])
+        nf = is_nonfraud & has_card
+        self.card_nonfraud.extend(card[nf], t[nf])
+        self.bin_reports.extend(cbin[is_fraud_ev], report[is_fraud_ev])
+
+        fr = is_fraud_ev & both
+        if fr.any():
+            self.term_first_report.compact()
+            ev_term, ev_time, ev_card = self.term_first_report.gather(term[fr])
+            firsts = pd.DataFrame({
+                'term': np.concatenate([ev_term, term[fr]]),
+                'card': np.concatenate([ev_card, card[fr]]),
+                'time': np.concatenate([ev_time, report[fr]]),
+            }).groupby(['term', 'card'])['time'].min().reset_index()
+            touched = np.isin(self.term_first_report.codes, np.unique(term[fr]))
+            keep = _EventIndex()
+            keep.extend(
+                np.concatenate([self.term_first_report.codes[~touched], firsts['term'].to_numpy()]),
+                np.concatenate([self.term_first_report.times[~touched], firsts['time'].to_numpy()]),
+                np.concatenate([self.term_first_report.payload[~touched], firsts['card'].to_numpy()]),
+            )
+            self.term_first_report = keep
@@ -0,0 +1,428 @@
+"""
+inference.py
+
+Caminho de inferência compilado para o ensemble de produção
+(ImbPipeline → VotingClassifier soft → [ColumnTransformer → RUS → LightGBM/XGBoost]).
+
+`compile_model` percorre o pipeline já treinado uma única vez e monta um
+`InferenceGraph` que, a cada chamada:
+
+- pula os samplers (só atuam no fit);
+- monta a matriz de cada membro direto em numpy: one-hot por lookup das
+  categorias (sem matriz esparsa e sem `toarray`), PolynomialFeatures +
+  StandardScaler in-place e Binarizer vetorizado;
+- chama os boosters nativos (`Booster.predict` do LightGBM e `inplace_predict`
+  do XGBoost), sem a validação/conversão repetida do wrapper sklearn;
+- faz a média ponderada das probabilidades como o VotingClassifier.
+
+As operações seguem a mesma ordem e os mesmos dtypes do sklearn, então os
+scores são idênticos aos de `model.predict_proba(X)[:, 1]`. Qualquer peça que
+não seja reconhecida usa o próprio `transform`/`predict_proba` do estimador;
+estruturas não suportadas levantam ValueError e a API continua no caminho sklearn.
+Os atributos privados consultados (configuração de set_output do sklearn e as
+APIs de inplace_predict do XGBClassifier) ficam em try: se uma versão das
+bibliotecas os mudar, a peça correspondente volta ao caminho público.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import VotingClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import (
+    Binarizer, FunctionTransformer, OneHotEncoder, PolynomialFeatures, StandardScaler,
+)
+
+logger = logging.getLogger(__name__)
+
+# Mesmos dtypes aceitos pelo check_array(dtype=FLOAT_DTYPES) do sklearn
+FLOAT_DTYPES = (np.float64, np.float32, np.float16)
+
+
+def _as_float(X: np.ndarray, owned: bool):
+    if X.dtype in FLOAT_DTYPES:
+        return X, owned
+    return X.astype(np.float64), True
+
+
+class _Columns:
+    """Colunas do DataFrame de entrada como arrays numpy, lidas uma vez por chamada."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def get(self, col: str) -> np.ndarray:
+        array = self._arrays.get(col)
+        if array is None:
+            array = self._arrays[col] = self.df[col].to_numpy()
+        return array
+
+    def matrix(self, cols: list) -> np.ndarray:
+        """Equivale a np.asarray(df[cols]), sem o custo de indexação do pandas."""
+        arrays = [self.get(c) for c in cols]
+        out = np.empty((len(self.df), len(cols)), dtype=np.result_type(*(a.dtype for a in arrays)))
+        for j, array in enumerate(arrays):
+            out[:, j] = array
+        return out
+
+
+def _is_sampler(step) -> bool:
+    return step is None or (isinstance(step, str) and step == "passthrough") or hasattr(step, "fit_resample")
+
+
+# ==============================================================================
+#  TRANSFORMAÇÕES
+# ==============================================================================
+class _Polynomial2:
+    """PolynomialFeatures(degree=2, include_bias=False), na ordem de colunas do sklearn."""
+
+    def __init__(self, poly: PolynomialFeatures):
+        n = poly.n_features_in_
+        if poly.degree != 2 or poly.include_bias or poly.interaction_only:
+            raise ValueError(f"PolynomialFeatures não suportado: {poly}")
+        # Lineares e depois x_i * x_j (j >= i); confere com powers_ antes de confiar na ordem
+        expected = [np.eye(n, dtype=int)]
+        for i in range(n):
+            block = np.zeros((n - i, n), dtype=int)
+            block[:, i] += 1
+            block[np.arange(n - i), np.arange(i, n)] += 1
+            expected.append(block)
+        if not np.array_equal(poly.powers_, np.vstack(expected)):
+            raise ValueError("Ordem de colunas do PolynomialFeatures inesperada.")
+        self.n_features = n
+        self.n_output = poly.n_output_features_
+
+    def __call__(self, X: np.ndarray, owned: bool):
+        X, _ = _as_float(X, owned)
+        n = self.n_features
+        out = np.empty((X.shape[0], self.n_output), dtype=X.dtype)
+        out[:, :n] = X
+        pos = n
+        for i in range(n):
+            np.multiply(X[:, i:], X[:, i:i + 1], out=out[:, pos:pos + n - i])
+            pos += n - i
+        return out, True
+
+
+class _Scaler:
+    def __init__(self, scaler: StandardScaler):
+        self.mean = scaler.mean_ if scaler.with_mean else None
+        self.scale = scaler.scale_ if scaler.with_std else None
+
+    def __call__(self, X: np.ndarray, owned: bool):
+        X, owned = _as_float(X, owned)
+        if not owned:
+            X = X.copy()
+        # Como o sklearn: média/escala convertidas para o dtype de X (float32 fica em float32)
+        if self.mean is not None:
+            X -= self.mean.astype(X.dtype, copy=False)
+        if self.scale is not None:
+            X /= self.scale.astype(X.dtype, copy=False)
+        return X, True
+
+
+class _Binarize:
+    def __init__(self, binarizer: Binarizer):
+        self.threshold = binarizer.threshold
+
+    def __call__(self, X: np.ndarray, owned: bool):
+        if X.dtype == object:
+            X = X.astype(np.float64)
+        return (X > self.threshold).astype(X.dtype), True
+
+
+class _Cast:
+    """FunctionTransformer(model.as_dtype), usado nos modelos treinados em float32."""
+
+    def __init__(self, transformer: FunctionTransformer):
+        self.dtype = np.dtype(transformer.kw_args["dtype"])
+
+    def __call__(self, X, owned: bool):
+        cast = X.astype(self.dtype, copy=False)
+        return cast, owned or cast is not X
+
+
+class _Identity:
+    def __call__(self, X: np.ndarray, owned: bool):
+        return X, owned
+
+
+_ARRAY_OPS = {
+    PolynomialFeatures: _Polynomial2,
+    StandardScaler: _Scaler,
+    Binarizer: _Binarize,
+}
+
+
+def _array_op(step):
+    if isinstance(step, str) and step == "passthrough":
+        return _Identity()
+    if type(step) is FunctionTransformer and step.func is None:
+        return _Identity()
+    # Reconhecido pelo nome para não importar model.py (que importa lightgbm/xgboost)
+    if type(step) is FunctionTransformer and getattr(step.func, "__name__", None) == "as_dtype":
+        return _Cast(step)
+    op = _ARRAY_OPS.get(type(step))
+    if op is None:
+        raise ValueError(f"Transformação sem versão compilada: {type(step).__name__}")
+    return op(step)
+
+
+class _OneHot:
+    """OneHotEncoder denso: posição de cada valor em categories_, respeitando drop_idx_."""
+
+    def __init__(self, encoder: OneHotEncoder):
+        if getattr(encoder, "_infrequent_enabled", False):
+            raise ValueError("OneHotEncoder com categorias infrequentes não é suportado.")
+        drop_idx = encoder.drop_idx_
+        self.categories = [pd.Index(c) for c in encoder.categories_]
+        self.drop = [
+            None if drop_idx is None or drop_idx[i] is None else int(drop_idx[i])
+            for i in range(len(self.categories))
+        ]
+        self.widths = [len(c) - (d is not None) for c, d in zip(self.categories, self.drop)]
+        self.handle_unknown = encoder.handle_unknown
+        self.dtype = encoder.dtype
+
+    @staticmethod
+    def _positions(values: pd.Series, categories: pd.Index) -> np.ndarray:
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Resolve só as categorias distintas e propaga pelos códigos
+            lookup = categories.get_indexer(values.cat.categories)
+            codes = values.cat.codes.to_numpy()
+            missing = categories.get_indexer([np.nan])[0] if categories.hasnans else -1
+            return np.where(codes >= 0, lookup[codes], missing)
+        return categories.get_indexer(values)
+
+    def transform(self, columns: _Columns, cols: list) -> np.ndarray:
+        out = np.zeros((len(columns), sum(self.widths)), dtype=self.dtype)
+        offset = 0
+        for col, categories, drop, width in zip(cols, self.categories, self.drop, self.widths):
+            k = self._positions(columns.df[col], categories)
+            keep = k >= 0
+            if self.handle_unknown == "error" and not keep.all():
+                raise ValueError(f"Categorias desconhecidas na coluna '{col}'.")
+            if drop is not None:
+                keep &= k != drop
+                k = k - (k > drop)
+            rows = np.flatnonzero(keep)
+            out[rows, offset + k[rows]] = 1
+            offset += width
+        return out
+
+
+class _Fallback:
+    """Transformer sem versão compilada: usa o próprio transform."""
+
+    def __init__(self, transformer):
+        self.transformer = transformer
+
+    def transform(self, columns: _Columns, cols: list) -> np.ndarray:
+        out = self.transformer.transform(columns.df[cols])
+        return out.toarray() if sparse.issparse(out) else np.asarray(out)
+
+
+class _TransformStep:
+    def __init__(self, transformer):
+        self.transformer = transformer
+
+    def __call__(self, X, owned: bool):
+        return self.transformer.transform(X), True
+
+
+class _ArrayChain:
+    def __init__(self, ops: list):
+        self.ops = ops
+
+    def transform(self, columns: _Columns, cols: list) -> np.ndarray:
+        X, owned = columns.matrix(cols), True
+        for op in self.ops:
+            X, owned = op(X, owned)
+        return X
+
+
+def _compile_transformer(transformer):
+    if isinstance(transformer, OneHotEncoder):
+        return _OneHot(transformer)
+    steps = [s for _, s in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+    try:
+        return _ArrayChain([_array_op(s) for s in steps])
+    except ValueError:
+        return _Fallback(transformer)
+
+
+class _CompiledColumnTransformer:
+    """
+    ColumnTransformer: cada bloco é escrito na sua faixa de output_indices_. Se o
+    treino fixou saída esparsa, a matriz vira CSR no fim com o mesmo padrão de
+    não-zeros do sparse.hstack do sklearn (relevante para o XGBoost, que trata
+    entradas ausentes do CSR como missing).
+    """
+
+    def __init__(self, ct: ColumnTransformer):
+        self.sparse = bool(getattr(ct, "sparse_output_", False))
+        try:
+            # Atributo privado do sklearn: sem ele legível, não dá para garantir a saída numpy
+            output_config = getattr(ct, "_sklearn_output_config", {}).get("transform")
+        except Exception as e:
+            raise ValueError(f"Configuração de saída do ColumnTransformer ilegível: {e}") from e
+        if output_config not in (None, "default"):
+            raise ValueError("ColumnTransformer com set_output não é suportado.")
+        names_in = getattr(ct, "feature_names_in_", None)
+        self.blocks = []
+        for name, transformer, cols in ct.transformers_:
+            output = ct.output_indices_[name]
+            if isinstance(transformer, str) and transformer == "drop" or output.stop == output.start:
+                continue
+            cols = list(cols)
+            if cols and not isinstance(cols[0], str):
+                if names_in is None:
+                    raise ValueError("Seleção de colunas por posição sem feature_names_in_.")
+                cols = list(np.asarray(names_in)[cols])
+            self.blocks.append((output, cols, _compile_transformer(transformer)))
+        self.width = max(output.stop for output, _, _ in self.blocks)
+
+    def transform(self, columns: _Columns) -> np.ndarray:
+        parts = [(output, compiled.transform(columns, cols)) for output, cols, compiled in self.blocks]
+        # Mesmo dtype final do np.hstack do sklearn
+        out = np.empty((len(columns), self.width), dtype=np.result_type(*(p.dtype for _, p in parts)))
+        for output, part in parts:
+            out[:, output] = part
+        return sparse.csr_matrix(out) if self.sparse else out
+
+
+# ==============================================================================
+#  CLASSIFICADORES
+# ==============================================================================
+class _LightGBMPositive:
+    def __init__(self, clf):
+        if clf.n_classes_ != 2 or callable(clf.objective):
+            raise ValueError("Só LightGBM binário com objetivo nativo é suportado.")
+        self.booster = clf.booster_
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        return self.booster.predict(X)
+
+
+class _XGBoostPositive:
+    def __init__(self, clf):
+        try:
+            # APIs privadas do XGBClassifier: as mesmas que o predict_proba dele consulta
+            supported = clf.n_classes_ == 2 and clf._can_use_inplace_predict()
+            iteration_range = clf._get_iteration_range(None)
+        except Exception as e:
+            raise ValueError(f"XGBoost sem as APIs esperadas para inplace_predict: {e}") from e
+        if not supported:
+            raise ValueError("Só XGBoost binário com inplace_predict é suportado.")
+        self.booster = clf.get_booster()
+        self.iteration_range = iteration_range
+        self.missing = clf.missing
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        return self.booster.inplace_predict(
+            X, iteration_range=self.iteration_range, predict_type="value",
+            missing=self.missing, validate_features=False,
+        )
+
+
+class _ProbaPositive:
+    def __init__(self, clf):
+        self.clf = clf
+
+    def __call__(self, X) -> np.ndarray:
+        return self.clf.predict_proba(X)[:, 1]
+
+
+def _compile_classifier(clf):
+    # Detecta pelo módulo para não importar lightgbm/xgboost à toa
+    module = type(clf).__module__.split(".")[0]
+    try:
+        if module == "lightgbm":
+            return _LightGBMPositive(clf)
+        if module == "xgboost":
+            return _XGBoostPositive(clf)
+    except Exception as e:
+        logger.warning(f"{type(clf).__name__} sem caminho nativo ({e}); usando predict_proba.")
+    return _ProbaPositive(clf)
+
+
+class _Member:
+    """Um estimador do ensemble: pré-processamento compilado + classificador."""
+
+    def __init__(self, estimator):
+        steps = [s for _, s in estimator.steps] if isinstance(estimator, Pipeline) else [estimator]
+        self.prepro = None
+        # Passos depois do ColumnTransformer (ex.: cast para float32) recebem a matriz
+        self.post = []
+        for step in steps[:-1]:
+            if _is_sampler(step):
+                continue
+            if self.prepro is None and isinstance(step, ColumnTransformer):
+                self.prepro = _CompiledColumnTransformer(step)
+                continue
+            if self.prepro is None:
+                raise ValueError(f"Passo de pipeline não suportado: {type(step).__name__}")
+            try:
+                op = _array_op(step)
+            except ValueError:
+                op = None
+            # A matriz pode ser CSR aqui: só cast/identidade são aplicados direto
+            self.post.append(op if isinstance(op, (_Cast, _Identity)) else _TransformStep(step))
+        self.predict = _compile_classifier(steps[-1])
+
+    def __call__(self, columns: _Columns) -> np.ndarray:
+        if self.prepro is None:
+            return self.predict(columns.df)
+        X, owned = self.prepro.transform(columns), True
+        for op in self.post:
+            X, owned = op(X, owned)
+        return self.predict(X)
+
+
+# ==============================================================================
+#  GRAFO DE INFERÊNCIA
+# ==============================================================================
+class InferenceGraph:
+    """Probabilidade da classe positiva, igual a `model.predict_proba(X)[:, 1]`."""
+
+    def __init__(self, members: list, weights=None, feature_names=None):
+        self.members = members
+        self.weights = weights
+        self.feature_names = feature_names
+
+    def predict_positive(self, X: pd.DataFrame) -> np.ndarray:
+        columns = _Columns(X)
+        probas = np.asarray([member(columns) for member in self.members])
+        # Mesma redução do VotingClassifier (np.average sobre os estimadores)
+        return np.average(probas, axis=0, weights=self.weights)
+
+
+def compile_model(model) -> InferenceGraph:
+    """Compila o pipeline treinado; levanta ValueError se a estrutura não for suportada."""
+    steps = [s for _, s in model.steps] if isinstance(model, Pipeline) else [model]
+    for step in steps[:-1]:
+        if not _is_sampler(step):
+            raise ValueError(f"Passo de pipeline não suportado antes do classificador: {type(step).__name__}")
+
+    final = steps[-1]
+    if isinstance(final, VotingClassifier):
+        if final.voting != "soft":
+            raise ValueError("Só VotingClassifier com voting='soft' é suportado.")
+        if len(final.classes_) != 2:
+            raise ValueError("Só classificação binária é suportada.")
+        members = [_Member(est) for est in final.estimators_]
+        # Pesos dos estimadores não descartados ('drop'), alinhados com estimators_
+        weights = None
+        if final.weights is not None:
+            weights = [w for (_, est), w in zip(final.estimators, final.weights) if est != "drop"]
+    else:
+        members, weights = [_Member(final)], None
+
+    return InferenceGraph(members, weights, getattr(model, "feature_names_in_", None))
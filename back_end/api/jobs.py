@@ -0,0 +1,169 @@
+"""
+jobs.py
+
+Fila de jobs de pontuação em lote.
+
+O endpoint de upload só valida o arquivo e registra um job; o trabalho pesado
+(features + predict_proba) roda fora do event loop:
+
+- num pool de processos criados pelo forkserver (spawn onde não houver), nunca
+  por fork do processo da API: quando o pool é criado já há threads rodando
+  (downloads, executores, o event loop), e um fork nesse momento pode deixar
+  no filho um lock que nunca será liberado. Cada worker carrega o estado de
+  que precisa (modelo, tabelas) num initializer, e o pool vive enquanto a API
+  viver (uma troca de modelo não o recria);
+- numa thread dedicada para o que muda estado compartilhado do processo
+  principal (o feature store incremental), o que mantém a ordem dos lotes.
+
+Os jobs ficam em memória com status e horários, consultados por `/jobs/{job_id}`.
+Os resultados também, mas limitados pelo total de linhas (`max_result_rows`):
+acima dele, os resultados dos jobs concluídos mais antigos são descartados e
+continuam disponíveis só nos logs de predição gravados no banco.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    job_id: str
+    transactions: int
+    status: str = JOB_QUEUED
+    submitted_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: datetime = None
+    finished_at: datetime = None
+    error: str = None
+    results: list = None
+    # Resultados descartados da memória pelo limite de linhas da fila
+    results_expired: bool = False
+    # Relatório de estágios, só quando o upload pediu profiling (cabeçalho X-Profile)
+    profile: list = None
+
+
+def _noop():
+    return os.getpid()
+
+
+def make_process_pool(workers: int, initializer=None, initargs=()) -> Executor:
+    """Pool de processos pelo forkserver (spawn onde não houver), com todos os workers já iniciados.
+
+    `initializer(*initargs)` roda uma vez em cada worker e carrega o estado dele; uma falha ali
+    é levantada aqui, antes de o pool receber jobs.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    if method == "forkserver" and initializer is not None:
+        # O forkserver importa o módulo do initializer uma vez; os workers nascem dele com os imports feitos
+        context.set_forkserver_preload([initializer.__module__])
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=context,
+        initializer=initializer, initargs=initargs,
+    )
+    # Workers são criados sob demanda: um submit simultâneo por worker sobe todos agora
+    try:
+        for future in [pool.submit(_noop) for _ in range(workers)]:
+            future.result()
+    except Exception:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    return pool
+
+
+class JobQueue:
+    """Registro dos jobs e executores onde eles rodam."""
+
+    def __init__(self, workers: int, max_jobs: int = 500, max_result_rows: int = 1_000_000,
+                 initializer=None, initargs=()):
+        self.workers = workers
+        self.process_pool = make_process_pool(workers, initializer, initargs)
+        self.serial_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feature-store")
+        self.max_jobs = max_jobs
+        self.max_result_rows = max_result_rows
+        self.result_rows = 0
+        self.jobs = OrderedDict()
+        self._tasks = set()
+
+    def create(self, transactions: int) -> Job:
+        job = Job(job_id=uuid.uuid4().hex, transactions=transactions)
+        self.jobs[job.job_id] = job
+        # Descarta os jobs mais antigos já concluídos para limitar a memória
+        while len(self.jobs) > self.max_jobs:
+            oldest = next((j for j in self.jobs.values() if j.status in (JOB_DONE, JOB_FAILED)), None)
+            if oldest is None:
+                break
+            self._drop_results(oldest)
+            del self.jobs[oldest.job_id]
+        return job
+
+    def _drop_results(self, job: Job):
+        if job.results is not None:
+            self.result_rows -= len(job.results)
+            job.results = None
+            job.results_expired = True
+
+    def _retain_results(self, job: Job):
+        """Conta as linhas do job recém-concluído e descarta resultados antigos acima de `max_result_rows`.
+
+        O job mais recente fica sempre com os seus, mesmo que sozinho passe do limite.
+        """
+        self.result_rows += len(job.results)
+        for old in list(self.jobs.values()):
+            if self.result_rows <= self.max_result_rows:
+                break
+            if old is not job and old.results is not None:
+                self._drop_results(old)
+
+    def get(self, job_id: str) -> Job:
+        return self.jobs.get(job_id)
+
+    def start(self, job: Job, work) -> asyncio.Task:
+        """Agenda `work(job)` (corrotina que devolve os resultados) e atualiza o status do job."""
+        async def runner():
+            job.status = JOB_RUNNING
+            job.started_at = datetime.utcnow()
+            try:
+                job.results = await work(job)
+                self._retain_results(job)
+                job.status = JOB_DONE
+            except Exception as e:
+                job.error = str(getattr(e, "detail", e))
+                job.status = JOB_FAILED
+                logger.error(f"Job {job.job_id} falhou: {job.error}")
+            finally:
+                job.finished_at = datetime.utcnow()
+
+        task = asyncio.create_task(runner())
+        # Mantém referência até o fim, senão o task pode ser coletado no meio da execução
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def run_in_pool(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.process_pool, func, *args)
+
+    async def run_serial(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.serial_executor, func, *args)
+
+    async def drain(self):
+        """Espera os jobs em andamento terminarem (usado no shutdown da API)."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def shutdown(self):
+        self.serial_executor.shutdown(wait=True)
+        self.process_pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,149 @@
+"""
+metrics.py
+
+Métricas da API no formato de exposição de texto do Prometheus, servidas em
+`/metrics`, sem depender de prometheus_client.
+
+Os estágios do pipeline (data_processing.record_stage), a leitura do upload, a
+predição e a gravação dos logs produzem entradas de relatório
+`{stage, seconds, rows_in, rows_out, rss_peak_mb}`; `observe_stages` as
+acumula em histogramas por estágio. Relatórios gerados nos workers de jobs
+voltam ao processo principal junto com o resultado e são observados aqui.
+"""
+
+import re
+import threading
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+ROWS_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES_BUCKETS = tuple(2**n * 1024**2 for n in range(0, 15))  # 1 MB a 16 GB
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.label_names = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = _labels(self.label_names + ("le",), key + (_number(bound),))
+                lines.append(f"{self.name}_bucket{le} {count}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(labels[name] for name in self.label_names)] = value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = SECONDS_BUCKETS, labels: tuple = ()) -> Histogram:
+        metric = Histogram(name, documentation, buckets, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()) -> Gauge:
+        metric = Gauge(name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram(
+    "fraud_stage_duration_seconds", "Tempo de parede de cada estágio.", labels=("stage",)
+)
+STAGE_ROWS_IN = REGISTRY.histogram(
+    "fraud_stage_rows_in", "Linhas de entrada de cada estágio.", ROWS_BUCKETS, labels=("stage",)
+)
+STAGE_ROWS_OUT = REGISTRY.histogram(
+    "fraud_stage_rows_out", "Linhas de saída de cada estágio.", ROWS_BUCKETS, labels=("stage",)
+)
+STAGE_RSS_PEAK = REGISTRY.histogram(
+    "fraud_stage_rss_peak_bytes", "Pico de memória residente de cada estágio acima do RSS no início dele.",
+    BYTES_BUCKETS, labels=("stage",),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "fraud_http_request_duration_seconds", "Duração das requisições HTTP.", labels=("method", "route", "status")
+)
+
+
+def _stage_label(name: str) -> str:
+    # Estágios particionados levam o número de workers no nome; a série agrupa todos
+    return re.sub(r" \(\d+x\)$", "", name)
+
+
+def observe_stages(report: list):
+    for entry in report:
+        stage = _stage_label(entry["stage"])
+        STAGE_SECONDS.observe(entry["seconds"], stage=stage)
+        STAGE_ROWS_IN.observe(entry["rows_in"], stage=stage)
+        STAGE_ROWS_OUT.observe(entry["rows_out"], stage=stage)
+        if entry["rss_peak_mb"] == entry["rss_peak_mb"]:  # NaN fora do Linux
+            STAGE_RSS_PEAK.observe(entry["rss_peak_mb"] * 1024**2, stage=stage)
+
+
+def server_timing(report: list) -> str:
+    """Relatório no formato do cabeçalho Server-Timing (durações em ms)."""
+    parts = []
+    for i, entry in enumerate(report):
+        token = re.sub(r"[^A-Za-z0-9_]+", "_", entry["stage"]).strip("_") or f"stage{i}"
+        # Cabeçalhos HTTP são latin-1
+        desc = entry["stage"].replace('"', "'").encode("latin-1", "replace").decode("latin-1")
+        parts.append(f'{token};dur={entry["seconds"] * 1000:.1f};desc="{desc}"')
+    return ", ".join(parts)
@@ -25,9 +25,41 @@ def bin_shared(X):
             include_lowest=True
         ).astype(int)
         return binned.reshape(-1, 1)
-     
 
-def lgbm(cat_cols,num_cols):
+def as_dtype(X, dtype):
+        """Converte a matriz (densa, esparsa ou DataFrame) para `dtype`."""
+        return X.astype(dtype, copy=False)
+
+def cast_step(dtype):
+        return FunctionTransformer(as_dtype, kw_args={'dtype': np.dtype(dtype).name},
+                                   feature_names_out='one-to-one')
+
+def poly_block(dtype):
+        """Polinomial grau 2 + escala; em float32 converte antes, para não materializar a expansão em float64."""
+        steps = [
+            ('poly',  PolynomialFeatures(degree=2, include_bias=False)),
+            ('scale', StandardScaler(with_mean=False))
+        ]
+        if np.dtype(dtype) != np.float64:
+            steps.insert(0, ('astype', cast_step(dtype)))
+        return Pipeline(steps)
+
+def model_steps(prepro, sampler_name, rus, clf, dtype):
+        """prepro → (cast) → RUS → classificador."""
+        steps = [('prepro', prepro)]
+        if np.dtype(dtype) != np.float64:
+            # Passthrough/binarizadores inteiros promoveriam o hstack de volta para float64
+            steps.append(('astype', cast_step(dtype)))
+        steps += [(sampler_name, rus), ('clf', clf)]
+        return ImbPipeline(steps)
+
+
+def lgbm(cat_cols, num_cols, sparse=False, dtype=np.float64):
+    """
+    sparse=True mantém a saída do ColumnTransformer em CSR (one-hot e zeros das
+    contagens não são materializados); dtype=np.float32 leva a matriz em float32
+    até o booster. O padrão (denso, float64) é o modelo em produção.
+    """
     params ={'objective': 'tweedie',
  'n_estimators': 250,
  'learning_rate': 0.0099255823164427,
@@ -50,21 +82,18 @@ def lgbm(cat_cols,num_cols):
         'verbosity':         -1}
     eff_other_cols = num_cols.copy()
     transformers = [
-            ('cat', OneHotEncoder(handle_unknown='ignore', drop='first', sparse_output=True), cat_cols)
+            ('cat', OneHotEncoder(handle_unknown='ignore', drop='first', sparse_output=True, dtype=dtype), cat_cols)
         ]
 
     if eff_other_cols:
             transformers.append((
                 'num_other',
-                Pipeline([
-                    ('poly',  PolynomialFeatures(degree=2, include_bias=False)),
-                    ('scale', StandardScaler(with_mean=False))
-                ]),
+                poly_block(dtype),
                 eff_other_cols
             ))
 
 
-    prepro = ColumnTransformer(transformers, remainder='passthrough', sparse_threshold=0.0)
+    prepro = ColumnTransformer(transformers, remainder='passthrough', sparse_threshold=1.0 if sparse else 0.0)
     p_major, p_minor = 0.80, 0.20
     sampling_ratio = p_minor / p_major  # ≃ 0.2857
 
@@ -75,14 +104,11 @@ def lgbm(cat_cols,num_cols):
         )
 
         # Montando o pipeline: pré-processamento → TL → RUS → classificador
-    model_pipe_lgbm = ImbPipeline([
-            ('prepro', prepro),
-            ('rus',     rus),
-            ('clf', LGBMClassifier(**params))
-        ])
+    model_pipe_lgbm = model_steps(prepro, 'rus', rus, LGBMClassifier(**params), dtype)
     return model_pipe_lgbm
 
-def xgboost(cat_cols, num_cols):
+def xgboost(cat_cols, num_cols, sparse=False, dtype=np.float64):
+    """Mesmas opções de `lgbm`. Em CSR, o XGBoost trata entradas ausentes como missing (não zero)."""
     params={'eval_metric': 'auc',
                 'tree_method': 'hist',
         'booster': 'gbtree',
@@ -110,16 +136,13 @@ def xgboost(cat_cols, num_cols):
     eff_other_cols = [c for c in num_cols   if c not in bin_feats]
 
     transformers = [
-            ('cat', OneHotEncoder(handle_unknown='ignore', drop='first', sparse_output=True), cat_cols)
+            ('cat', OneHotEncoder(handle_unknown='ignore', drop='first', sparse_output=True, dtype=dtype), cat_cols)
         ]
 
     if eff_other_cols:
                 transformers.append((
                     'num_other',
-                    Pipeline([
-                        ('poly',  PolynomialFeatures(degree=2, include_bias=False)),
-                        ('scale', StandardScaler(with_mean=False))
-                    ]),
+                    poly_block(dtype),
                     eff_other_cols
                 ))
 
@@ -130,7 +153,7 @@ def xgboost(cat_cols, num_cols):
                     ('bin_cf7d',   Binarizer(threshold=0.0),                       ['card_fraud_count_last_7d']),
                 ]
 
-    prepro = ColumnTransformer(transformers, remainder='passthrough', sparse_threshold=0.0)
+    prepro = ColumnTransformer(transformers, remainder='passthrough', sparse_threshold=1.0 if sparse else 0.0)
     p_major, p_minor = 0.80, 0.20
     sampling_ratio   = p_minor / p_major  # ≃ 0.2857
 
@@ -139,11 +162,7 @@ def xgboost(cat_cols, num_cols):
             random_state=42
         )
 
-    model_pipe_xgboost = ImbPipeline([
-            ('prepro',     prepro),
-            ('undersample', rus),
-            ('clf',        XGBClassifier(**params))
-        ])
+    model_pipe_xgboost = model_steps(prepro, 'undersample', rus, XGBClassifier(**params), dtype)
     return model_pipe_xgboost
 
 
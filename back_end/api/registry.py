@@ -0,0 +1,198 @@
+"""
+registry.py
+
+Registro de versões do modelo e troca a quente do modelo ativo.
+
+As versões são os arquivos de modelo (.pkl/.joblib) sob um prefixo do bucket;
+o id da versão é o nome do arquivo sem extensão. Um JSON opcional ao lado do
+modelo (`<versão>.json`, ex. {"threshold": 0.6, "name": "LGBM+XGB"}) define o
+nome exibido e o limiar de decisão da versão.
+
+Cada versão carregada vira um `LoadedModel` imutável (modelo, grafo compilado e
+limiar). A API guarda uma única referência ao modelo ativo; a troca é a
+atribuição dessa referência, feita só depois de a versão nova estar carregada e
+aquecida, então cada passada de pontuação usa de ponta a ponta um único modelo.
+Os workers de jobs não recebem o modelo: recebem um `ModelRef` (versão, arquivo
+local já baixado e limiar) e carregam a versão por conta própria.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from artifacts import ArtifactDownloader
+from inference import InferenceGraph, compile_model
+
+logger = logging.getLogger(__name__)
+
+MODEL_SUFFIXES = (".pkl", ".joblib")
+
+
+class RegistryError(Exception):
+    """Versão inexistente ou que não pôde ser carregada/aquecida."""
+
+
+@dataclass
+class ModelVersion:
+    version: str
+    key: str
+    name: str
+    threshold: float
+    size: int = None
+    created_at: datetime = None
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Uma versão pronta para pontuar."""
+    version: ModelVersion
+    model: object
+    inference: InferenceGraph = None
+    threshold: float = 0.5
+    loaded_at: datetime = field(default_factory=datetime.utcnow)
+    # Arquivo local de onde o modelo foi carregado
+    path: Path = None
+
+    @property
+    def ref(self) -> "ModelRef":
+        return ModelRef(self.version, self.path, self.threshold)
+
+    @property
+    def feature_names(self):
+        return getattr(self.model, "feature_names_in_", None)
+
+    def predict_positive(self, X: pd.DataFrame) -> np.ndarray:
+        """Probabilidade de fraude; usa o grafo compilado quando disponível (scores idênticos)."""
+        if self.inference is not None:
+            try:
+                return self.inference.predict_positive(X)
+            except Exception as e:
+                # O grafo usa APIs nativas/privadas das bibliotecas; o predict_proba é a referência
+                logger.warning(f"Inferência compilada de '{self.version.version}' falhou ({e}); usando predict_proba.")
+        return self.model.predict_proba(X)[:, 1]
+
+    def with_threshold(self, threshold: float) -> "LoadedModel":
+        return replace(self, threshold=threshold, version=replace(self.version, threshold=threshold))
+
+
+@dataclass(frozen=True)
+class ModelRef:
+    """O que outro processo precisa para carregar uma versão já baixada e validada."""
+    version: ModelVersion
+    path: Path
+    threshold: float
+
+    def same_file(self, loaded: LoadedModel) -> bool:
+        return loaded is not None and loaded.version.key == self.version.key and loaded.path == self.path
+
+
+def load_model_file(version: ModelVersion, path: Path, threshold: float, compiled: bool = True) -> LoadedModel:
+    """Carrega e compila o arquivo local de uma versão."""
+    try:
+        model = joblib.load(path)
+    except Exception as e:
+        raise RegistryError(f"Falha ao carregar o modelo '{version.version}': {e}") from e
+
+    inference = None
+    if compiled:
+        try:
+            inference = compile_model(model)
+        except Exception as e:
+            logger.warning(f"Modelo '{version.version}' não compilável ({e}); usando predict_proba do sklearn.")
+    return LoadedModel(replace(version, threshold=threshold), model, inference, threshold, path=path)
+
+
+class ModelRegistry:
+    """Versões de modelo disponíveis no bucket e carga de uma versão pelo downloader de artefatos."""
+
+    def __init__(self, client, bucket: str, prefix: str, downloader: ArtifactDownloader,
+                 default_threshold: float, compiled: bool = True):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.downloader = downloader
+        self.default_threshold = default_threshold
+        self.compiled = compiled
+        self._versions = {}
+
+    def version_for_key(self, key: str) -> ModelVersion:
+        """Versão de um objeto conhecido (ex.: o S3_KEY_MODEL do startup), mesmo fora do prefixo listado."""
+        version_id = Path(key).stem
+        if version_id not in self._versions:
+            self._versions[version_id] = self._describe(key)
+        return self._versions[version_id]
+
+    def _describe(self, key: str, size: int = None, created_at: datetime = None) -> ModelVersion:
+        version_id = Path(key).stem
+        meta = {}
+        meta_key = str(Path(key).with_suffix(".json"))
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=meta_key)["Body"].read()
+            meta = json.loads(body)
+        except Exception:
+            # Sem JSON de metadados: nome do arquivo e limiar padrão
+            pass
+        return ModelVersion(
+            version=version_id,
+            key=key,
+            name=meta.get("name", version_id),
+            threshold=float(meta.get("threshold", self.default_threshold)),
+            size=size,
+            created_at=created_at,
+        )
+
+    def refresh(self) -> list:
+        """Relista as versões do bucket; sem acesso ao S3, mantém as já conhecidas."""
+        try:
+            paginator = self.client.get_paginator("list_objects_v2")
+            found = {}
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+                for obj in page.get("Contents", []):
+                    if Path(obj["Key"]).suffix not in MODEL_SUFFIXES:
+                        continue
+                    known = self._versions.get(Path(obj["Key"]).stem)
+                    if known is not None and known.key == obj["Key"]:
+                        known.size, known.created_at = obj["Size"], obj["LastModified"]
+                        found[known.version] = known
+                    else:
+                        version = self._describe(obj["Key"], obj["Size"], obj["LastModified"])
+                        found[version.version] = version
+            # Versões fora do prefixo (ex.: o modelo do startup) continuam registradas
+            self._versions = {**self._versions, **found}
+        except Exception as e:
+            logger.warning(f"Não foi possível listar modelos em s3://{self.bucket}/{self.prefix}: {e}")
+        return self.versions()
+
+    def versions(self) -> list:
+        return sorted(self._versions.values(), key=lambda v: (v.created_at is None, v.created_at, v.version))
+
+    def get(self, version_id: str) -> ModelVersion:
+        return self._versions.get(version_id)
+
+    def load(self, version: ModelVersion, threshold: float = None) -> LoadedModel:
+        """Baixa (validando pelo manifest), carrega e compila a versão; não a ativa."""
+        try:
+            path = self.downloader.fetch(version.key)
+        except Exception as e:
+            raise RegistryError(f"Falha ao carregar o modelo '{version.version}': {e}") from e
+        threshold = version.threshold if threshold is None else threshold
+        return load_model_file(version, path, threshold, self.compiled)
+
+    @staticmethod
+    def warm(loaded: LoadedModel, X_sample: pd.DataFrame):
+        """Pontua uma amostra com a versão nova antes da troca: aquece e confere que o modelo responde."""
+        names = loaded.feature_names
+        try:
+            X = X_sample[list(names)] if names is not None else X_sample
+            scores = np.asarray(loaded.predict_positive(X))
+        except Exception as e:
+            raise RegistryError(f"Modelo '{loaded.version.version}' falhou no aquecimento: {e}") from e
+        if scores.shape != (len(X_sample),) or not np.all((scores >= 0) & (scores <= 1)):
+            raise RegistryError(f"Modelo '{loaded.version.version}' devolveu scores inválidos no aquecimento.")
+        logger.info(f"Modelo '{loaded.version.version}' aquecido com {len(X_sample)} linhas.")
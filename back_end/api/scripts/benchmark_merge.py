@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+benchmark_merge.py
+
+Compara o throughput dos joins de run_merge (transactions → sellers → payers)
+entre o caminho antigo (`DataFrame.merge`) e os índices de dimensão
+(`DimensionIndex`) montados na carga dos artefatos.
+
+Uso:
+  python scripts/benchmark_merge.py --rows 1000000 --cards 200000 --terminals 20000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data_processing import DimensionIndex, merge_test, merge_train  # noqa: E402
+
+
+def synthetic_tables(n_rows: int, n_cards: int, n_terminals: int, unknown_rate: float, seed: int = 0):
+    """Payers, sellers e transações sintéticos com o mesmo schema dos artefatos."""
+    rng = np.random.default_rng(seed)
+    cards = np.array([f"card_{i:08d}" for i in range(n_cards)], dtype=object)
+    terminals = np.array([f"term_{i:06d}" for i in range(n_terminals)], dtype=object)
+    df_payers = pd.DataFrame({
+        'card_id': cards,
+        'card_bin': rng.integers(400000, 400500, n_cards).astype(str).astype(object),
+        'card_first_transaction': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365, n_cards), unit='D'),
+    })
+    df_sellers = pd.DataFrame({
+        'terminal_id': terminals,
+        'latitude': rng.uniform(-30, 0, n_terminals),
+        'longitude': rng.uniform(-60, -35, n_terminals),
+        'terminal_operation_start': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 365, n_terminals), unit='D'),
+    })
+    card_ids = cards[rng.integers(0, n_cards, n_rows)]
+    terminal_ids = terminals[rng.integers(0, n_terminals, n_rows)]
+    # Parte das chaves fora das dimensões, para exercitar o caminho de NaN/NaT
+    card_ids[rng.random(n_rows) < unknown_rate] = 'card_desconhecido'
+    terminal_ids[rng.random(n_rows) < unknown_rate] = 'term_desconhecido'
+    df_tx = pd.DataFrame({
+        'transaction_id': np.arange(n_rows).astype(str).astype(object),
+        'tx_datetime': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 180 * 86400, n_rows), unit='s'),
+        'card_id': card_ids,
+        'terminal_id': terminal_ids,
+        'tx_amount': rng.exponential(100, n_rows).round(2),
+    })
+    return df_payers, df_sellers, df_tx
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos joins de run_merge")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Transações por join")
+    parser.add_argument("--cards", type=int, default=200_000, help="Linhas em payers")
+    parser.add_argument("--terminals", type=int, default=20_000, help="Linhas em sellers")
+    parser.add_argument("--unknown-rate", type=float, default=0.01, help="Fração de chaves ausentes nas dimensões")
+    parser.add_argument("--categorical", action="store_true",
+                        help="card_id/terminal_id das transações como category (join só pelos códigos)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições (vale a melhor)")
+    args = parser.parse_args()
+
+    df_payers, df_sellers, df_tx = synthetic_tables(args.rows, args.cards, args.terminals, args.unknown_rate)
+    if args.categorical:
+        df_tx = df_tx.astype({'card_id': 'category', 'terminal_id': 'category'})
+
+    started = time.perf_counter()
+    payers_index = DimensionIndex(df_payers, 'card_id')
+    sellers_index = DimensionIndex(df_sellers, 'terminal_id')
+    build_seconds = time.perf_counter() - started
+    print(f"[INFO] Índices montados em {build_seconds:.3f}s ({len(df_payers)} payers, {len(df_sellers)} sellers)")
+
+    for name, merge in [("merge_train", merge_train), ("merge_test", merge_test)]:
+        expected = merge(df_tx, df_payers, df_sellers)
+        result = merge(df_tx, payers_index, sellers_index)
+        if args.categorical:
+            # O merge converte chaves categóricas em object; o índice preserva o dtype da transação
+            result = result.astype({'card_id': object, 'terminal_id': object})
+        pd.testing.assert_frame_equal(result, expected)
+
+        merge_seconds = best_of(lambda: merge(df_tx, df_payers, df_sellers), args.repeat)
+        index_seconds = best_of(lambda: merge(df_tx, payers_index, sellers_index), args.repeat)
+        print(
+            f"[INFO] {name}: merge {merge_seconds:.3f}s ({args.rows / merge_seconds:,.0f} linhas/s) | "
+            f"índice {index_seconds:.3f}s ({args.rows / index_seconds:,.0f} linhas/s) | "
+            f"speedup {merge_seconds / index_seconds:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+benchmark_model_matrix.py
+
+Compara as representações da matriz de treino/inferência do ensemble
+(model/model.py): densa float64 (produção), CSR float64, densa float32 e
+CSR float32. Para cada uma mede:
+  - bytes por linha da matriz transformada de cada membro;
+  - tempo e pico de memória (numpy) do fit;
+  - throughput de inferência (predict_proba do sklearn e grafo compilado);
+  - AUC num holdout, para ver se a representação mudou o modelo.
+
+Uso:
+  python scripts/benchmark_model_matrix.py \
+    --sample PATH_features.parquet \
+    [--cat-cols regiao tx_dayofweek] \
+    [--holdout 0.3]
+"""
+
+import argparse
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.metrics import roc_auc_score
+
+API_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(API_DIR))
+sys.path.insert(0, str(API_DIR / "model"))
+from inference import compile_model  # noqa: E402
+from model import lgbm, voting_class, xgboost  # noqa: E402
+
+VARIANTS = [
+    ("denso float64", False, np.float64),
+    ("CSR float64", True, np.float64),
+    ("denso float32", False, np.float32),
+    ("CSR float32", True, np.float32),
+]
+
+
+def matrix_bytes(X) -> int:
+    if sparse.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+def member_matrices(model, X: pd.DataFrame) -> list:
+    """Matriz que chega a cada booster (pipeline do membro sem o classificador e sem samplers)."""
+    matrices = []
+    for estimator in model.steps[-1][1].estimators_:
+        Xt = X
+        for _, step in estimator.steps[:-1]:
+            if not hasattr(step, "fit_resample"):
+                Xt = step.transform(Xt)
+        matrices.append(Xt)
+    return matrices
+
+
+def throughput(predict, X: pd.DataFrame, repeats: int = 3) -> float:
+    predict(X)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        predict(X)
+    return len(X) * repeats / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de matriz densa/CSR e float64/float32 no ensemble")
+    parser.add_argument("--sample", required=True, type=Path, help="Parquet de features (saída do preprocess.py)")
+    parser.add_argument("--target", default="is_fraud", help="Coluna alvo")
+    parser.add_argument("--cat-cols", nargs="+", default=["regiao"], help="Colunas one-hot")
+    parser.add_argument("--drop-cols", nargs="+", default=["transaction_id", "tx_datetime"],
+                        help="Colunas fora do modelo")
+    parser.add_argument("--holdout", type=float, default=0.3, help="Fração final (por tempo) usada na avaliação")
+    args = parser.parse_args()
+
+    logging.getLogger("inference").setLevel(logging.ERROR)
+    df = pd.read_parquet(args.sample)
+    if "tx_datetime" in df.columns:
+        df = df.sort_values("tx_datetime", kind="stable")
+    y = df.pop(args.target).astype(int)
+    X = df.drop(columns=[c for c in args.drop_cols if c in df.columns])
+    numeric_cols = X.select_dtypes(include="number").columns
+    X[numeric_cols] = X[numeric_cols].fillna(0)
+    cat_cols = [c for c in args.cat_cols if c in X.columns]
+    num_cols = [c for c in X.columns if c not in cat_cols]
+
+    split = int(len(X) * (1 - args.holdout))
+    X_train, y_train, X_test, y_test = X.iloc[:split], y.iloc[:split], X.iloc[split:], y.iloc[split:]
+    print(f"[INFO] treino {len(X_train)} linhas, holdout {len(X_test)}; "
+          f"{len(cat_cols)} categóricas, {len(num_cols)} numéricas")
+
+    for name, use_sparse, dtype in VARIANTS:
+        model = voting_class(
+            lgbm(cat_cols, num_cols, sparse=use_sparse, dtype=dtype),
+            xgboost(cat_cols, num_cols, sparse=use_sparse, dtype=dtype),
+        )
+        tracemalloc.start()
+        started = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - started
+        fit_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        per_row = [matrix_bytes(Xt) / len(X_test) for Xt in member_matrices(model, X_test)]
+        scores = model.predict_proba(X_test)[:, 1]
+        sklearn_rows = throughput(lambda df: model.predict_proba(df)[:, 1], X_test)
+        graph = compile_model(model)
+        compiled_rows = throughput(graph.predict_positive, X_test)
+
+        print(f"[INFO] {name:14s} bytes/linha lgbm {per_row[0]:7.0f} xgb {per_row[1]:7.0f} | "
+              f"fit {fit_seconds:6.2f}s pico {fit_peak / 1e6:8.1f} MB | "
+              f"predict {sklearn_rows:9.0f} linhas/s, compilado {compiled_rows:9.0f} linhas/s | "
+              f"AUC {roc_auc_score(y_test, scores):.4f}")
+
+
+if __name__ == "__main__":
+    main()
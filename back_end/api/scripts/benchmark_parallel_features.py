@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+benchmark_parallel_features.py
+
+Compara build_features serial com a execução paralela por partição
+(card_id / terminal_id / card_bin) em 2, 4, ... processos, conferindo que o
+resultado é idêntico ao serial.
+
+Uso:
+  python scripts/benchmark_parallel_features.py --rows 6000000 --workers 2 4 8
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data_processing import build_features, merge_train  # noqa: E402
+from benchmark_merge import synthetic_tables  # noqa: E402
+
+
+def synthetic_frame(n_rows: int, n_cards: int, n_terminals: int, fraud_rate: float, seed: int = 0) -> pd.DataFrame:
+    """Frame mesclado sintético, com fraudes reportadas alguns dias depois da transação."""
+    rng = np.random.default_rng(seed)
+    df_payers, df_sellers, df_tx = synthetic_tables(n_rows, n_cards, n_terminals, unknown_rate=0.01, seed=seed)
+    is_fraud = rng.random(n_rows) < fraud_rate
+    df_tx['is_fraud'] = is_fraud.astype(int)
+    df_tx['is_transactional_fraud'] = 0
+    report_delay = pd.to_timedelta(rng.integers(0, 10 * 86400, n_rows), unit='s')
+    df_tx['tx_fraud_report_date'] = (df_tx['tx_datetime'] + report_delay).where(is_fraud)
+    return merge_train(df_tx, df_payers, df_sellers)
+
+
+def timed_build(df: pd.DataFrame, workers: int):
+    started = time.perf_counter()
+    result = build_features(df.copy(), workers=workers)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da execução paralela dos estágios")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Linhas do frame sintético")
+    parser.add_argument("--cards", type=int, default=200_000, help="Cartões distintos")
+    parser.add_argument("--terminals", type=int, default=20_000, help="Terminais distintos")
+    parser.add_argument("--fraud-rate", type=float, default=0.01, help="Fração de transações fraudulentas")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4], help="Números de processos a medir")
+    args = parser.parse_args()
+
+    logging.getLogger("data_processing").setLevel(logging.WARNING)
+    df = synthetic_frame(args.rows, args.cards, args.terminals, args.fraud_rate)
+
+    expected, serial_seconds = timed_build(df, 1)
+    print(f"[INFO] {args.rows} linhas: serial {serial_seconds:.3f}s")
+    for workers in args.workers:
+        result, seconds = timed_build(df, workers)
+        pd.testing.assert_frame_equal(result, expected)
+        print(
+            f"[INFO] {workers} processos: {seconds:.3f}s | speedup {serial_seconds / seconds:.2f}x | "
+            f"eficiência {serial_seconds / seconds / workers:.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+benchmark_suite.py
+
+Suíte de benchmark reprodutível sobre dados sintéticos (scripts/synthetic_data.py)
+em tamanhos fixos de histórico (por padrão 10k, 1M e 6M transações). Para cada
+tamanho mede:
+  - cada estágio de data_processing (relatório de process_pipeline) e o
+    process_pipeline completo (histórico + lote de upload), também restrito
+    às entidades do lote (EntityIndex);
+  - construção do feature store e transform/update do lote (modo incremental);
+  - construção e gravação do snapshot do histórico e transform do lote (modo snapshot);
+  - ponta a ponta na API: startup (download do "S3" local, tabelas, store,
+    modelo) e /predict_batch_file do lote até o job terminar, com o
+    detalhamento por estágio do X-Profile.
+
+A saída é um JSON com o commit, o ambiente e os tempos de cada tamanho; com
+--compare, os tempos são comparados com um JSON anterior e o script sai com
+código 1 se algum regrediu além da tolerância.
+
+O "S3" do teste ponta a ponta é um diretório local servido por um cliente com
+a interface de boto3 que o ArtifactDownloader usa. O modelo é o ensemble de
+model/model.py treinado em uma amostra das features sintéticas (ou --model).
+
+Uso:
+  python scripts/benchmark_suite.py --sizes 10k 1m 6m --output bench.json
+  python scripts/benchmark_suite.py --sizes 10k 1m --output novo.json --compare bench.json
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+
+API_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(API_DIR))
+sys.path.insert(0, str(API_DIR / "model"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from data_processing import EntityIndex, merge_test, merge_train, peak_rss_mb, process_pipeline, read_payers  # noqa: E402
+from feature_store import FeatureStore  # noqa: E402
+from snapshot import HistorySnapshot  # noqa: E402
+from synthetic_data import generate_artifacts, parse_size  # noqa: E402
+
+S3_BUCKET = "benchmark"
+S3_KEYS = {
+    "payers": "artifacts/Payers.feather",
+    "sellers": "artifacts/Sellers.feather",
+    "transactions": "artifacts/Transactions.feather",
+    "model": "models/benchmark.pkl",
+}
+TRAIN_ROWS = 50_000
+# Tempos abaixo disso são ruído demais para acusar regressão
+MIN_COMPARABLE_SECONDS = 0.05
+
+
+# ==============================================================================
+#  "S3" LOCAL
+# ==============================================================================
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+    def iter_chunks(self, chunk_size: int):
+        for start in range(0, len(self._data), chunk_size):
+            yield self._data[start:start + chunk_size]
+
+
+class _Paginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket: str, Prefix: str = ""):
+        contents = []
+        for path in sorted(self.client.root.rglob("*")):
+            key = path.relative_to(self.client.root).as_posix()
+            if path.is_file() and key.startswith(Prefix):
+                stat = path.stat()
+                contents.append({
+                    "Key": key, "Size": stat.st_size,
+                    "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+                })
+        yield {"Contents": contents}
+
+
+class LocalS3Client:
+    """Diretório servido com o subconjunto da API do boto3 usado pelos artefatos e pelo registro."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._etags = {}
+
+    def _path(self, key: str) -> Path:
+        path = self.root / key
+        if not path.is_file():
+            raise FileNotFoundError(f"s3://{S3_BUCKET}/{key} não existe")
+        return path
+
+    def _etag(self, path: Path) -> str:
+        stat = path.stat()
+        cache_key = (path, stat.st_size, stat.st_mtime_ns)
+        if cache_key not in self._etags:
+            md5 = hashlib.md5()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024**2), b""):
+                    md5.update(chunk)
+            self._etags[cache_key] = f'"{md5.hexdigest()}"'
+        return self._etags[cache_key]
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        path = self._path(Key)
+        return {"ETag": self._etag(path), "ContentLength": path.stat().st_size}
+
+    def get_object(self, Bucket: str, Key: str, Range: str = None, IfMatch: str = None) -> dict:
+        path = self._path(Key)
+        if IfMatch is not None and IfMatch != self._etag(path):
+            raise RuntimeError(f"PreconditionFailed: {Key}")
+        with open(path, "rb") as f:
+            if Range is None:
+                return {"Body": _Body(f.read())}
+            start, end = (int(v) for v in Range.removeprefix("bytes=").split("-"))
+            f.seek(start)
+            return {"Body": _Body(f.read(end - start + 1))}
+
+    def get_paginator(self, operation: str) -> _Paginator:
+        return _Paginator(self)
+
+
+# ==============================================================================
+#  MEDIÇÕES
+# ==============================================================================
+def stage_seconds(report: list) -> dict:
+    """Segundos por estágio; estágios repetidos (ex.: fases particionadas) são somados."""
+    seconds = {}
+    for entry in report:
+        seconds[entry["stage"]] = seconds.get(entry["stage"], 0.0) + entry["seconds"]
+    return seconds
+
+
+def best_run(func, repeat: int):
+    """(resultado, segundos, relatório) da execução mais rápida de `func(report)`."""
+    best = None
+    for _ in range(repeat):
+        report = []
+        started = time.perf_counter()
+        result = func(report)
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best[1]:
+            best = (result, elapsed, report)
+    return best
+
+
+def bench_pipeline(paths: dict, repeat: int, workers: int) -> tuple:
+    df_features, seconds, report = best_run(
+        lambda report: process_pipeline(
+            paths["payers"], paths["sellers"], paths["transactions"], paths["upload"],
+            report=report, workers=workers,
+        ),
+        repeat,
+    )
+    timings = {f"stage/{name}": s for name, s in stage_seconds(report).items()}
+    timings["process_pipeline"] = seconds
+
+    df_tx = pd.read_feather(paths["transactions"])
+    started = time.perf_counter()
+    index = EntityIndex(df_tx, read_payers(paths["payers"]))
+    timings["entity_index/build"] = time.perf_counter() - started
+    _, timings["process_pipeline/scoped"], _ = best_run(
+        lambda report: process_pipeline(
+            paths["payers"], paths["sellers"], df_tx, paths["upload"],
+            report=report, workers=workers, entity_index=index,
+        ),
+        repeat,
+    )
+    # Pico da vida do processo; o pico de cada estágio fica em report[i]["rss_peak_mb"]
+    peak_rss = peak_rss_mb()
+    return df_features, timings, peak_rss
+
+
+def bench_incremental(paths: dict, repeat: int, work_dir: Path) -> dict:
+    """Feature store e snapshot do histórico: construção e features do lote de upload."""
+    df_payers = read_payers(paths["payers"])
+    df_sellers = pd.read_feather(paths["sellers"])
+    df_history = merge_train(pd.read_feather(paths["transactions"]), df_payers, df_sellers)
+    df_upload = merge_test(pd.read_feather(paths["upload"]), df_payers, df_sellers)
+
+    timings = {}
+    store, timings["feature_store/build"], _ = best_run(lambda _: FeatureStore.build(df_history), repeat)
+    features, timings["feature_store/transform"], _ = best_run(lambda _: store.transform(df_upload), repeat)
+    # update muda o store: uma única medição
+    started = time.perf_counter()
+    store.update(df_upload, features)
+    timings["feature_store/update"] = time.perf_counter() - started
+    del store
+
+    started = time.perf_counter()
+    snapshot = HistorySnapshot.build(work_dir, "benchmark", df_history)
+    timings["snapshot/build"] = time.perf_counter() - started
+    _, timings["snapshot/transform"], _ = best_run(lambda report: snapshot.transform(df_upload, report=report), repeat)
+    return timings
+
+
+def train_model(df_features: pd.DataFrame, path: Path, seed: int = 0) -> Path:
+    """Treina o ensemble de produção numa amostra das features sintéticas e salva com joblib."""
+    from model import lgbm, voting_class, xgboost
+
+    df = df_features.sample(min(TRAIN_ROWS, len(df_features)), random_state=seed)
+    y = df.pop("is_fraud").astype(int)
+    X = df.drop(columns=[c for c in ("transaction_id", "tx_datetime") if c in df.columns])
+    numeric_cols = X.select_dtypes(include="number").columns
+    X[numeric_cols] = X[numeric_cols].fillna(0)
+    cat_cols = [c for c in ("regiao",) if c in X.columns]
+    num_cols = [c for c in X.columns if c not in cat_cols]
+    model = voting_class(lgbm(cat_cols, num_cols), xgboost(cat_cols, num_cols))
+    model.fit(X, y)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, path)
+    return path
+
+
+def configure_api_env(work_dir: Path, feature_mode: str, job_workers: int):
+    """Variáveis lidas na importação de app.py; precisam existir antes do import."""
+    os.environ.update({
+        "S3_BUCKET": S3_BUCKET,
+        "S3_KEY_MODEL": S3_KEYS["model"],
+        "S3_KEY_PAYERS": S3_KEYS["payers"],
+        "S3_KEY_SELLERS": S3_KEYS["sellers"],
+        "S3_KEY_TRANSACTIONAL": S3_KEYS["transactions"],
+        "DATABASE_URL": f"sqlite:///{work_dir / 'benchmark.db'}",
+        "TMP_DIR": str(work_dir / "api"),
+        "FEATURE_MODE": feature_mode,
+        "JOB_WORKERS": str(job_workers),
+    })
+
+
+def bench_api(paths: dict, model_path: Path, work_dir: Path, verbose: bool) -> tuple:
+    """Startup a frio e um /predict_batch_file do lote de upload, até o job terminar."""
+    import app as api
+    from artifacts import ArtifactDownloader
+    from fastapi.testclient import TestClient
+
+    # Bucket local do tamanho atual; TMP_DIR vazio para o startup baixar e construir tudo
+    bucket = work_dir / "s3"
+    shutil.rmtree(bucket, ignore_errors=True)
+    for name, key in S3_KEYS.items():
+        (bucket / key).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(model_path if name == "model" else paths[name], bucket / key)
+    shutil.rmtree(api.TMP_DIR, ignore_errors=True)
+    api.TMP_DIR.mkdir(parents=True, exist_ok=True)
+    api.make_downloader = lambda: ArtifactDownloader(
+        LocalS3Client(bucket), api.S3_BUCKET, api.TMP_DIR,
+        part_size=api.ARTIFACT_PART_MB * 1024**2, workers=api.ARTIFACT_WORKERS,
+    )
+
+    upload = paths["upload"].read_bytes()
+    n_rows = len(pd.read_feather(paths["upload"]))
+    timings = {}
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        started = time.perf_counter()
+        with TestClient(api.app) as client:
+            timings["api/startup"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = client.post(
+                "/predict_batch_file", files={"file": ("upload.feather", upload)}, headers={api.PROFILE_HEADER: "1"},
+            )
+            response.raise_for_status()
+            job_id = response.json()["jobId"]
+            while True:
+                status = client.get(f"/jobs/{job_id}").json()
+                if status["status"] in ("done", "failed"):
+                    break
+                time.sleep(0.01)
+            timings["api/predict_batch_file"] = time.perf_counter() - started
+    if status["status"] != "done":
+        raise RuntimeError(f"Job do benchmark falhou: {status['error']}")
+    for name, seconds in stage_seconds(status["stages"] or []).items():
+        timings[f"api/job/{name}"] = seconds
+    return timings, n_rows / timings["api/predict_batch_file"]
+
+
+# ==============================================================================
+#  SAÍDA E COMPARAÇÃO
+# ==============================================================================
+def environment() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=API_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    import pyarrow
+    return {
+        "git_commit": git("rev-parse", "HEAD"),
+        "git_dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pyarrow.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Imprime a razão atual/base de cada tempo em comum; devolve os que regrediram além da tolerância."""
+    regressions = []
+    for size, result in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if base is None:
+            continue
+        for name, seconds in result["timings"].items():
+            base_seconds = base["timings"].get(name)
+            if base_seconds is None or base_seconds < MIN_COMPARABLE_SECONDS:
+                continue
+            ratio = seconds / base_seconds
+            flag = "REGRESSÃO" if ratio > 1 + tolerance else ""
+            print(f"{size:>5s} {name:60s} {base_seconds:9.3f}s -> {seconds:9.3f}s  x{ratio:5.2f} {flag}")
+            if flag:
+                regressions.append((size, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reprodutível de pipeline, feature store e API")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1m", "6m"], help="Tamanhos do histórico")
+    parser.add_argument("--upload-rows", type=int, default=1000, help="Transações do lote de upload")
+    parser.add_argument("--seed", type=int, default=0, help="Semente dos dados sintéticos")
+    parser.add_argument("--repeat", type=int, default=1, help="Repetições por medição (vale a melhor)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do process_pipeline")
+    parser.add_argument("--data-dir", type=Path, default=Path(tempfile.gettempdir()) / "fraud_bench",
+                        help="Onde gerar (e reaproveitar) os artefatos sintéticos")
+    parser.add_argument("--model", type=Path, help="Modelo .pkl a usar na API (padrão: treinado nos dados sintéticos)")
+    parser.add_argument("--feature-mode", choices=["incremental", "full", "snapshot"], default="incremental",
+                        help="FEATURE_MODE da API no teste ponta a ponta")
+    parser.add_argument("--job-workers", type=int, default=1, help="JOB_WORKERS da API")
+    parser.add_argument("--skip-api", action="store_true", help="Não roda o teste ponta a ponta")
+    parser.add_argument("--output", type=Path, help="JSON de resultados")
+    parser.add_argument("--compare", type=Path, help="JSON anterior para comparação")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Regressão aceita na comparação (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Mostra os logs do pipeline e da API")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="[%(asctime)s] %(levelname)s: %(message)s", level=logging.INFO)
+    if not args.verbose:
+        for name in ("data_processing", "feature_store", "artifacts", "registry", "inference", "jobs"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    if not args.skip_api:
+        configure_api_env(args.data_dir / "api", args.feature_mode, args.job_workers)
+
+    sizes = [(label.lower(), parse_size(label)) for label in args.sizes]
+    model_path = args.model
+    results = {}
+    for label, n_rows in sizes:
+        print(f"[INFO] === {label}: {n_rows} transações de histórico ===")
+        paths = generate_artifacts(n_rows, args.data_dir / label, args.upload_rows, seed=args.seed)
+
+        df_features, timings, peak_rss = bench_pipeline(paths, args.repeat, args.workers)
+        timings.update(bench_incremental(paths, args.repeat, args.data_dir / "snapshot"))
+        result = {"rows": n_rows, "upload_rows": args.upload_rows, "pipeline_peak_rss_mb": peak_rss}
+
+        if not args.skip_api:
+            if model_path is None:
+                print("[INFO] Treinando o modelo do benchmark nas features sintéticas...")
+                model_path = train_model(df_features, args.data_dir / "model" / "benchmark.pkl", args.seed)
+            del df_features
+            api_timings, rows_per_second = bench_api(paths, model_path, args.data_dir / "api", args.verbose)
+            timings.update(api_timings)
+            result["api_rows_per_second"] = rows_per_second
+        result["timings"] = timings
+        results[label] = result
+
+        for name, seconds in timings.items():
+            print(f"[INFO] {label:>5s} {name:60s} {seconds:9.3f}s")
+
+    output = {
+        "environment": environment(),
+        "params": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(output, indent=2, default=str))
+        print(f"[INFO] Resultados salvos em {args.output}")
+
+    if args.compare:
+        regressions = compare(output, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            print(f"[ERRO] {len(regressions)} tempo(s) regrediram mais de {args.tolerance:.0%}.")
+            sys.exit(1)
+        print("[INFO] Nenhuma regressão acima da tolerância.")
+
+
+if __name__ == "__main__":
+    main()
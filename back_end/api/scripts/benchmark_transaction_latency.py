@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+benchmark_transaction_latency.py
+
+Mede a latência de /predict/transaction/{id} numa API já em execução, com
+várias requisições simultâneas. Cartões e terminais são sorteados de um feather
+de transações (o histórico), para que as features venham do estado já
+conhecido de cada entidade.
+
+Uso:
+  python scripts/benchmark_transaction_latency.py \
+    --url http://localhost:8000 \
+    --transactions PATH_Transactions.feather \
+    --requests 2000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from pathlib import Path
+import httpx
+import numpy as np
+import pandas as pd
+
+
+def sample_payloads(transactions_path: Path, n: int, seed: int = 0) -> list:
+    df = pd.read_feather(transactions_path, columns=['card_id', 'terminal_id', 'tx_amount', 'tx_datetime'])
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), n)]
+    # Instantes depois do histórico, como numa transação nova
+    start = pd.to_datetime(df['tx_datetime']).max() + pd.Timedelta(minutes=1)
+    offsets = pd.to_timedelta(np.sort(rng.integers(0, 3600, n)), unit='s')
+    return [
+        {
+            'card_id': str(card_id),
+            'terminal_id': str(terminal_id),
+            'tx_amount': float(amount),
+            'tx_datetime': (start + offset).isoformat(),
+        }
+        for card_id, terminal_id, amount, offset in zip(rows['card_id'], rows['terminal_id'], rows['tx_amount'], offsets)
+    ]
+
+
+async def run_load(url: str, payloads: list, concurrency: int) -> np.ndarray:
+    latencies = []
+    queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty():
+            payload = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.post(f"/predict/transaction/bench-{uuid.uuid4().hex}", json=payload)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência do endpoint de predição unitária")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base da API")
+    parser.add_argument("--transactions", required=True, type=Path, help="Feather de onde sortear cartões/terminais")
+    parser.add_argument("--requests", type=int, default=1000, help="Total de requisições")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requisições simultâneas")
+    parser.add_argument("--warmup", type=int, default=20, help="Requisições descartadas antes da medição")
+    args = parser.parse_args()
+
+    payloads = sample_payloads(args.transactions, args.warmup + args.requests)
+    asyncio.run(run_load(args.url, payloads[:args.warmup], 1))
+
+    started = time.perf_counter()
+    latencies = asyncio.run(run_load(args.url, payloads[args.warmup:], args.concurrency)) * 1000
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(
+        f"[INFO] {len(latencies)} requisições, concorrência {args.concurrency}: "
+        f"p50 {p50:.1f} ms | p95 {p95:.1f} ms | p99 {p99:.1f} ms | máx {latencies.max():.1f} ms | "
+        f"{len(latencies) / elapsed:,.0f} req/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
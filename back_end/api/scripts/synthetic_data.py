@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+synthetic_data.py
+
+Gera artefatos sintéticos com o schema que run_merge e a API esperam, para
+benchmarks e testes locais sem os dados reais:
+
+  Payers.feather        card_hash, card_bin, card_first_transaction
+  Sellers.feather       terminal_id, latitude, longitude, terminal_operation_start
+  Transactions.feather  histórico: transaction_id, tx_datetime, card_id, terminal_id,
+                        tx_amount, is_fraud, is_transactional_fraud, tx_fraud_report_date
+  Upload.feather        lote novo (posterior ao histórico), no formato do /predict_batch_file
+
+A geração é determinística pela semente. Cada cartão transaciona sobretudo em
+terminais próximos de um terminal "de casa", o que dá reuso de terminal e
+velocidades entre transações plausíveis; fraudes são reportadas alguns dias
+depois da transação.
+
+Uso:
+  python scripts/synthetic_data.py --rows 1m --out /tmp/fraud_bench/1m [--upload-rows 1000]
+"""
+
+import argparse
+import json
+import logging
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+HISTORY_START = pd.Timestamp("2024-01-01")
+HISTORY_DAYS = 180
+ARTIFACT_NAMES = {
+    "payers": "Payers.feather",
+    "sellers": "Sellers.feather",
+    "transactions": "Transactions.feather",
+    "upload": "Upload.feather",
+}
+
+
+def parse_size(text: str) -> int:
+    """'10k', '1m', '6m' ou um inteiro."""
+    text = str(text).strip().lower().replace("_", "")
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def _ids(prefix: str, n: int, width: int) -> np.ndarray:
+    return (prefix + pd.Series(np.arange(n)).astype(str).str.zfill(width)).to_numpy(dtype=object)
+
+
+def generate_artifacts(n_rows: int, out_dir: Path, upload_rows: int = 1000, fraud_rate: float = 0.01,
+                       seed: int = 0) -> dict:
+    """Grava os quatro feathers em `out_dir` e devolve {nome: caminho}; reaproveita os de mesmos parâmetros."""
+    out_dir = Path(out_dir)
+    paths = {name: out_dir / filename for name, filename in ARTIFACT_NAMES.items()}
+    params = {"rows": n_rows, "upload_rows": upload_rows, "fraud_rate": fraud_rate, "seed": seed}
+    params_path = out_dir / "params.json"
+    if params_path.exists() and json.loads(params_path.read_text()) == params and all(p.exists() for p in paths.values()):
+        logger.info(f"Reaproveitando artefatos sintéticos em {out_dir}.")
+        return paths
+
+    rng = np.random.default_rng(seed)
+    n_cards = max(100, n_rows // 25)
+    n_terminals = max(20, n_rows // 250)
+    n_bins = max(10, n_cards // 100)
+    total = n_rows + upload_rows
+
+    cards = _ids("card_", n_cards, 8)
+    terminals = _ids("term_", n_terminals, 6)
+    df_payers = pd.DataFrame({
+        "card_hash": cards,
+        "card_bin": (400000 + rng.integers(0, n_bins, n_cards)).astype(str).astype(object),
+        "card_first_transaction": HISTORY_START - pd.to_timedelta(rng.integers(0, 3 * 365, n_cards), unit="D"),
+    })
+    df_sellers = pd.DataFrame({
+        "terminal_id": terminals,
+        "latitude": rng.uniform(-33, 5, n_terminals),
+        "longitude": rng.uniform(-73, -35, n_terminals),
+        "terminal_operation_start": HISTORY_START - pd.to_timedelta(rng.integers(0, 5 * 365, n_terminals), unit="D"),
+    })
+
+    # Instantes ordenados: o lote de upload fica com as últimas `upload_rows` transações
+    seconds = np.sort(rng.integers(0, HISTORY_DAYS * 86400, total))
+    tx_datetime = HISTORY_START + pd.to_timedelta(seconds, unit="s")
+    card_idx = rng.integers(0, n_cards, total)
+    # 80% das transações num terminal vizinho ao "de casa" do cartão, o resto em qualquer um
+    home = (card_idx * 7919) % n_terminals
+    nearby = (home + rng.integers(-3, 4, total)) % n_terminals
+    terminal_idx = np.where(rng.random(total) < 0.8, nearby, rng.integers(0, n_terminals, total))
+
+    is_fraud = rng.random(total) < fraud_rate
+    amount = rng.exponential(100, total) * np.where(is_fraud, 3, 1)
+    report_delay = pd.to_timedelta(rng.integers(3600, 10 * 86400, total), unit="s")
+    df_tx = pd.DataFrame({
+        "transaction_id": _ids("tx_", total, 9),
+        "tx_datetime": tx_datetime,
+        "card_id": cards[card_idx],
+        "terminal_id": terminals[terminal_idx],
+        "tx_amount": amount.round(2),
+        "is_fraud": is_fraud.astype(np.int64),
+        "is_transactional_fraud": (is_fraud & (rng.random(total) < 0.3)).astype(np.int64),
+        "tx_fraud_report_date": pd.Series(tx_datetime + report_delay).where(is_fraud),
+    })
+
+    df_history = df_tx.iloc[:n_rows].reset_index(drop=True)
+    # No upload ainda não se sabe quais são fraude
+    df_upload = df_tx.iloc[n_rows:].reset_index(drop=True)
+    df_upload[["is_fraud", "is_transactional_fraud"]] = 0
+    df_upload["tx_fraud_report_date"] = pd.NaT
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    df_payers.to_feather(paths["payers"])
+    df_sellers.to_feather(paths["sellers"])
+    df_history.to_feather(paths["transactions"])
+    df_upload.to_feather(paths["upload"])
+    params_path.write_text(json.dumps(params))
+    logger.info(
+        f"Artefatos sintéticos em {out_dir}: {n_cards} cartões, {n_terminals} terminais, "
+        f"{n_rows} transações de histórico e {upload_rows} de upload."
+    )
+    return paths
+
+
+def main():
+    logging.basicConfig(format="[%(asctime)s] %(levelname)s: %(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Gera payers/sellers/transactions sintéticos")
+    parser.add_argument("--rows", default="10k", help="Transações de histórico (ex.: 10k, 1m, 6m)")
+    parser.add_argument("--upload-rows", type=int, default=1000, help="Transações do lote de upload")
+    parser.add_argument("--fraud-rate", type=float, default=0.01, help="Fração de transações fraudulentas")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador")
+    parser.add_argument("--out", required=True, type=Path, help="Diretório de saída")
+    args = parser.parse_args()
+    generate_artifacts(parse_size(args.rows), args.out, args.upload_rows, args.fraud_rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Fixtures compartilhadas: artefatos sintéticos e as features de referência do process_pipeline."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Os módulos da API são importados pelo nome, como no app.py e nos scripts
+API_DIR = Path(__file__).resolve().parents[1]
+for path in (API_DIR, API_DIR / "scripts"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from data_processing import merge_test, merge_train, process_pipeline, read_payers  # noqa: E402
+from synthetic_data import generate_artifacts  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def artifacts(tmp_path_factory):
+    return generate_artifacts(8000, tmp_path_factory.mktemp("synthetic"), upload_rows=400, fraud_rate=0.05, seed=1)
+
+
+@pytest.fixture(scope="session")
+def expected(artifacts):
+    """Features do upload calculadas pelo pipeline completo (histórico + upload)."""
+    df = process_pipeline(artifacts["payers"], artifacts["sellers"], artifacts["transactions"], artifacts["upload"])
+    upload_ids = pd.read_feather(artifacts["upload"])["transaction_id"]
+    return df[df["transaction_id"].isin(upload_ids)].set_index("transaction_id")
+
+
+@pytest.fixture(scope="session")
+def merged(artifacts):
+    payers = read_payers(artifacts["payers"])
+    sellers = pd.read_feather(artifacts["sellers"])
+    history = merge_train(pd.read_feather(artifacts["transactions"]), payers, sellers)
+    upload = merge_test(pd.read_feather(artifacts["upload"]), payers, sellers)
+    return history, upload
+
+
+def assert_same_features(expected: pd.DataFrame, result: pd.DataFrame):
+    result = result.set_index("transaction_id")
+    expected = expected.loc[result.index]
+    mismatched = {}
+    for col in expected.columns:
+        a, b = expected[col], result[col]
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            bad = ~np.isclose(a.astype(float), b.astype(float), rtol=1e-5, atol=1e-7, equal_nan=True)
+        else:
+            bad = a.astype(str).to_numpy() != b.astype(str).to_numpy()
+        if bad.any():
+            mismatched[col] = int(bad.sum())
+    assert not mismatched, f"features divergentes (linhas por coluna): {mismatched}"
@@ -0,0 +1,133 @@
+"""ArtifactDownloader contra um S3 simulado (moto): retomada, troca de versão e cache pelo manifest."""
+
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from artifacts import MANIFEST_NAME, ArtifactDownloader, ArtifactError
+
+BUCKET = "artifacts"
+KEY = "data/Transactions.feather"
+PART_SIZE = 1024
+CONTENT = os.urandom(10 * PART_SIZE + 123)
+
+
+class CountingClient:
+    """Repassa ao cliente boto3, contando GETs e permitindo falhar ou intervir no n-ésimo."""
+
+    def __init__(self, client, on_get=None):
+        self.client = client
+        self.on_get = on_get
+        self.gets = 0
+
+    def head_object(self, **kwargs):
+        return self.client.head_object(**kwargs)
+
+    def get_object(self, **kwargs):
+        self.gets += 1
+        if self.on_get is not None:
+            self.on_get(self.gets)
+        return self.client.get_object(**kwargs)
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        client.put_object(Bucket=BUCKET, Key=KEY, Body=CONTENT)
+        yield client
+
+
+def downloader(client, local_dir, **kwargs):
+    # Um worker de partes: a ordem dos GETs é a das partes, e a interrupção cai sempre no mesmo ponto
+    return ArtifactDownloader(client, BUCKET, local_dir, part_size=PART_SIZE, workers=1, **kwargs)
+
+
+def test_download_and_manifest_hit(s3, tmp_path):
+    first = downloader(CountingClient(s3), tmp_path)
+    path = first.fetch(KEY)
+    first.shutdown()
+    assert path.read_bytes() == CONTENT
+    assert first.manifest.get(KEY).size == len(CONTENT)
+    assert (tmp_path / MANIFEST_NAME).exists()
+
+    # Novo processo: o arquivo bate com o manifest e com o HEAD, nenhum GET é feito
+    client = CountingClient(s3)
+    second = downloader(client, tmp_path)
+    assert second.fetch(KEY) == path
+    second.shutdown()
+    assert client.gets == 0
+
+
+def test_resume_partial_download(s3, tmp_path):
+    def fail_fourth(n):
+        if n == 4:
+            raise ConnectionError("conexão caiu")
+
+    interrupted = downloader(CountingClient(s3, fail_fourth), tmp_path)
+    with pytest.raises(ArtifactError):
+        interrupted.fetch(KEY)
+    interrupted.shutdown()
+    assert not (tmp_path / "Transactions.feather").exists()
+    assert (tmp_path / "Transactions.feather.part.json").exists()
+
+    client = CountingClient(s3)
+    resumed = downloader(client, tmp_path)
+    path = resumed.fetch(KEY)
+    resumed.shutdown()
+    assert path.read_bytes() == CONTENT
+    # 11 partes, 3 já gravadas antes da falha
+    assert client.gets == 11 - 3
+    assert not (tmp_path / "Transactions.feather.part.json").exists()
+
+
+def test_etag_change_mid_download(s3, tmp_path):
+    new_content = os.urandom(len(CONTENT))
+
+    def replace_object(n):
+        if n == 3:
+            s3.put_object(Bucket=BUCKET, Key=KEY, Body=new_content)
+
+    changing = downloader(CountingClient(s3, replace_object), tmp_path)
+    with pytest.raises(ArtifactError, match="PreconditionFailed"):
+        changing.fetch(KEY)
+    changing.shutdown()
+
+    # O progresso era da versão anterior: a nova é baixada do zero, sem misturar partes
+    client = CountingClient(s3)
+    fresh = downloader(client, tmp_path)
+    assert fresh.fetch(KEY).read_bytes() == new_content
+    fresh.shutdown()
+    assert client.gets == 11
+
+
+def test_truncated_cache_is_downloaded_again(s3, tmp_path):
+    first = downloader(s3, tmp_path)
+    path = first.fetch(KEY)
+    first.shutdown()
+    path.write_bytes(CONTENT[:-100])
+
+    client = CountingClient(s3)
+    second = downloader(client, tmp_path)
+    assert second.fetch(KEY).read_bytes() == CONTENT
+    second.shutdown()
+    assert client.gets == 11
+
+
+def test_corrupted_cache_fails_sha256(s3, tmp_path):
+    first = downloader(s3, tmp_path)
+    path = first.fetch(KEY)
+    first.shutdown()
+    corrupted = bytearray(CONTENT)
+    corrupted[500] ^= 0xFF
+    path.write_bytes(bytes(corrupted))
+
+    # Mesmo tamanho: só a conferência do sha256 percebe
+    client = CountingClient(s3)
+    second = downloader(client, tmp_path, verify_hash=True)
+    assert second.fetch(KEY).read_bytes() == CONTENT
+    second.shutdown()
+    assert client.gets == 11
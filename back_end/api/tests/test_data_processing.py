@@ -0,0 +1,158 @@
+"""Kernels vetorizados do data_processing contra laços de referência linha a linha."""
+
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing
+from conftest import assert_same_features
+from data_processing import (
+    RSS_SAMPLER,
+    build_features,
+    combine_moments,
+    count_prior_events,
+    grouped_window_counts,
+    load_tables,
+    prefix_moments,
+    process_pipeline,
+    record_stage,
+    shared_terminal_with_fraud,
+)
+
+
+def random_transactions(n: int, seed: int = 0) -> pd.DataFrame:
+    """Transações fora de ordem, com instantes repetidos (empates) e terminais nulos."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01")
+    # Resolução de horas em 20 dias: muitos empates entre transações e reportes
+    tx_datetime = start + pd.to_timedelta(rng.integers(0, 20 * 24, n), unit="h")
+    is_fraud = (rng.random(n) < 0.2).astype(int)
+    report = pd.Series(tx_datetime + pd.to_timedelta(rng.integers(0, 72, n), unit="h")).where(is_fraud == 1)
+    # Algumas fraudes sem data de reporte
+    report[rng.random(n) < 0.05] = pd.NaT
+    terminal = pd.Series(rng.choice([f"t{i}" for i in range(8)], n), dtype=object)
+    terminal[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        "transaction_id": [f"tx{i}" for i in range(n)],
+        "tx_datetime": tx_datetime,
+        "card_id": rng.choice([f"c{i}" for i in range(30)], n),
+        "terminal_id": terminal,
+        "is_fraud": is_fraud,
+        "tx_fraud_report_date": report,
+    })
+
+
+def test_prefix_moments_matches_welford():
+    rng = np.random.default_rng(0)
+    groups = np.repeat(np.arange(500), rng.integers(1, 6, 500)).astype(float)
+    groups[rng.random(len(groups)) < 0.05] = np.nan
+    x = np.log1p(rng.exponential(100, len(groups)))
+    n, mean, m2 = prefix_moments(x, groups)
+
+    state = {}
+    for i, key in enumerate(groups):
+        if np.isnan(key):
+            assert np.isnan(n[i])
+            continue
+        count, mu, sq = state.get(key, (0, 0.0, 0.0))
+        assert n[i] == count
+        if count:
+            assert np.isclose(mean[i], mu)
+            assert np.isclose(m2[i], sq, rtol=1e-9, atol=1e-12)
+        if count == 1:
+            # Uma única linha anterior: M2 exatamente 0, como o combine_moments do feature store
+            assert m2[i] == 0 and mean[i] == mu
+        state[key] = combine_moments(count, mu, sq, 1, x[i], 0.0)
+
+
+def test_shared_terminal_with_fraud_matches_loop():
+    df = random_transactions(600)
+    result = shared_terminal_with_fraud(df.copy())
+
+    # Referência: a implementação original, transação a transação
+    expected = pd.Series(0, index=df.index)
+    for _, grp in df.groupby("terminal_id", sort=False):
+        frauds = grp[(grp["is_fraud"] == 1) & grp["tx_fraud_report_date"].notna()]
+        for idx in grp.index:
+            cur_time = df.at[idx, "tx_datetime"]
+            expected[idx] = len(set(frauds.loc[frauds["tx_fraud_report_date"] < cur_time, "card_id"]))
+
+    assert (result["shared_terminal_with_frauds_prior"].to_numpy() == expected.to_numpy()).all()
+    assert (result.loc[df["terminal_id"].isna(), "shared_terminal_with_frauds_prior"] == 0).all()
+
+
+def test_count_prior_events_matches_loop():
+    rng = np.random.default_rng(1)
+    event_keys, event_times = rng.integers(0, 5, 300), rng.integers(0, 50, 300)
+    query_keys, query_times = rng.integers(-1, 6, 200), rng.integers(0, 50, 200)
+    counts = count_prior_events(event_keys, event_times, query_keys, query_times)
+    expected = [((event_keys == k) & (event_times < t)).sum() for k, t in zip(query_keys, query_times)]
+    assert counts.tolist() == expected
+
+
+def test_grouped_window_counts_matches_loop():
+    rng = np.random.default_rng(2)
+    day = pd.Timedelta(days=1).value
+    event_keys, event_times = rng.integers(0, 4, 400), rng.integers(0, 30, 400) * day
+    query_keys, query_times = rng.integers(0, 4, 100), rng.integers(0, 30, 100) * day
+    windows, lags = [pd.Timedelta(days=1), pd.Timedelta(days=7)], [pd.Timedelta(days=1), pd.Timedelta(days=2)]
+    counts = grouped_window_counts(event_keys, event_times, query_keys, query_times, windows, lags)
+    for i, (window, lag) in enumerate(zip(windows, lags)):
+        lo, hi = query_times - lag.value - window.value, query_times - lag.value
+        expected = [
+            ((event_keys == k) & (event_times >= a) & (event_times < b)).sum()
+            for k, a, b in zip(query_keys, lo, hi)
+        ]
+        assert counts[i].tolist() == expected
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_parallel_phases_match_serial(monkeypatch, merged, method):
+    """As partições chegam aos workers por arquivo: o resultado não depende do método de início."""
+    if method not in multiprocessing.get_all_start_methods():
+        pytest.skip(f"{method} indisponível")
+    monkeypatch.setattr(
+        data_processing, "make_partition_pool",
+        lambda workers: ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method)),
+    )
+    history, _ = merged
+    expected = build_features(history.copy())
+    pd.testing.assert_frame_equal(build_features(history.copy(), workers=2), expected)
+
+
+def test_memory_mapped_history_matches_pipeline(tmp_path, artifacts, expected):
+    """Histórico como tabela Arrow memory-mapped: só as linhas das entidades do lote viram pandas."""
+    tables = load_tables(
+        artifacts["payers"], artifacts["sellers"], artifacts["transactions"],
+        cache_dir=tmp_path, mmap_history=True,
+    )
+    assert not isinstance(tables.transactions, pd.DataFrame)
+    upload = pd.read_feather(artifacts["upload"]).head(50)
+    result = process_pipeline(
+        tables.payers_index, tables.sellers_index, tables.transactions, upload,
+        entity_index=tables.entity_index,
+    )
+    assert_same_features(expected, result[result["transaction_id"].isin(upload["transaction_id"])])
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="RSS lido de /proc")
+def test_record_stage_measures_the_stage_peak():
+    """O pico de um estágio é o dele, não o de um estágio anterior mais pesado."""
+    RSS_SAMPLER.start()
+    time.sleep(0.02)
+    report = []
+    started = time.perf_counter()
+    heavy = np.ones(256 * 1024**2 // 8)  # 256 MB tocados
+    time.sleep(0.05)
+    del heavy
+    record_stage(report, "pesado", started, 1)
+    started = time.perf_counter()
+    time.sleep(0.05)
+    record_stage(report, "leve", started, 1)
+    assert report[0]["rss_peak_mb"] > 200
+    assert report[1]["rss_peak_mb"] < 50
@@ -0,0 +1,54 @@
+"""Features do FeatureStore contra as do process_pipeline sobre o histórico inteiro."""
+
+import pandas as pd
+
+from conftest import assert_same_features
+from data_processing import merge_test, merge_train, process_pipeline, read_payers
+from feature_store import FeatureStore
+
+
+def test_transform_matches_pipeline(merged, expected):
+    history, upload = merged
+    store = FeatureStore.build(history)
+    assert_same_features(expected, store.transform(upload))
+
+
+def test_transform_after_update_matches_pipeline(merged, expected):
+    """Lotes sucessivos: os eventos do primeiro ficam no buffer ainda não intercalado."""
+    history, upload = merged
+    store = FeatureStore.build(history)
+    first, second = upload.iloc[:200], upload.iloc[200:]
+    assert_same_features(expected, store.transform(first))
+    store.update(first, store.transform(first))
+    assert_same_features(expected, store.transform(second))
+
+
+def test_resubmitted_batch_keeps_first_features(merged, expected):
+    """Um lote reenviado não é pontuado contra um estado que já contém as próprias linhas."""
+    history, upload = merged
+    store = FeatureStore.build(history)
+    first = upload.iloc[:200]
+    features = store.transform(first)
+    store.update(first, features)
+    store.update(first, features)
+    assert_same_features(expected, store.transform(first))
+    # Reenvio misturado a transações novas, fora de ordem
+    mixed = pd.concat([upload.iloc[200:], upload.iloc[100:200]]).sample(frac=1, random_state=0)
+    assert_same_features(expected, store.transform(mixed))
+
+
+def test_null_card_and_terminal_match_pipeline(tmp_path, artifacts):
+    """Transações sem cartão ou sem terminal não formam par terminal-cartão (nem contam como reuso)."""
+    upload = pd.read_feather(artifacts["upload"])
+    upload.loc[upload.index % 7 == 0, "card_id"] = None
+    upload.loc[upload.index % 11 == 0, "terminal_id"] = None
+    upload_path = tmp_path / "Upload.feather"
+    upload.to_feather(upload_path)
+
+    df = process_pipeline(artifacts["payers"], artifacts["sellers"], artifacts["transactions"], upload_path)
+    expected = df[df["transaction_id"].isin(upload["transaction_id"])].set_index("transaction_id")
+
+    payers = read_payers(artifacts["payers"])
+    sellers = pd.read_feather(artifacts["sellers"])
+    store = FeatureStore.build(merge_train(pd.read_feather(artifacts["transactions"]), payers, sellers))
+    assert_same_features(expected, store.transform(merge_test(upload, payers, sellers)))
@@ -0,0 +1,54 @@
+"""Caminho compilado de inferência: equivalência com o sklearn e queda para o predict_proba."""
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import VotingClassifier
+from sklearn.linear_model import LogisticRegression
+
+from inference import _compile_classifier, _ProbaPositive, compile_model
+from registry import LoadedModel, ModelVersion
+
+
+def training_data(n: int = 300):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"a": rng.normal(size=n), "b": rng.normal(size=n)})
+    y = (X["a"] + rng.normal(scale=0.5, size=n) > 0).astype(int)
+    return X, y
+
+
+def test_voting_weights_skip_dropped_estimators():
+    X, y = training_data()
+    model = VotingClassifier(
+        [("lr", LogisticRegression()), ("off", "drop"), ("strong", LogisticRegression(C=0.01))],
+        voting="soft", weights=[1, 5, 3],
+    ).fit(X, y)
+    graph = compile_model(model)
+    assert graph.weights == [1, 3]
+    assert np.allclose(graph.predict_positive(X), model.predict_proba(X)[:, 1])
+
+
+class FakeXGBClassifier:
+    """Classificador com o módulo do xgboost, mas sem as APIs privadas que o caminho nativo usa."""
+    __module__ = "xgboost.sklearn"
+    n_classes_ = 2
+
+    def predict_proba(self, X):
+        return np.column_stack([np.full(len(X), 0.25), np.full(len(X), 0.75)])
+
+
+def test_classifier_without_private_api_uses_predict_proba():
+    predict = _compile_classifier(FakeXGBClassifier())
+    assert isinstance(predict, _ProbaPositive)
+    assert predict(np.zeros((3, 2))).tolist() == [0.75] * 3
+
+
+class BrokenGraph:
+    def predict_positive(self, X):
+        raise TypeError("assinatura nova")
+
+
+def test_loaded_model_falls_back_when_graph_fails():
+    X, y = training_data()
+    model = LogisticRegression().fit(X, y)
+    loaded = LoadedModel(ModelVersion("v1", "models/v1.pkl", "v1", 0.5), model, BrokenGraph())
+    assert np.allclose(loaded.predict_positive(X), model.predict_proba(X)[:, 1])
@@ -0,0 +1,45 @@
+"""Retenção dos resultados da fila de jobs."""
+
+import asyncio
+
+import pytest
+
+from jobs import JOB_DONE, JobQueue
+
+
+@pytest.fixture(scope="module")
+def queue():
+    queue = JobQueue(1, max_result_rows=100)
+    yield queue
+    queue.shutdown()
+
+
+def run_job(queue: JobQueue, rows: int):
+    async def work(job):
+        return list(range(rows))
+
+    async def main():
+        job = queue.create(rows)
+        await queue.start(job, work)
+        return job
+
+    return asyncio.run(main())
+
+
+def test_oldest_results_are_dropped_above_the_row_limit(queue):
+    first = run_job(queue, 60)
+    second = run_job(queue, 30)
+    assert first.results is not None and second.results is not None
+
+    third = run_job(queue, 40)
+    # 130 linhas passam do limite: sai o resultado mais antigo, o status continua consultável
+    assert first.results is None and first.results_expired
+    assert queue.get(first.job_id).status == JOB_DONE
+    assert second.results is not None and third.results is not None
+    assert queue.result_rows == 70
+
+    # Um job maior que o limite sozinho fica com os seus resultados
+    big = run_job(queue, 150)
+    assert big.results is not None
+    assert second.results_expired and third.results_expired
+    assert queue.result_rows == 150
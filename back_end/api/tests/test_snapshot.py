@@ -0,0 +1,21 @@
+"""Features do HistorySnapshot contra as do process_pipeline sobre o histórico inteiro."""
+
+from conftest import assert_same_features
+from snapshot import HistorySnapshot
+
+
+def test_transform_matches_pipeline(tmp_path, merged, expected):
+    history, upload = merged
+    snapshot = HistorySnapshot.build(tmp_path, "key", history.copy())
+    assert_same_features(expected, snapshot.transform(upload))
+
+
+def test_reopened_snapshot_is_not_updated_by_batches(tmp_path, merged, expected):
+    """Reaberto do disco, o snapshot pontua igual e não incorpora os lotes pontuados."""
+    history, upload = merged
+    HistorySnapshot.build(tmp_path, "key", history.copy())
+    snapshot = HistorySnapshot.open(tmp_path, "key")
+    assert snapshot is not None and snapshot.rows == len(history)
+    assert_same_features(expected, snapshot.transform(upload))
+    assert_same_features(expected, snapshot.transform(upload))
+    assert HistorySnapshot.open(tmp_path, "other") is None
@@ -32,7 +32,7 @@ const ModelSelect: React.FC<ModelSelectProps> = ({
           )}
           {models.map((model) => (
             <option key={model.id} value={model.id}>
-              {model.name} (v{model.version})
+              {model.name} (v{model.version}){model.active ? " • ativo" : ""}
             </option>
           ))}
         </select>
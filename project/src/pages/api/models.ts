@@ -8,18 +8,27 @@ const mockModels: Model[] = [
     name: 'Random Forest',
     version: '1.0.0',
     createdAt: '2023-01-15T10:30:00Z',
+    threshold: 0.54,
+    active: true,
+    loadedAt: null,
   },
   {
     id: 'model-2',
     name: 'XGBoost',
     version: '2.1.3',
     createdAt: '2023-03-22T14:15:30Z',
+    threshold: 0.54,
+    active: false,
+    loadedAt: null,
   },
   {
     id: 'model-3',
     name: 'Neural Network',
     version: '0.9.5',
     createdAt: '2023-05-08T09:45:12Z',
+    threshold: 0.54,
+    active: false,
+    loadedAt: null,
   },
 ];
 
@@ -22,7 +22,8 @@ export default function Home() {
         const modelsData = await getModels();
         setModels(modelsData);
         if (modelsData.length > 0) {
-          setSelectedModel(modelsData[0].id);
+          const active = modelsData.find((model) => model.active);
+          setSelectedModel((active || modelsData[0]).id);
         }
       } catch (err) {
         console.error('Failed to fetch models:', err);
@@ -1,5 +1,17 @@
 import axios from 'axios';
-import { Model, LogsResponse, BatchResponse } from '@/types';
+import {
+  Model,
+  LogsResponse,
+  BatchResponse,
+  JobStatus,
+  JobResult,
+  PredictionLogEntry,
+  PredictionLogFilters,
+  PredictionLogPage,
+  PredictionResult,
+  TransactionInput,
+  TransactionPrediction,
+} from '@/types';
 
 // Base URL for the FastAPI backend
 const BASE_URL = process.env.NEXT_PUBLIC_API_URL || 
@@ -20,19 +32,28 @@ const api = axios.create({
 
 export const getModels = async (): Promise<Model[]> => {
   try {
-    // Backend doesn't have this route, so return mock data
-    return [{
-      id: 'model-1',
-      name: 'Fraud Detection Model',
-      version: 'v1.0.0',
-      createdAt: new Date().toISOString()
-    }];
+    const { data } = await api.get<Model[]>('/models');
+    return data;
   } catch (error) {
     console.error('Error fetching models:', error);
     throw error;
   }
 };
 
+// Loads, warms up and hot-swaps the backend's active model; threshold is optional
+export const activateModel = async (modelId: string, threshold?: number): Promise<Model> => {
+  try {
+    const { data } = await api.post<Model>(
+      `/models/${modelId}/activate`,
+      threshold === undefined ? undefined : { threshold }
+    );
+    return data;
+  } catch (error) {
+    console.error('Error activating model:', error);
+    throw error;
+  }
+};
+
 export const processBatch = async (
   file: File, 
   modelId: string, 
@@ -54,8 +75,7 @@ export const processBatch = async (
           onUploadProgress({ progress: percentCompleted });
         }
       } : undefined,
-      // Extend timeout for large files
-      timeout: 600000, // 10 minutes for batch processing
+      // The backend only parses the upload and queues a job; scoring is polled via getLogs
     });
     
     return response.data;
@@ -65,22 +85,49 @@ export const processBatch = async (
   }
 };
 
+export const getJobStatus = async (jobId: string): Promise<JobStatus> => {
+  const response = await api.get<JobStatus>(`/jobs/${jobId}`);
+  return response.data;
+};
+
+const JOB_POLL_INTERVAL = 2000; // ms
+// Give up on a job that is still queued or running after this long; the UI shows the error
+const JOB_WAIT_TIMEOUT = 15 * 60 * 1000; // ms
+const LOGS_PAGE_SIZE = 10;
+
+const waitForJob = async (jobId: string, timeout: number = JOB_WAIT_TIMEOUT): Promise<JobStatus> => {
+  const deadline = Date.now() + timeout;
+  while (true) {
+    const status = await getJobStatus(jobId);
+    if (status.status === 'done') return status;
+    if (status.status === 'failed') throw new Error(status.error || 'Batch job failed');
+    if (Date.now() + JOB_POLL_INTERVAL > deadline) {
+      throw new Error(
+        `Batch job ${jobId} did not finish within ${Math.round(timeout / 60000)} minutes (last status: ${status.status})`
+      );
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+  }
+};
+
 export const getLogs = async (jobId: string, page: number, showRejectedOnly?: boolean): Promise<LogsResponse> => {
   try {
-    // Backend doesn't have this specific route, return mock data
-    const mockLogs = Array.from({ length: 10 }, (_, i) => ({
-      transactionId: `TX-${10000 + i}`,
-      status: (Math.random() > 0.7 ? 'rejected' : 'approved') as 'rejected' | 'approved',
-      timestamp: new Date(Date.now() - i * 3600000).toISOString(),
-    }));
+    await waitForJob(jobId);
+    const { data } = await api.get<JobResult>(`/jobs/${jobId}/result`, {
+      params: { page, page_size: LOGS_PAGE_SIZE, rejected_only: !!showRejectedOnly },
+    });
 
     return {
-      logs: showRejectedOnly ? mockLogs.filter(log => log.status === 'rejected') : mockLogs,
+      logs: data.predictions.map((prediction) => ({
+        transactionId: prediction.transaction_id,
+        status: prediction.tx_approved ? 'approved' : 'rejected',
+        timestamp: data.finished_at || new Date().toISOString(),
+      })),
       pagination: {
-        currentPage: page,
-        totalPages: 5,
-        totalItems: 50,
-        itemsPerPage: 10,
+        currentPage: data.page,
+        totalPages: Math.max(1, Math.ceil(data.total / data.page_size)),
+        totalItems: data.total,
+        itemsPerPage: data.page_size,
       }
     };
   } catch (error) {
@@ -89,13 +136,51 @@ export const getLogs = async (jobId: string, page: number, showRejectedOnly?: bo
   }
 };
 
-// Remove single transaction prediction as backend doesn't support it
-export const predictTransaction = async (transactionId: string) => {
-  // Backend doesn't have this route, return mock data
-  return {
-    transactionId,
-    prediction: Math.random() > 0.7 ? 'fraud' : 'legitimate',
-    confidence: Math.random(),
-    timestamp: new Date().toISOString(),
-  };
-};
\ No newline at end of file
+// Persisted prediction logs, newest first, paginated by cursor instead of page number
+export const getPredictionLogs = async (
+  filters: PredictionLogFilters = {},
+  cursor?: number | null,
+  limit: number = LOGS_PAGE_SIZE
+): Promise<PredictionLogPage> => {
+  try {
+    const { data } = await api.get<{ logs: PredictionLogEntry[]; next_cursor: number | null }>('/logs', {
+      params: {
+        job_id: filters.jobId,
+        tx_approved: filters.approved,
+        start: filters.start,
+        end: filters.end,
+        cursor: cursor ?? undefined,
+        limit,
+      },
+    });
+    return {
+      logs: data.logs.map((log) => ({
+        transactionId: log.transaction_id,
+        status: log.tx_approved ? 'approved' : 'rejected',
+        timestamp: log.request_timestamp,
+      })),
+      nextCursor: data.next_cursor,
+    };
+  } catch (error) {
+    console.error('Error fetching prediction logs:', error);
+    throw error;
+  }
+};
+
+export const predictTransaction = async (
+  transactionId: string,
+  transaction: TransactionInput
+): Promise<TransactionPrediction> => {
+  try {
+    const { data } = await api.post<PredictionResult>(`/predict/transaction/${transactionId}`, transaction);
+    return {
+      transactionId: data.transaction_id,
+      prediction: data.tx_approved ? 'legitimate' : 'fraud',
+      confidence: data.model_score,
+      timestamp: new Date().toISOString(),
+    };
+  } catch (error) {
+    console.error('Error predicting transaction:', error);
+    throw error;
+  }
+};
@@ -2,7 +2,10 @@ export interface Model {
   id: string;
   name: string;
   version: string;
-  createdAt: string;
+  createdAt: string | null;
+  threshold: number;
+  active: boolean;
+  loadedAt: string | null;
 }
 
 export interface Transaction {
@@ -24,4 +27,70 @@ export interface LogsResponse {
 export interface BatchResponse {
   jobId: string;
   message: string;
-}
\ No newline at end of file
+  transactions_processed: number;
+}
+
+export interface JobStatus {
+  job_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  transactions: number;
+  submitted_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+  error: string | null;
+}
+
+export interface PredictionResult {
+  transaction_id: string;
+  model_score: number;
+  tx_approved: boolean;
+}
+
+export interface JobResult {
+  job_id: string;
+  status: string;
+  finished_at: string | null;
+  total: number;
+  page: number;
+  page_size: number;
+  predictions: PredictionResult[];
+}
+
+export interface TransactionInput {
+  tx_datetime: string;
+  card_id: string;
+  terminal_id: string;
+  tx_amount: number;
+  is_fraud?: number;
+  is_transactional_fraud?: number;
+  tx_fraud_report_date?: string | null;
+}
+
+export interface TransactionPrediction {
+  transactionId: string;
+  prediction: 'fraud' | 'legitimate';
+  confidence: number;
+  timestamp: string;
+}
+
+export interface PredictionLogEntry {
+  id: number;
+  job_id: string | null;
+  request_timestamp: string;
+  transaction_id: string;
+  model_score: number;
+  tx_approved: boolean;
+}
+
+export interface PredictionLogFilters {
+  jobId?: string;
+  approved?: boolean;
+  start?: string;
+  end?: string;
+}
+
+export interface PredictionLogPage {
+  logs: Transaction[];
+  // Pass back as `cursor` to fetch the next (older) page; null when there are no more logs
+  nextCursor: number | null;
+}